@@ -0,0 +1,411 @@
+import os
+import json
+import signal
+import asyncio
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from watchdog.events import FileSystemEventHandler
+
+from orbit_watchdog import Config, OrbitSystem, OrbitEventHandler, log_run_stats
+
+logger = logging.getLogger(__name__)
+
+
+class LoopEventQueue:
+    """EventQueue for the asyncio engine, driven by loop timers
+
+    Same contract as EventQueue: put() debounces work per key, put_now()
+    runs ahead of debounced work. Instead of a heap and a condition
+    variable, each pending key holds one loop timer that is re-armed on
+    every put; when it fires the work moves to the ready line. Must only
+    be used from the loop thread.
+    """
+
+    def __init__(self, loop, debounce_time, max_delay=None):
+        self.loop = loop
+        self.debounce_time = debounce_time
+        self.max_delay = max_delay if max_delay is not None else debounce_time * 5
+        self._pending = {}  # key -> [timer, deadline, fn, args]
+        self._ready = deque()
+        self._immediate = deque()
+        self._wakeup = asyncio.Event()
+        self._closed = False
+        self.coalesced = 0
+
+    def put(self, key, fn, *args, delay=None):
+        """Queue fn(*args) to run once key has been quiet for the debounce window (or delay)"""
+        now = self.loop.time()
+        delay = self.debounce_time if delay is None else delay
+        entry = self._pending.get(key)
+        if entry:
+            self.coalesced += 1
+            entry[0].cancel()
+            entry[1] = max(entry[1], now + delay)
+            entry[2:] = [fn, args]
+        else:
+            entry = [None, now + max(self.max_delay, delay), fn, args]
+            self._pending[key] = entry
+        entry[0] = self.loop.call_at(min(now + delay, entry[1]), self._due, key)
+
+    def _due(self, key):
+        """Timer callback: key has been quiet long enough"""
+        _, _, fn, args = self._pending.pop(key)
+        self._ready.append((fn, args))
+        self._wakeup.set()
+
+    def put_now(self, fn, *args):
+        """Queue fn(*args) to run as soon as the worker is free"""
+        self._immediate.append((fn, args))
+        self._wakeup.set()
+
+    def discard(self, key):
+        """Drop pending work for key, returning True if there was any"""
+        entry = self._pending.pop(key, None)
+        if entry is None:
+            return False
+        entry[0].cancel()
+        return True
+
+    def discard_tree(self, dir_path):
+        """Drop pending work for every path under a directory, returning the dropped keys"""
+        prefix = os.path.join(dir_path, '')
+        keys = [key for key in self._pending if key.startswith(prefix)]
+        for key in keys:
+            self._pending.pop(key)[0].cancel()
+        return keys
+
+    async def get(self):
+        """Wait until work is due and return (fn, args), or None once closed"""
+        while not self._closed:
+            if self._immediate:
+                return self._immediate.popleft()
+            if self._ready:
+                return self._ready.popleft()
+            self._wakeup.clear()
+            await self._wakeup.wait()
+        return None
+
+    def close(self):
+        """Cancel the timers and stop handing out work"""
+        self._closed = True
+        for entry in self._pending.values():
+            entry[0].cancel()
+        self._wakeup.set()
+
+    def due(self):
+        """Check whether any work is ready to run now"""
+        return bool(self._ready or self._immediate)
+
+    def __len__(self):
+        return len(self._pending) + len(self._ready) + len(self._immediate)
+
+
+class LoopMoveScheduler:
+    """MoveScheduler for the asyncio engine, using one loop timer per move
+
+    schedule(), cancel() and rekey() are called by OrbitSystem on the
+    worker thread, so the pending map is locked and timers are armed via
+    call_soon_threadsafe. A timer that fires for a move that was cancelled,
+    re-keyed or re-armed does nothing.
+    """
+
+    def __init__(self, loop, callback=None):
+        self.loop = loop
+        self.callback = callback
+        self._lock = threading.Lock()
+        self._pending = {}  # path -> (due, frontmatter)
+        self._timers = {}  # path -> TimerHandle, loop thread only
+        self._closed = False
+
+    def schedule(self, path, delay, frontmatter):
+        """Fire the move for path after delay seconds, replacing any pending one"""
+        with self._lock:
+            entry = self._pending.get(path)
+            due = entry[0] if entry else self.loop.time() + delay
+            self._pending[path] = (due, frontmatter)
+        if not entry:
+            self.loop.call_soon_threadsafe(self._arm, path, due)
+
+    def cancel(self, path):
+        """Drop the pending move for path, returning its frontmatter if there was one"""
+        with self._lock:
+            entry = self._pending.pop(path, None)
+        return entry[1] if entry else None
+
+    def rekey(self, src_path, dest_path):
+        """Follow a note that was renamed while its move was pending"""
+        with self._lock:
+            entry = self._pending.pop(src_path, None)
+            if entry:
+                self._pending[dest_path] = entry
+        if entry:
+            self.loop.call_soon_threadsafe(self._arm, dest_path, entry[0])
+
+    def rekey_tree(self, src_dir, dest_dir):
+        """Follow the notes under a directory that was moved while their moves were pending"""
+        src_prefix = os.path.join(src_dir, '')
+        dest_prefix = os.path.join(dest_dir, '')
+        moved = []
+        with self._lock:
+            for path in [path for path in self._pending if path.startswith(src_prefix)]:
+                entry = self._pending.pop(path)
+                dest_path = dest_prefix + path[len(src_prefix):]
+                self._pending[dest_path] = entry
+                moved.append((dest_path, entry[0]))
+        for dest_path, due in moved:
+            self.loop.call_soon_threadsafe(self._arm, dest_path, due)
+
+    def cancel_tree(self, dir_path):
+        """Drop the pending moves for every note under a directory"""
+        prefix = os.path.join(dir_path, '')
+        with self._lock:
+            for path in [path for path in self._pending if path.startswith(prefix)]:
+                del self._pending[path]
+
+    def is_pending(self, path):
+        """Check whether a move is pending for path"""
+        with self._lock:
+            return path in self._pending
+
+    def __len__(self):
+        with self._lock:
+            return len(self._pending)
+
+    def _arm(self, path, due):
+        """Start (or restart) the timer for path on the loop thread"""
+        if self._closed:
+            return
+        timer = self._timers.pop(path, None)
+        if timer:
+            timer.cancel()
+        self._timers[path] = self.loop.call_at(due, self._fire, path, due)
+
+    def _fire(self, path, due):
+        """Timer callback: hand the move to callback if it is still pending"""
+        self._timers.pop(path, None)
+        with self._lock:
+            entry = self._pending.get(path)
+            if not entry or entry[0] != due:
+                return
+            del self._pending[path]
+        try:
+            self.callback(path, entry[1])
+        except Exception as e:
+            logger.error(f"Error running deferred move for {path}: {str(e)}")
+
+    def close(self):
+        """Cancel the timers; pending moves are dropped (call from the loop thread)"""
+        with self._lock:
+            self._closed = True
+            self._pending.clear()
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+
+
+class AsyncEventHandler(OrbitEventHandler):
+    """OrbitEventHandler that runs on an asyncio event loop
+
+    The observer thread filters each event and hands it to the loop with
+    call_soon_threadsafe; the on_* handlers then run on the loop thread
+    against a LoopEventQueue. Queued work runs one item at a time on a
+    single-thread executor, so all OrbitSystem state is still touched from
+    one thread.
+    """
+
+    def __init__(self, orbit_system, loop, executor, debounce_time=None, recorder=None):
+        super().__init__(orbit_system, debounce_time, recorder)
+        self.loop = loop
+        self.executor = executor
+        self.queue = LoopEventQueue(loop, self.queue.debounce_time, Config.MAX_DEBOUNCE_DELAY)
+        self._task = None
+
+    def start(self):
+        """Start the task that drains the event queue"""
+        self._task = self.loop.create_task(self._drain())
+
+    async def stop(self):
+        """Stop draining once the item in progress has finished"""
+        self.queue.close()
+        if self._task:
+            await self._task
+
+    async def _drain(self):
+        """Run queued work on the executor until the queue is closed"""
+        while True:
+            item = await self.queue.get()
+            if item is None:
+                return
+            fn, args = item
+            try:
+                await self.loop.run_in_executor(self.executor, fn, *args)
+            except Exception as e:
+                self.orbit_system.metrics.inc("errors")
+                logger.error(f"Error handling event for {args}: {str(e)}")
+            if not self.queue.due():
+                # End of a burst (only held-back work left): commit its writes in one go
+                await self.loop.run_in_executor(self.executor, self._flush_writes)
+
+    def deliver(self, event):
+        """Hand an admitted event to the on_* methods on the loop thread"""
+        self.loop.call_soon_threadsafe(FileSystemEventHandler.dispatch, self, event)
+
+    def _requeue(self, paths):
+        """Queue processing of paths from the executor thread on the loop thread"""
+        self.loop.call_soon_threadsafe(OrbitEventHandler._requeue, self, paths)
+
+
+class ControlServer:
+    """Line-based control API on a unix socket
+
+    Each request is one command per line; each reply is one JSON object per
+    line. Commands run on the worker executor, between queued events:
+
+        stats      state and queue counters
+        metrics    the Prometheus text
+        reconcile  re-sync the index with the vault
+        flush      fsync pending writes
+    """
+
+    def __init__(self, handler, socket_path):
+        self.handler = handler
+        self.socket_path = socket_path
+        self._server = None
+
+    async def start(self):
+        """Start listening, replacing a stale socket file"""
+        os.makedirs(os.path.dirname(self.socket_path), exist_ok=True)
+        if os.path.exists(self.socket_path):
+            # Left behind by a watcher that did not shut down cleanly
+            os.remove(self.socket_path)
+        self._server = await asyncio.start_unix_server(self._serve, self.socket_path)
+        logger.info(f"Control API listening on {self.socket_path}")
+
+    async def close(self):
+        """Stop listening and remove the socket file"""
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+            try:
+                os.remove(self.socket_path)
+            except OSError:
+                pass
+
+    def _stats(self):
+        """State counters plus queue and scheduler figures"""
+        stats = self.handler.orbit_system.state_stats()
+        stats['queue_depth'] = len(self.handler.queue)
+        stats['coalesced_events'] = self.handler.queue.coalesced
+        stats['ignored_events'] = self.handler.orbit_system.metrics.counters['ignored_events']
+        stats['pending_moves'] = len(self.handler.orbit_system.scheduler)
+        return stats
+
+    def _run(self, command):
+        """Run one command, returning the reply"""
+        orbit_system = self.handler.orbit_system
+        if command == 'stats':
+            return self._stats()
+        if command == 'metrics':
+            return {'metrics': orbit_system.metrics.render({'coalesced_events': self.handler.queue.coalesced})}
+        if command == 'reconcile':
+            orbit_system.reconcile()
+            return {'ok': True}
+        if command == 'flush':
+            return {'flushed': orbit_system.fs.flush()}
+        return {'error': f"Unknown command: {command}"}
+
+    async def _serve(self, reader, writer):
+        """Answer commands on one connection until the client hangs up"""
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode('utf-8', 'replace').strip()
+                if not command:
+                    continue
+                try:
+                    reply = await loop.run_in_executor(self.handler.executor, self._run, command)
+                except Exception as e:
+                    reply = {'error': str(e)}
+                writer.write(json.dumps(reply).encode('utf-8') + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def _every(interval, fn):
+    """Call the coroutine function fn every interval seconds"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await fn()
+        except Exception as e:
+            logger.error(f"Error in periodic task {fn.__name__}: {str(e)}")
+
+
+async def run_async(vault_path, recorder=None, control=False, observer_kind=None):
+    """Run the watcher on the running event loop until SIGINT or SIGTERM"""
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="orbit-worker")
+    scheduler = LoopMoveScheduler(loop)
+
+    # Startup does the initial index refresh; keep it off the loop
+    orbit_system = await loop.run_in_executor(executor, lambda: OrbitSystem(vault_path, scheduler=scheduler))
+    await loop.run_in_executor(executor, orbit_system.create_domain_landing_pages)
+
+    handler = AsyncEventHandler(orbit_system, loop, executor, recorder=recorder)
+    handler.start()
+    observer = handler.watch(vault_path, observer_kind)
+    observer.start()
+    logger.info(f"Started watching Obsidian vault at: {vault_path} (asyncio engine)")
+
+    async def write_metrics():
+        await loop.run_in_executor(executor, handler.write_metrics)
+
+    async def reconcile():
+        await loop.run_in_executor(executor, orbit_system.reconcile)
+
+    def dump_metrics():
+        for line in orbit_system.metrics.summary():
+            logger.info(f"Timing {line}")
+        loop.create_task(write_metrics())
+
+    stop = asyncio.Event()
+    loop.add_signal_handler(signal.SIGINT, stop.set)
+    loop.add_signal_handler(signal.SIGTERM, stop.set)
+    if hasattr(signal, 'SIGUSR1'):
+        loop.add_signal_handler(signal.SIGUSR1, dump_metrics)
+
+    tasks = [loop.create_task(_every(Config.METRICS_INTERVAL, write_metrics))]
+    if Config.RECONCILE_INTERVAL:
+        tasks.append(loop.create_task(_every(Config.RECONCILE_INTERVAL, reconcile)))
+
+    server = None
+    try:
+        if control:
+            server = ControlServer(handler, os.path.join(vault_path, Config.CONTROL_SOCKET))
+            await server.start()
+        await stop.wait()
+    finally:
+        observer.stop()
+        await loop.run_in_executor(None, observer.join)
+        await loop.run_in_executor(None, handler.watches.stop)
+        if server:
+            await server.close()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await handler.stop()
+        await write_metrics()
+        scheduler.close()
+        log_run_stats(orbit_system)
+        await loop.run_in_executor(executor, orbit_system.close)
+        executor.shutdown()
@@ -0,0 +1,497 @@
+import os
+import io
+import sys
+import json
+import time
+import random
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import threading
+import statistics
+from collections import Counter
+from contextlib import redirect_stdout
+from datetime import datetime
+
+from watchdog.events import DirCreatedEvent, DirDeletedEvent, FileCreatedEvent
+from watchdog.utils.dirsnapshot import DirectorySnapshot
+
+import orbit_system_debug
+from orbit_watchdog import Config, OrbitSystem, OrbitEventHandler
+from orbit_fs import MemoryFS
+from orbit_paths import DESIGNATED_PATTERN
+from orbit_watch import IgnoreMatcher, PollingTree
+
+logger = logging.getLogger(__name__)
+
+# Average number of notes per project in generated vaults
+NOTES_PER_PROJECT = 25
+
+# Share of generated notes that are loose in a domain inbox, have broken
+# YAML, or contain Templater tags
+INBOX_SHARE = 0.05
+MALFORMED_SHARE = 0.01
+TEMPLATER_SHARE = 0.10
+
+# Share of generated projects that are floating (in the domain's .0-inbox)
+FLOATING_SHARE = 0.2
+
+# Results format version, bumped when the JSON layout changes
+RESULTS_VERSION = 1
+
+# Words used to build note and project names
+WORDS = [
+    "atlas", "birch", "cedar", "delta", "ember", "fjord", "grove", "harbor", "iris", "juniper",
+    "kestrel", "lumen", "meadow", "nimbus", "orchid", "pixel", "quartz", "raven", "sierra", "tundra",
+    "umber", "vertex", "willow", "xenon", "yarrow", "zephyr", "anchor", "beacon", "cobalt", "drift",
+]
+
+BODY = "\n# {title}\n\nSome notes about {title}.\n\n- point one\n- point two\n"
+
+
+class VaultGenerator:
+    """Build a synthetic ORBIT vault of a given size
+
+    Uses the Config.DOMAINS layout: every domain gets its dashboard and
+    hidden inbox, designated projects (NNN-Name with 0-inbox and 9-source),
+    floating projects in .0-inbox, satellites and sources orbiting their
+    project, loose inbox notes waiting to be routed, plus a share of notes
+    with malformed YAML or Templater tags. The same seed always produces
+    the same vault.
+    """
+
+    def __init__(self, vault_path, notes, seed=0):
+        self.vault_path = str(vault_path)
+        self.notes = notes
+        self.random = random.Random(seed)
+        self.counts = {'notes': 0, 'projects': 0, 'floating_projects': 0, 'malformed': 0, 'templater': 0}
+        self._serial = 0
+
+    def _name(self):
+        """Return a new unique note name"""
+        self._serial += 1
+        return f"{self.random.choice(WORDS)}_{self.random.choice(WORDS)}_{self._serial}"
+
+    def _write(self, path, name, fields):
+        """Write one note with the given frontmatter fields"""
+        roll = self.random.random()
+        lines = []
+        for key, value in fields.items():
+            if isinstance(value, list):
+                value = f"[{', '.join(value)}]"
+            lines.append(f"{key}: {value}")
+        if roll < MALFORMED_SHARE:
+            # Unclosed flow list, as left behind by a half-finished edit
+            lines.append("tags: [draft, unfinished")
+            self.counts['malformed'] += 1
+        elif roll < MALFORMED_SHARE + TEMPLATER_SHARE:
+            lines.append('created: <% tp.date.now("YYYY-MM-DD") %>')
+            lines.append('title: <% tp.file.title %>')
+            self.counts['templater'] += 1
+        else:
+            lines.append("created: 2024-01-15")
+
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write("---\n" + "\n".join(lines) + "\n---\n" + BODY.format(title=name))
+        self.counts['notes'] += 1
+
+    def _project(self, project_dir, project_name, domain_folder, domain_name, satellites):
+        """Write a project folder with its note, satellites and sources"""
+        inbox = os.path.join(project_dir, f"{Config.INBOX_NUMBER}-inbox")
+        source = os.path.join(project_dir, f"{Config.SOURCE_NUMBER}-source")
+        os.makedirs(inbox, exist_ok=True)
+        os.makedirs(source, exist_ok=True)
+
+        names = [self._name() for _ in range(satellites)]
+        self._write(os.path.join(project_dir, f"{project_name}.md"), project_name, {
+            'type': 'project', 'domain': domain_folder, 'orbits': [domain_name], 'satellites': names[:5]})
+        for name in names:
+            note_type = 'source' if self.random.random() < 0.3 else 'dust'
+            folder = source if note_type == 'source' else inbox
+            self._write(os.path.join(folder, f"{name}.md"), name, {
+                'type': note_type, 'domain': domain_folder, 'orbits': [project_name]})
+        self.counts['projects'] += 1
+
+    def generate(self):
+        """Write the vault and return a summary of what was generated"""
+        os.makedirs(self.vault_path, exist_ok=True)
+        per_domain = max(1, self.notes // len(Config.DOMAINS))
+
+        for domain_number, domain_name in Config.DOMAINS.items():
+            domain_folder = f"{domain_number}-{domain_name}"
+            domain_dir = os.path.join(self.vault_path, domain_folder)
+            hidden_inbox = os.path.join(domain_dir, Config.INBOX_DIR)
+            os.makedirs(hidden_inbox, exist_ok=True)
+            self._write(os.path.join(domain_dir, f"{domain_name}.md"), domain_name, {
+                'type': 'domain', 'domain': domain_folder})
+
+            loose = max(1, int(per_domain * INBOX_SHARE))
+            projects = max(1, (per_domain - loose) // NOTES_PER_PROJECT)
+            project_names = []
+            for index in range(projects):
+                project_name = f"{self.random.choice(WORDS).title()}_{self._serial + 1}"
+                self._serial += 1
+                satellites = max(0, (per_domain - loose) // projects - 1)
+                if self.random.random() < FLOATING_SHARE:
+                    project_dir = os.path.join(hidden_inbox, project_name)
+                    self.counts['floating_projects'] += 1
+                else:
+                    number = int(domain_number) + Config.PROJECT_INCREMENT * (index + 1)
+                    project_dir = os.path.join(domain_dir, f"{number}-{project_name}")
+                self._project(project_dir, project_name, domain_folder, domain_name, satellites)
+                project_names.append(project_name)
+
+            # Loose notes in the hidden inbox that still need routing
+            for _ in range(loose):
+                name = self._name()
+                self._write(os.path.join(hidden_inbox, f"{name}.md"), name, {
+                    'type': 'dust', 'domain': domain_name, 'orbits': [self.random.choice(project_names)]})
+
+        return dict(self.counts)
+
+
+def _timed(fn, *args):
+    """Run fn once, returning (seconds, result)"""
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def _result(runs, ops=1):
+    """Summarise one benchmark's run times"""
+    best = min(runs)
+    return {
+        'seconds': best,
+        'median': statistics.median(runs),
+        'runs': runs,
+        'ops': ops,
+        'ops_per_sec': ops / best if best else None,
+    }
+
+
+def _quiet(fn, *args):
+    """Call fn with its printed report discarded"""
+    with redirect_stdout(io.StringIO()):
+        return fn(*args)
+
+
+def _floating_projects(vault_path):
+    """List floating project directories in a vault"""
+    projects = []
+    for domain_number, domain_name in Config.DOMAINS.items():
+        hidden_inbox = os.path.join(vault_path, f"{domain_number}-{domain_name}", Config.INBOX_DIR)
+        if os.path.isdir(hidden_inbox):
+            projects.extend(sorted(entry.path for entry in os.scandir(hidden_inbox) if entry.is_dir()))
+    return projects
+
+
+def bench_cold_start(vault_path, repeat):
+    """Build OrbitSystem without an index, then with the persisted one"""
+    db_path = os.path.join(vault_path, ".orbit", "index.db")
+    cold, warm = [], []
+    for _ in range(repeat):
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+        seconds, system = _timed(OrbitSystem, vault_path)
+        system.close()
+        cold.append(seconds)
+        seconds, system = _timed(OrbitSystem, vault_path)
+        system.close()
+        warm.append(seconds)
+    return {'cold_start': _result(cold), 'warm_start': _result(warm)}
+
+
+def bench_process_file(vault_path, sample):
+    """Route a sample of notes, then process the same notes again unchanged"""
+    system = OrbitSystem(vault_path)
+    try:
+        paths = [record['path'] for record in system.index.records()]
+        paths = random.Random(0).sample(paths, min(sample, len(paths)))
+        first, _ = _timed(lambda: [system.process_file(path) for path in paths if os.path.exists(path)])
+        existing = [path for path in paths if os.path.exists(path)]
+        second, _ = _timed(lambda: [system.process_file(path) for path in existing])
+    finally:
+        system.close()
+    return {
+        'process_file': _result([first], len(paths)),
+        'process_file_unchanged': _result([second], len(existing)),
+    }
+
+
+def _calls_per_op(fs, ops):
+    """Average filesystem calls per operation, by call name and in total"""
+    calls = {name: count / ops for name, count in sorted(fs.calls.items())}
+    calls['total'] = fs.total_calls() / ops
+    return calls
+
+
+def bench_fs_calls(vault_path, sample):
+    """Count filesystem calls per process_file against an in-memory copy of the vault
+
+    Unlike timings these counts are exact, so any increase is a regression.
+    """
+    fs = MemoryFS()
+    fs.load(vault_path)
+    system = OrbitSystem(vault_path, fs)
+    try:
+        paths = [record['path'] for record in system.index.records()]
+        paths = random.Random(0).sample(paths, min(sample, len(paths)))
+        fs.reset_calls()
+        for path in paths:
+            system.process_file(path)
+        first = _calls_per_op(fs, len(paths))
+        existing = [path for path in paths if fs.exists(path)]
+        fs.reset_calls()
+        for path in existing:
+            system.process_file(path)
+        second = _calls_per_op(fs, len(existing))
+    finally:
+        system.close()
+    return {'process_file': first, 'process_file_unchanged': second}
+
+
+def bench_relocation_calls(vault_path):
+    """Count filesystem calls and routing runs for a project moved to another domain
+
+    The move is fed to the event handler as a deletion followed by a
+    creation and one creation per child, the way two separately watched
+    trees report it. It should be applied as one directory move, so routing
+    runs count towards the total: any note routed is a regression.
+    """
+    fs = MemoryFS()
+    fs.load(vault_path)
+    system = OrbitSystem(vault_path, fs)
+    handler = OrbitEventHandler(system, debounce_time=0.01)
+    handler.move_window = 0.1
+    handler.start()
+    try:
+        folders = [os.path.join(vault_path, f"{number}-{name}") for number, name in Config.DOMAINS.items()]
+        folders = [path for path in folders if fs.isdir(path)]
+        projects = [os.path.join(folders[0], name) for name in fs.listdir(folders[0])
+                    if DESIGNATED_PATTERN.match(name)] if len(folders) > 1 else []
+        if not projects:
+            return {}
+        src_path = projects[0]
+        dest_path = os.path.join(folders[1], os.path.basename(src_path))
+        fs.rename(src_path, dest_path)
+        events = [DirDeletedEvent(src_path)]
+        for root, dirs, files in fs.walk(dest_path):
+            events.append(DirCreatedEvent(root))
+            events.extend(FileCreatedEvent(os.path.join(root, name)) for name in files)
+
+        fs.reset_calls()
+        for event in events:
+            handler.dispatch(event)
+        # Wait for the held halves of the move, then for the worker to finish
+        while len(handler.queue):
+            time.sleep(handler.move_window)
+        drained = threading.Event()
+        handler.queue.put_now(drained.set)
+        drained.wait()
+        calls = _calls_per_op(fs, 1)
+    finally:
+        handler.stop()
+        system.close()
+    calls['routing_runs'] = float(system.routing_runs)
+    calls['total'] += system.routing_runs
+    return {'directory_relocation': calls}
+
+
+def bench_poll_calls(vault_path):
+    """Count syscalls per idle poll of the vault, ORBIT's PollingTree against watchdog's snapshots
+
+    Averaged over one full-sweep cycle, for a vault nothing has touched
+    lately (no racy or recently modified directories).
+    """
+    calls = Counter()
+
+    def counted_stat(path, *args, **kwargs):
+        calls['stat'] += 1
+        return os.stat(path, *args, **kwargs)
+
+    def counted_scandir(path):
+        calls['scandir'] += 1
+        return os.scandir(path)
+
+    DirectorySnapshot(vault_path, recursive=True, stat=counted_stat, listdir=counted_scandir)
+    watchdog_calls = {name: float(count) for name, count in sorted(calls.items())}
+    watchdog_calls['total'] = float(sum(calls.values()))
+
+    tree = PollingTree(IgnoreMatcher(vault_path, Config.IGNORE_PATTERNS), full_sweep=Config.POLL_FULL_SWEEP)
+    tree.RACY_SECONDS = tree.RECENT_SECONDS = 0
+    tree.add_root(str(vault_path))
+    tree.calls.clear()
+    for _ in range(tree.full_sweep):
+        tree.scan()
+    orbit_calls = {name: count / tree.full_sweep for name, count in sorted(tree.calls.items())}
+    orbit_calls['total'] = sum(tree.calls.values()) / tree.full_sweep
+    return {'poll_idle': orbit_calls, 'poll_idle_watchdog': watchdog_calls}
+
+
+def bench_debug_commands(vault_path, repeat):
+    """Time the check-orbits and check-structure debug commands"""
+    orbits, structure = [], []
+    for _ in range(repeat):
+        # Drop the per-run index cache so each run opens and refreshes it
+        for index in orbit_system_debug._vault_indexes.values():
+            index.close()
+        orbit_system_debug._vault_indexes.clear()
+        orbits.append(_timed(_quiet, orbit_system_debug.check_orbit_relationships, vault_path)[0])
+        structure.append(_timed(_quiet, orbit_system_debug.check_directory_structure, vault_path)[0])
+    return {'check_orbits': _result(orbits), 'check_structure': _result(structure)}
+
+
+def bench_promote_project(vault_path, count):
+    """Promote floating projects to designated ones"""
+    projects = _floating_projects(vault_path)[:count]
+    if not projects:
+        return {}
+    system = OrbitSystem(vault_path)
+    try:
+        seconds, _ = _timed(lambda: [system.promote_project(path) for path in projects])
+    finally:
+        system.close()
+    return {'promote_project': _result([seconds], len(projects))}
+
+
+def run_benchmarks(vault_path, repeat=3, sample=1000, promote=20):
+    """Run the benchmark suite against a vault, returning (timings, fs_calls)
+
+    Mutating benchmarks run last.
+    """
+    fs_calls = bench_fs_calls(vault_path, sample)
+    fs_calls.update(bench_poll_calls(vault_path))
+    fs_calls.update(bench_relocation_calls(vault_path))
+    results = {}
+    results.update(bench_cold_start(vault_path, repeat))
+    results.update(bench_debug_commands(vault_path, repeat))
+    results.update(bench_process_file(vault_path, sample))
+    results.update(bench_promote_project(vault_path, promote))
+    return results, fs_calls
+
+
+def compare(old, new, threshold):
+    """Print a comparison of two result files, returning the regressed benchmark names"""
+    regressions = []
+    print(f"{'benchmark':<26}{'old (s)':>12}{'new (s)':>12}{'change':>10}")
+    for name in sorted(set(old['benchmarks']) | set(new['benchmarks'])):
+        before = old['benchmarks'].get(name)
+        after = new['benchmarks'].get(name)
+        if not before or not after:
+            print(f"{name:<26}{'-' if not before else format(before['seconds'], '.4f'):>12}"
+                  f"{'-' if not after else format(after['seconds'], '.4f'):>12}")
+            continue
+        change = after['seconds'] / before['seconds'] - 1 if before['seconds'] else 0.0
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif change < -threshold:
+            flag = "  faster"
+        print(f"{name:<26}{before['seconds']:>12.4f}{after['seconds']:>12.4f}{change:>+10.1%}{flag}")
+    # Call counts are deterministic, so any increase is flagged
+    old_calls, new_calls = old.get('fs_calls', {}), new.get('fs_calls', {})
+    if old_calls and new_calls:
+        print(f"\n{'fs calls per op':<26}{'old':>12}{'new':>12}")
+        for name in sorted(set(old_calls) & set(new_calls)):
+            before, after = old_calls[name]['total'], new_calls[name]['total']
+            flag = ""
+            if after > before + 1e-9:
+                flag = "  REGRESSION"
+                regressions.append(f"fs_calls.{name}")
+            print(f"{name:<26}{before:>12.2f}{after:>12.2f}{flag}")
+    if old.get('notes') != new.get('notes'):
+        print(f"\nNote: vault sizes differ ({old.get('notes')} vs {new.get('notes')} notes)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ORBIT synthetic vault generator and benchmarks')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate = commands.add_parser('generate', help='Generate a synthetic vault')
+    generate.add_argument('vault', help='Directory to create the vault in')
+    generate.add_argument('--notes', type=int, default=1000, help='Approximate number of notes')
+    generate.add_argument('--seed', type=int, default=0, help='Random seed')
+
+    run = commands.add_parser('run', help='Run the benchmark suite')
+    run.add_argument('--notes', type=int, default=1000, help='Size of the generated vault')
+    run.add_argument('--seed', type=int, default=0, help='Random seed')
+    run.add_argument('--vault', help='Copy this vault instead of generating one')
+    run.add_argument('--repeat', type=int, default=3, help='Runs of each read-only benchmark')
+    run.add_argument('--sample', type=int, default=1000, help='Notes routed by the process_file benchmark')
+    run.add_argument('--promote', type=int, default=20, help='Floating projects promoted')
+    run.add_argument('--output', help='Results file (default: bench-<timestamp>.json)')
+    run.add_argument('--keep', action='store_true', help='Keep the benchmark vault')
+
+    compare_parser = commands.add_parser('compare', help='Compare two results files')
+    compare_parser.add_argument('old', help='Baseline results')
+    compare_parser.add_argument('new', help='New results')
+    compare_parser.add_argument('--threshold', type=float, default=0.10,
+                                help='Relative slowdown reported as a regression (default 0.10)')
+
+    args = parser.parse_args()
+
+    if args.command == 'generate':
+        start = time.perf_counter()
+        counts = VaultGenerator(args.vault, args.notes, args.seed).generate()
+        print(f"Generated {counts} in {time.perf_counter() - start:.1f}s at {args.vault}")
+        return
+
+    if args.command == 'compare':
+        with open(args.old, encoding='utf-8') as f:
+            old = json.load(f)
+        with open(args.new, encoding='utf-8') as f:
+            new = json.load(f)
+        sys.exit(1 if compare(old, new, args.threshold) else 0)
+
+    # Benchmarks run quietly; the watcher logs every note it touches and
+    # every malformed note the generator planted
+    logging.disable(logging.ERROR)
+
+    work_dir = tempfile.mkdtemp(prefix="orbit-bench-")
+    vault_path = os.path.join(work_dir, "vault")
+    try:
+        if args.vault:
+            shutil.copytree(args.vault, vault_path, ignore=shutil.ignore_patterns(".orbit"))
+            counts = {'notes': sum(1 for _, _, files in os.walk(vault_path) for f in files if f.endswith('.md'))}
+        else:
+            seconds, counts = _timed(VaultGenerator(vault_path, args.notes, args.seed).generate)
+            print(f"Generated {counts['notes']} notes in {seconds:.1f}s")
+
+        benchmarks, fs_calls = run_benchmarks(vault_path, args.repeat, args.sample, args.promote)
+    finally:
+        if args.keep:
+            print(f"Benchmark vault kept at {vault_path}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    results = {
+        'version': RESULTS_VERSION,
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'notes': counts['notes'],
+        'seed': args.seed,
+        'generated': counts,
+        'benchmarks': benchmarks,
+        'fs_calls': fs_calls,
+    }
+    output = args.output or f"bench-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+
+    for name, result in benchmarks.items():
+        rate = f"{result['ops_per_sec']:.0f} ops/s" if result['ops'] > 1 else ""
+        print(f"{name:<26}{result['seconds']:>10.4f}s  {rate}")
+    for name, calls in fs_calls.items():
+        detail = ', '.join(f"{call} {count:.2f}" for call, count in calls.items() if call != 'total')
+        print(f"{name:<26}{calls['total']:>10.2f} fs calls/op  ({detail})")
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+
+class BoundedCache:
+    """Size-capped LRU mapping with an optional time-to-live
+
+    Used for per-path state that would otherwise grow for the life of the
+    watcher. Once max_entries is exceeded the least recently used entries are
+    evicted, skipping any key for which pinned(key) is true. Entries older
+    than ttl seconds are dropped when they are next looked up.
+    """
+
+    def __init__(self, max_entries, ttl=None, pinned=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.pinned = pinned
+        self._data = OrderedDict()  # key -> (value, expires)
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _live(self, key):
+        """Return the entry for key, dropping it if it has expired (caller holds the lock)"""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] < time.monotonic():
+            del self._data[key]
+            self.expirations += 1
+            return None
+        return entry
+
+    def get(self, key, default=None):
+        """Look up key, counting a hit or miss and marking it recently used"""
+        with self._lock:
+            entry = self._live(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._data.move_to_end(key)
+            return entry[0]
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._live(key) is not None
+
+    def __getitem__(self, key):
+        with self._lock:
+            entry = self._live(key)
+            if entry is None:
+                raise KeyError(key)
+            return entry[0]
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            expires = time.monotonic() + self.ttl if self.ttl else None
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            if len(self._data) > self.max_entries:
+                self._evict()
+
+    def __delitem__(self, key):
+        with self._lock:
+            del self._data[key]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def pop(self, key, default=None):
+        """Remove key and return its value"""
+        with self._lock:
+            entry = self._live(key)
+            if entry is None:
+                return default
+            del self._data[key]
+            return entry[0]
+
+    def rekey(self, src_key, dest_key):
+        """Carry an entry over to a new key (e.g. after a rename)"""
+        with self._lock:
+            entry = self._live(src_key)
+            if entry is not None:
+                del self._data[src_key]
+                self._data[dest_key] = entry
+
+    def rekey_tree(self, src_dir, dest_dir):
+        """Carry every entry keyed by a path under src_dir over to dest_dir, returning how many moved"""
+        src_prefix = os.path.join(str(src_dir), '')
+        dest_prefix = os.path.join(str(dest_dir), '')
+        with self._lock:
+            keys = [key for key in self._data if key.startswith(src_prefix)]
+            for key in keys:
+                self._data[dest_prefix + key[len(src_prefix):]] = self._data.pop(key)
+            return len(keys)
+
+    def prune(self, predicate):
+        """Remove every entry whose key matches predicate, returning how many were removed"""
+        with self._lock:
+            keys = [key for key in self._data if predicate(key)]
+            for key in keys:
+                del self._data[key]
+            return len(keys)
+    
+    def _evict(self):
+        """Evict least recently used, unpinned entries down to max_entries (caller holds the lock)"""
+        excess = len(self._data) - self.max_entries
+        skipped = 0
+        while excess > 0 and skipped < len(self._data):
+            key, entry = self._data.popitem(last=False)
+            if self.pinned and self.pinned(key):
+                # Pinned entries go back in as most recently used
+                self._data[key] = entry
+                skipped += 1
+                continue
+            self.evictions += 1
+            excess -= 1
+
+    def stats(self):
+        """Return the cache counters"""
+        with self._lock:
+            return {
+                'size': len(self._data),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
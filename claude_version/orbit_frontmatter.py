@@ -0,0 +1,266 @@
+import re
+import logging
+from collections import Counter
+from datetime import date
+
+import yaml
+
+try:
+    from yaml import CSafeLoader as FastSafeLoader
+    TIER_LOADER = "libyaml"
+except ImportError:
+    from yaml import SafeLoader as FastSafeLoader
+    TIER_LOADER = "pyyaml"
+
+logger = logging.getLogger(__name__)
+
+# Largest frontmatter block we are willing to read (in bytes)
+MAX_FRONTMATTER_BYTES = 64 * 1024
+
+# Parser tiers, fastest first
+TIER_SIMPLE = "simple"
+TIER_FALLBACK = "fallback"
+
+# Number of frontmatter blocks handled by each tier in this process
+tier_counts = Counter()
+
+# Shapes the simple scanner understands: flat `key: value` and `key: [a, b]`
+_KEY_LINE = re.compile(r'([A-Za-z_][A-Za-z0-9_-]*):(?: +(.*))?$')
+_PLAIN_STRING = re.compile(r'[A-Za-z_][A-Za-z0-9_ ./-]*$')
+_NUMBERED_NAME = re.compile(r'[0-9]+-[A-Za-z][A-Za-z0-9_ -]*$')
+
+# A trailing `  # comment` after a key's inline value (no brackets or quotes in it)
+_TRAILING_COMMENT = re.compile(r'\s+#[^\]\'"]*$')
+_INT = re.compile(r'[-+]?(?:0|[1-9][0-9]*)$')
+_DATE = re.compile(r'([0-9]{4})-([0-9]{2})-([0-9]{2})$')
+
+# Plain words YAML 1.1 resolves to booleans or null
+_RESERVED_WORDS = {'yes', 'no', 'true', 'false', 'on', 'off', 'null'}
+
+# Returned by parse_simple() when the block needs a real YAML parser
+NOT_SIMPLE = object()
+
+
+def read_frontmatter_block(file_path, max_bytes=MAX_FRONTMATTER_BYTES):
+    """Read only the YAML frontmatter block at the top of a note
+
+    Reads line by line up to the closing '---' and never past max_bytes, so
+    the body of the note is not touched. Returns (yaml_text, body_offset):
+    yaml_text is None if the note has no (terminated) frontmatter block, and
+    body_offset is the byte offset just past the closing delimiter, or 0 when
+    there is no frontmatter.
+    """
+    with open(file_path, 'rb') as file:
+        return read_frontmatter_stream(file, max_bytes, file_path)
+
+
+def read_frontmatter_stream(file, max_bytes=MAX_FRONTMATTER_BYTES, name=None):
+    """read_frontmatter_block() for an already open binary file"""
+    first_line = file.readline(max_bytes + 1)
+    if first_line.rstrip() != b'---' or not first_line.endswith(b'\n'):
+        return None, 0
+
+    position = len(first_line)
+    lines = []
+    while position < max_bytes:
+        line = file.readline(max_bytes - position + 1)
+        if not line:
+            # End of file without a closing delimiter
+            return None, 0
+        if line.startswith(b'---'):
+            yaml_text = b''.join(lines).decode('utf-8')
+            # The newline before the closing delimiter is not part of the YAML
+            if yaml_text.endswith('\n'):
+                yaml_text = yaml_text[:-1]
+            if yaml_text.endswith('\r'):
+                yaml_text = yaml_text[:-1]
+            return yaml_text, position + 3
+        lines.append(line)
+        position += len(line)
+
+    logger.warning(f"Frontmatter in {name} is not closed within {max_bytes} bytes")
+    return None, 0
+
+
+def _simple_scalar(value):
+    """Resolve a plain scalar the way yaml.safe_load would, or return NOT_SIMPLE"""
+    if not value:
+        return None
+    if _INT.match(value):
+        return int(value)
+    match = _DATE.match(value)
+    if match:
+        try:
+            return date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+        except ValueError:
+            return NOT_SIMPLE
+    if _PLAIN_STRING.match(value) or _NUMBERED_NAME.match(value):
+        if value.lower() in _RESERVED_WORDS:
+            return NOT_SIMPLE
+        return value
+    return NOT_SIMPLE
+
+
+def parse_simple(yaml_text):
+    """Parse flat `key: value` / `key: [a, b]` frontmatter without a YAML parser
+
+    Returns the parsed dict (None for an empty block), or NOT_SIMPLE as soon as
+    anything outside those shapes is seen: indentation, block lists, quotes,
+    comments, nested flow collections or values YAML would resolve specially.
+    """
+    result = {}
+    for line in yaml_text.split('\n'):
+        line = line.rstrip()
+        if not line:
+            continue
+        match = _KEY_LINE.match(line)
+        if not match:
+            return NOT_SIMPLE
+        key, value = match.group(1), (match.group(2) or '').strip()
+        if key.lower() in _RESERVED_WORDS:
+            return NOT_SIMPLE
+
+        if value.startswith('['):
+            if not value.endswith(']'):
+                return NOT_SIMPLE
+            inner = value[1:-1].strip()
+            items = []
+            if inner:
+                for item in inner.split(','):
+                    item = _simple_scalar(item.strip())
+                    if item is NOT_SIMPLE or item is None:
+                        return NOT_SIMPLE
+                    items.append(item)
+            result[key] = items
+        else:
+            value = _simple_scalar(value)
+            if value is NOT_SIMPLE:
+                return NOT_SIMPLE
+            result[key] = value
+
+    return result or None
+
+
+def parse_frontmatter(yaml_text):
+    """Parse a frontmatter block with the fastest parser that can handle it
+
+    Tier 1 is the simple scanner, tier 2 yaml.load with the libyaml CSafeLoader
+    (pure-Python SafeLoader if libyaml is missing). Returns (frontmatter, tier);
+    YAML errors from tier 2 propagate so the caller can fall back to its fixer.
+    """
+    frontmatter = parse_simple(yaml_text)
+    if frontmatter is not NOT_SIMPLE:
+        tier_counts[TIER_SIMPLE] += 1
+        return frontmatter, TIER_SIMPLE
+
+    frontmatter = yaml.load(yaml_text, Loader=FastSafeLoader)
+    tier_counts[TIER_LOADER] += 1
+    return frontmatter, TIER_LOADER
+
+
+# A top-level `key:` line in a frontmatter block
+_TOP_LEVEL_KEY = re.compile(r'([^\s#\-][^:]*?):(?:\s|$)')
+
+
+def _dump_flow(value):
+    """Serialise a value as a single-line YAML flow scalar or list"""
+    if value is None:
+        return ''
+    text = yaml.safe_dump(value if isinstance(value, list) else [value],
+                          default_flow_style=True, width=float('inf'), allow_unicode=True).strip()
+    return text if isinstance(value, list) else text[1:-1]
+
+
+def _blank_tail(lines, start, end):
+    """Return where the blank lines ending lines[start:end] begin"""
+    while end > start and not lines[end - 1].strip():
+        end -= 1
+    return end
+
+
+def _key_blocks(lines):
+    """Map each top-level key to the (start, end) line range of its entry
+
+    Blank lines after an entry are not part of it, so patching the entry
+    leaves them where they are.
+    """
+    blocks = {}
+    current = None
+    for number, line in enumerate(lines):
+        match = _TOP_LEVEL_KEY.match(line)
+        if match:
+            if current:
+                blocks[current[0]] = (current[1], _blank_tail(lines, current[1] + 1, number))
+            current = (match.group(1).strip(), number)
+        elif current and line[:1] not in ('', ' ', '\t', '-'):
+            # Comments and anything else at column 0 end the entry
+            blocks[current[0]] = (current[1], _blank_tail(lines, current[1] + 1, number))
+            current = None
+    if current:
+        blocks[current[0]] = (current[1], _blank_tail(lines, current[1] + 1, len(lines)))
+    return blocks
+
+
+def _patch_entry(key, entry_lines, value):
+    """Render new lines for one key, keeping the existing style and appending where possible"""
+    try:
+        old_value = (yaml.safe_load('\n'.join(entry_lines)) or {}).get(key)
+    except yaml.YAMLError:
+        old_value = None
+    if old_value == value:
+        return entry_lines
+
+    block_items = [line for line in entry_lines[1:] if line.lstrip().startswith('- ')]
+    line = entry_lines[0].rstrip()
+    # Keep a trailing comment on the key line whatever happens to the value
+    match = _TRAILING_COMMENT.search(line)
+    comment = match.group(0) if match else ''
+    line = line[:len(line) - len(comment)]
+    inline = line.split(':', 1)[1].strip()
+
+    if isinstance(value, list) and block_items and not inline:
+        # Block sequence: keep the existing item indentation
+        indent = block_items[0][:len(block_items[0]) - len(block_items[0].lstrip())]
+        if isinstance(old_value, list) and value[:len(old_value)] == old_value:
+            new_items = [f"{indent}- {_dump_flow(item)}" for item in value[len(old_value):]]
+            return entry_lines + new_items
+        return [f"{key}:{comment}"] + [f"{indent}- {_dump_flow(item)}" for item in value]
+
+    if (isinstance(value, list) and isinstance(old_value, list) and old_value
+            and value[:len(old_value)] == old_value
+            and len(entry_lines) == 1 and inline.startswith('[') and inline.endswith(']')):
+        # Flow sequence: append new items before the closing bracket
+        added = ', '.join(_dump_flow(item) for item in value[len(old_value):])
+        return [f"{line[:-1]}, {added}]{comment}"]
+
+    rendered = _dump_flow(value)
+    return [f"{key}: {rendered}{comment}" if rendered else f"{key}:{comment}"]
+
+
+def patch_frontmatter(yaml_text, updates):
+    """Apply updates to a raw frontmatter block, touching only the changed keys
+
+    Every other line, including comments, key order, quoting and Templater
+    tags, is left exactly as it was. Lists that only grew keep their flow or
+    block style and get the new items appended. Keys that don't exist yet
+    are added at the end. Returns the new YAML text, which is identical to
+    the input when nothing changed.
+    """
+    lines = yaml_text.split('\n') if yaml_text else []
+    blocks = _key_blocks(lines)
+
+    # Patch from the bottom up so earlier line ranges stay valid
+    for key, (start, end) in sorted(
+            ((key, blocks[key]) for key in updates if key in blocks),
+            key=lambda item: item[1][0], reverse=True):
+        lines[start:end] = _patch_entry(key, lines[start:end], updates[key])
+
+    # New keys go after the last entry, ahead of any blank lines closing the block
+    end = _blank_tail(lines, 0, len(lines))
+    for key, value in updates.items():
+        if key not in blocks:
+            rendered = _dump_flow(value)
+            lines.insert(end, f"{key}: {rendered}" if rendered else f"{key}:")
+            end += 1
+
+    return '\n'.join(lines)
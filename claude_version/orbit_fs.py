@@ -0,0 +1,270 @@
+import io
+import os
+import stat
+import time
+import threading
+from collections import Counter, namedtuple
+
+import orbit_io
+from orbit_frontmatter import read_frontmatter_block, read_frontmatter_stream, MAX_FRONTMATTER_BYTES
+
+
+class RealFS:
+    """Filesystem access for OrbitSystem, backed by the real disk
+
+    Every filesystem operation OrbitSystem and VaultIndex make goes through
+    one of these methods, so an alternative backend (see MemoryFS) can be
+    swapped in for tests and benchmarks. Writes not yet committed by
+    orbit_io.flush() are read from their temporary files.
+    """
+
+    # Whether state written through this backend survives the process
+    persistent = True
+
+    def exists(self, path):
+        return os.path.exists(orbit_io.current_path(path))
+
+    def isdir(self, path):
+        return os.path.isdir(path)
+
+    def makedirs(self, path, exist_ok=False):
+        os.makedirs(path, exist_ok=exist_ok)
+
+    def listdir(self, path):
+        orbit_io.settle(path)
+        return os.listdir(path)
+
+    def walk(self, top):
+        orbit_io.settle(top)
+        return os.walk(top)
+
+    def stat(self, path):
+        return os.stat(orbit_io.current_path(path))
+
+    def rename(self, src_path, dest_path):
+        orbit_io.rename(src_path, dest_path)
+
+    def remove(self, path):
+        orbit_io.remove(path)
+
+    def read_text(self, path):
+        with open(orbit_io.current_path(path), 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def read_frontmatter_block(self, path, max_bytes=MAX_FRONTMATTER_BYTES):
+        return read_frontmatter_block(orbit_io.current_path(path), max_bytes)
+
+    def atomic_write(self, path, content):
+        orbit_io.atomic_write(path, content)
+
+    def rewrite_header(self, path, header, body_offset):
+        orbit_io.rewrite_header(path, header, body_offset)
+
+    def flush(self):
+        return orbit_io.flush()
+
+
+# The parts of os.stat_result that ORBIT looks at
+MemoryStat = namedtuple("MemoryStat", ["st_mode", "st_size", "st_mtime", "st_mtime_ns"])
+
+
+class MemoryFS:
+    """In-memory filesystem with the RealFS interface
+
+    Files are kept as bytes in a dict and every call is counted in
+    self.calls by method name, so tests and benchmarks can check how many
+    filesystem operations an event costs, e.g.
+
+        fs.reset_calls()
+        orbit_system.process_file(path)
+        assert fs.calls['stat'] <= 2
+    """
+
+    persistent = False
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._files = {}  # path -> (data, mtime_ns)
+        self._dirs = {}  # directory -> set of child names
+        self.calls = Counter()
+        self._add_dir(os.sep)
+
+    # Bookkeeping
+
+    def reset_calls(self):
+        """Zero the call counters"""
+        self.calls.clear()
+
+    def total_calls(self):
+        """Return the number of calls since the last reset"""
+        return sum(self.calls.values())
+
+    def _norm(self, path):
+        return os.path.normpath(str(path))
+
+    def _add_dir(self, path):
+        """Create a directory and any missing parents (caller holds the lock)"""
+        if path in self._dirs:
+            return
+        parent = os.path.dirname(path)
+        if parent != path:
+            self._add_dir(parent)
+            self._dirs[parent].add(os.path.basename(path))
+        self._dirs[path] = set()
+
+    def _set_file(self, path, data):
+        """Store file contents, stamping a new mtime (caller holds the lock)"""
+        parent = os.path.dirname(path)
+        if parent not in self._dirs:
+            raise FileNotFoundError(f"No such directory: {parent}")
+        if path in self._dirs:
+            raise IsADirectoryError(f"Is a directory: {path}")
+        previous = self._files.get(path)
+        mtime_ns = time.time_ns()
+        if previous and previous[1] >= mtime_ns:
+            mtime_ns = previous[1] + 1
+        self._files[path] = (data, mtime_ns)
+        self._dirs[parent].add(os.path.basename(path))
+
+    def add_file(self, path, content):
+        """Create a file (and its directories) without counting a call"""
+        path = self._norm(path)
+        with self._lock:
+            self._add_dir(os.path.dirname(path))
+            self._set_file(path, content.encode('utf-8') if isinstance(content, str) else content)
+
+    def load(self, real_path, target_path=None):
+        """Copy a directory tree from disk into memory without counting calls"""
+        real_path = str(real_path)
+        target_path = self._norm(target_path or real_path)
+        for root, dirs, files in os.walk(real_path):
+            relative = os.path.relpath(root, real_path)
+            directory = os.path.normpath(os.path.join(target_path, relative))
+            with self._lock:
+                self._add_dir(directory)
+            for file in files:
+                with open(os.path.join(root, file), 'rb') as f:
+                    self.add_file(os.path.join(directory, file), f.read())
+
+    def read_bytes(self, path):
+        """Return a file's contents without counting a call"""
+        with self._lock:
+            return self._files[self._norm(path)][0]
+
+    # RealFS interface
+
+    def exists(self, path):
+        self.calls['exists'] += 1
+        path = self._norm(path)
+        with self._lock:
+            return path in self._files or path in self._dirs
+
+    def isdir(self, path):
+        self.calls['isdir'] += 1
+        with self._lock:
+            return self._norm(path) in self._dirs
+
+    def makedirs(self, path, exist_ok=False):
+        self.calls['makedirs'] += 1
+        path = self._norm(path)
+        with self._lock:
+            if path in self._files:
+                raise FileExistsError(f"File exists: {path}")
+            if path in self._dirs:
+                if not exist_ok:
+                    raise FileExistsError(f"File exists: {path}")
+                return
+            self._add_dir(path)
+
+    def listdir(self, path):
+        self.calls['listdir'] += 1
+        path = self._norm(path)
+        with self._lock:
+            if path not in self._dirs:
+                raise FileNotFoundError(f"No such directory: {path}")
+            return sorted(self._dirs[path])
+
+    def walk(self, top):
+        self.calls['walk'] += 1
+        pending = [self._norm(top)]
+        while pending:
+            root = pending.pop()
+            with self._lock:
+                children = self._dirs.get(root)
+                if children is None:
+                    continue
+                dirs = sorted(name for name in children if os.path.join(root, name) in self._dirs)
+                files = sorted(name for name in children if os.path.join(root, name) in self._files)
+            yield root, dirs, files
+            # Honour pruning of dirs by the caller, like os.walk
+            pending.extend(os.path.join(root, name) for name in reversed(dirs))
+
+    def stat(self, path):
+        self.calls['stat'] += 1
+        path = self._norm(path)
+        with self._lock:
+            if path in self._files:
+                data, mtime_ns = self._files[path]
+                return MemoryStat(stat.S_IFREG | 0o644, len(data), mtime_ns / 1e9, mtime_ns)
+            if path in self._dirs:
+                return MemoryStat(stat.S_IFDIR | 0o755, 0, 0.0, 0)
+        raise FileNotFoundError(f"No such file or directory: {path}")
+
+    def rename(self, src_path, dest_path):
+        self.calls['rename'] += 1
+        src_path = self._norm(src_path)
+        dest_path = self._norm(dest_path)
+        with self._lock:
+            if os.path.dirname(dest_path) not in self._dirs:
+                raise FileNotFoundError(f"No such directory: {os.path.dirname(dest_path)}")
+            if src_path in self._files:
+                self._files[dest_path] = self._files.pop(src_path)
+            elif src_path in self._dirs:
+                prefix = os.path.join(src_path, '')
+                for path in [path for path in self._dirs if path == src_path or path.startswith(prefix)]:
+                    self._dirs[dest_path + path[len(src_path):]] = self._dirs.pop(path)
+                for path in [path for path in self._files if path.startswith(prefix)]:
+                    self._files[dest_path + path[len(src_path):]] = self._files.pop(path)
+            else:
+                raise FileNotFoundError(f"No such file or directory: {src_path}")
+            self._dirs[os.path.dirname(src_path)].discard(os.path.basename(src_path))
+            self._dirs[os.path.dirname(dest_path)].add(os.path.basename(dest_path))
+
+    def remove(self, path):
+        self.calls['remove'] += 1
+        path = self._norm(path)
+        with self._lock:
+            if path not in self._files:
+                raise FileNotFoundError(f"No such file: {path}")
+            del self._files[path]
+            self._dirs[os.path.dirname(path)].discard(os.path.basename(path))
+
+    def _data(self, path):
+        path = self._norm(path)
+        with self._lock:
+            if path not in self._files:
+                raise FileNotFoundError(f"No such file: {path}")
+            return self._files[path][0]
+
+    def read_text(self, path):
+        self.calls['read_text'] += 1
+        return self._data(path).decode('utf-8')
+
+    def read_frontmatter_block(self, path, max_bytes=MAX_FRONTMATTER_BYTES):
+        self.calls['read_frontmatter_block'] += 1
+        return read_frontmatter_stream(io.BytesIO(self._data(path)), max_bytes, path)
+
+    def atomic_write(self, path, content):
+        self.calls['atomic_write'] += 1
+        with self._lock:
+            self._set_file(self._norm(path), content.encode('utf-8') if isinstance(content, str) else content)
+
+    def rewrite_header(self, path, header, body_offset):
+        self.calls['rewrite_header'] += 1
+        path = self._norm(path)
+        with self._lock:
+            self._set_file(path, header + self._data(path)[body_offset:])
+
+    def flush(self):
+        self.calls['flush'] += 1
+        return 0
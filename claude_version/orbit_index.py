@@ -0,0 +1,367 @@
+import os
+import json
+import sqlite3
+import logging
+import bisect
+import threading
+
+from orbit_fs import RealFS
+
+logger = logging.getLogger(__name__)
+
+# Directories that never contain ORBIT notes
+SKIP_DIRS = {".orbit", ".obsidian", ".trash", ".git"}
+
+# Frontmatter keys that link notes by name
+LINK_KEYS = ("orbits", "satellites")
+
+
+def normalize_links(value):
+    """Normalize an orbits/satellites value to a list of note names
+
+    Returns None if the value is present but not in a usable format.
+    """
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = [value]
+    elif isinstance(value, dict):
+        # Handle format like {item1, item2} which becomes a dict with keys
+        value = list(value.keys())
+    if not isinstance(value, list):
+        return None
+    return [str(item) for item in value if item]
+
+
+class VaultIndex:
+    """Persistent SQLite index of the notes in a vault
+
+    Maps note name, path, type, domain, orbits and satellites so that name
+    lookups are a B-tree search instead of an os.walk of the vault. Paths are
+    stored relative to the vault root; the API takes and returns absolute paths.
+
+    Name lookups are served from an in-memory name -> paths map that is loaded
+    once by refresh() and kept current by upsert/remove/move, so the watcher
+    never touches the database or the filesystem to resolve a project. The
+    orbits/satellites links are mirrored the same way, with a reverse map
+    from each linked name to the notes that list it.
+    """
+
+    def __init__(self, vault_path, db_path=None, fs=None):
+        self.vault_path = str(vault_path)
+        # Filesystem backend used to walk and stat the vault
+        self.fs = fs if fs is not None else RealFS()
+        self._prefix = os.path.join(self.vault_path, '')
+        if db_path is None:
+            db_path = os.path.join(self.vault_path, ".orbit", "index.db")
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        # Lowercased note name -> sorted list of vault-relative paths
+        self._names = {}
+        # Vault-relative path -> {key: [names]} for notes with links, and
+        # key -> lowercased linked name -> set of paths listing it
+        self._links = {}
+        self._referrers = {key: {} for key in LINK_KEYS}
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS notes (
+                path TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                name_lower TEXT NOT NULL,
+                type TEXT,
+                domain TEXT,
+                orbits TEXT,
+                satellites TEXT,
+                mtime REAL
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS notes_name ON notes(name_lower)")
+        self._conn.commit()
+
+    def _rel(self, path):
+        """Convert an absolute path to a vault-relative key"""
+        path = str(path)
+        if path.startswith(self._prefix):
+            return path[len(self._prefix):]
+        return os.path.relpath(path, self.vault_path)
+
+    def _abs(self, rel_path):
+        """Convert a vault-relative key to an absolute path"""
+        return os.path.join(self.vault_path, rel_path)
+
+    def _name_add(self, rel_path):
+        """Add a path to the in-memory name map"""
+        paths = self._names.setdefault(os.path.basename(rel_path)[:-3].lower(), [])
+        position = bisect.bisect_left(paths, rel_path)
+        if position == len(paths) or paths[position] != rel_path:
+            paths.insert(position, rel_path)
+
+    def _name_discard(self, rel_path):
+        """Remove a path from the in-memory name map"""
+        name_lower = os.path.basename(rel_path)[:-3].lower()
+        paths = self._names.get(name_lower)
+        if paths and rel_path in paths:
+            paths.remove(rel_path)
+            if not paths:
+                del self._names[name_lower]
+
+    def _links_set(self, rel_path, links):
+        """Replace the links recorded for a path, returning the old ones (caller holds the lock)"""
+        old_links = self._links.pop(rel_path, None) or {}
+        for key, names in old_links.items():
+            referrers = self._referrers[key]
+            for name in names:
+                paths = referrers.get(name.lower())
+                if paths is not None:
+                    paths.discard(rel_path)
+                    if not paths:
+                        del referrers[name.lower()]
+        links = {key: names for key, names in (links or {}).items() if names}
+        if links:
+            self._links[rel_path] = links
+            for key, names in links.items():
+                for name in names:
+                    self._referrers[key].setdefault(name.lower(), set()).add(rel_path)
+        return old_links
+
+    def _links_from_row(self, orbits, satellites):
+        """Decode the link columns of a row"""
+        return {'orbits': json.loads(orbits) if orbits else [],
+                'satellites': json.loads(satellites) if satellites else []}
+
+    def _row(self, rel_path, frontmatter, mtime):
+        """Build a table row from a note's frontmatter"""
+        frontmatter = frontmatter if isinstance(frontmatter, dict) else {}
+        name = os.path.basename(rel_path)[:-3]
+        note_type = frontmatter.get('type')
+        domain = frontmatter.get('domain')
+        return (
+            rel_path,
+            name,
+            name.lower(),
+            str(note_type) if note_type else None,
+            str(domain) if domain else None,
+            json.dumps(normalize_links(frontmatter.get('orbits'))),
+            json.dumps(normalize_links(frontmatter.get('satellites'))),
+            mtime,
+        )
+
+    def refresh(self, parse):
+        """Bring the index up to date with the vault
+
+        Walks the vault once and only calls parse(path) -> frontmatter for
+        notes whose mtime differs from the indexed one.
+        """
+        with self._lock:
+            known = dict(self._conn.execute("SELECT path, mtime FROM notes"))
+        seen = set()
+        rows = []
+
+        for root, dirs, files in self.fs.walk(self.vault_path):
+            dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
+            for file in files:
+                if not file.endswith('.md'):
+                    continue
+                path = os.path.join(root, file)
+                rel_path = self._rel(path)
+                seen.add(rel_path)
+                try:
+                    mtime = self.fs.stat(path).st_mtime
+                except OSError:
+                    continue
+                if known.get(rel_path) == mtime:
+                    continue
+                rows.append(self._row(rel_path, parse(path), mtime))
+
+        stale = [(rel_path,) for rel_path in known if rel_path not in seen]
+
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO notes VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self._conn.executemany("DELETE FROM notes WHERE path = ?", stale)
+            self._conn.commit()
+
+            # Build the in-memory name and link maps
+            self._names = {}
+            self._links = {}
+            self._referrers = {key: {} for key in LINK_KEYS}
+            for rel_path, orbits, satellites in self._conn.execute(
+                    "SELECT path, orbits, satellites FROM notes ORDER BY path"):
+                self._names.setdefault(os.path.basename(rel_path)[:-3].lower(), []).append(rel_path)
+                if orbits != '[]' or satellites != '[]':
+                    self._links_set(rel_path, self._links_from_row(orbits, satellites))
+
+        logger.info(f"Indexed vault {self.vault_path}: {len(seen)} notes, {len(rows)} updated, {len(stale)} removed")
+
+    def upsert(self, path, frontmatter, mtime=None):
+        """Add or update a single note"""
+        if mtime is None:
+            try:
+                mtime = self.fs.stat(path).st_mtime
+            except OSError:
+                mtime = None
+        rel_path = self._rel(path)
+        row = self._row(rel_path, frontmatter, mtime)
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO notes VALUES (?, ?, ?, ?, ?, ?, ?, ?)", row)
+            self._conn.commit()
+            self._name_add(rel_path)
+            self._links_set(rel_path, self._links_from_row(row[5], row[6]))
+
+    def update(self, path, updates):
+        """Apply frontmatter updates ORBIT has written to an indexed note
+
+        Only the indexed keys (type, domain, orbits, satellites) are used;
+        the rest of the row is kept.
+        """
+        rel_path = self._rel(path)
+        columns = {}
+        for key in ('type', 'domain'):
+            if key in updates:
+                columns[key] = str(updates[key]) if updates[key] else None
+        for key in LINK_KEYS:
+            if key in updates:
+                columns[key] = json.dumps(normalize_links(updates[key]))
+        if not columns:
+            return
+        with self._lock:
+            cursor = self._conn.execute(
+                f"UPDATE notes SET {', '.join(f'{column} = ?' for column in columns)} WHERE path = ?",
+                (*columns.values(), rel_path))
+            self._conn.commit()
+            if not cursor.rowcount:
+                return
+            if any(key in columns for key in LINK_KEYS):
+                links = dict(self._links.get(rel_path) or {})
+                for key in LINK_KEYS:
+                    if key in columns:
+                        links[key] = json.loads(columns[key])
+                self._links_set(rel_path, links)
+
+    def remove(self, path):
+        """Remove a note from the index"""
+        rel_path = self._rel(path)
+        with self._lock:
+            self._conn.execute("DELETE FROM notes WHERE path = ?", (rel_path,))
+            self._conn.commit()
+            self._name_discard(rel_path)
+            self._links_set(rel_path, None)
+
+    def move(self, src_path, dest_path):
+        """Re-key a note after it has been moved or renamed"""
+        src_rel = self._rel(src_path)
+        dest_rel = self._rel(dest_path)
+        name = os.path.basename(dest_rel)[:-3]
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM notes WHERE path = ?", (src_rel,)).fetchone() is None:
+                # Already re-keyed (e.g. ORBIT's own move)
+                return
+            self._conn.execute("DELETE FROM notes WHERE path = ?", (dest_rel,))
+            self._conn.execute(
+                "UPDATE notes SET path = ?, name = ?, name_lower = ? WHERE path = ?",
+                (dest_rel, name, name.lower(), src_rel))
+            self._conn.commit()
+            self._name_discard(src_rel)
+            self._name_add(dest_rel)
+            self._links_set(dest_rel, self._links_set(src_rel, None))
+
+    def move_tree(self, src_dir, dest_dir):
+        """Re-key every note under a directory after the directory has been moved"""
+        src_prefix = os.path.join(self._rel(src_dir), '')
+        dest_prefix = os.path.join(self._rel(dest_dir), '')
+        with self._lock:
+            self._conn.execute(
+                "UPDATE notes SET path = ? || substr(path, ?) WHERE substr(path, 1, ?) = ?",
+                (dest_prefix, len(src_prefix) + 1, len(src_prefix), src_prefix))
+            self._conn.commit()
+            for name_lower, paths in self._names.items():
+                if any(path.startswith(src_prefix) for path in paths):
+                    self._names[name_lower] = sorted(
+                        dest_prefix + path[len(src_prefix):] if path.startswith(src_prefix) else path
+                        for path in paths)
+            for path in [path for path in self._links if path.startswith(src_prefix)]:
+                self._links_set(dest_prefix + path[len(src_prefix):], self._links_set(path, None))
+
+    def remove_tree(self, dir_path):
+        """Remove every note under a directory that has been deleted"""
+        prefix = os.path.join(self._rel(dir_path), '')
+        with self._lock:
+            self._conn.execute("DELETE FROM notes WHERE substr(path, 1, ?) = ?", (len(prefix), prefix))
+            self._conn.commit()
+            for name_lower in list(self._names):
+                paths = [path for path in self._names[name_lower] if not path.startswith(prefix)]
+                if paths:
+                    self._names[name_lower] = paths
+                else:
+                    del self._names[name_lower]
+            for path in [path for path in self._links if path.startswith(prefix)]:
+                self._links_set(path, None)
+
+    def first_under(self, dir_path):
+        """Return the path of one note indexed under a directory, or None"""
+        prefix = os.path.join(self._rel(dir_path), '')
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT path FROM notes WHERE substr(path, 1, ?) = ? LIMIT 1", (len(prefix), prefix)).fetchone()
+        return self._abs(row[0]) if row else None
+
+    def contains(self, path):
+        """Check whether a note is indexed at the given path"""
+        rel_path = self._rel(path)
+        return rel_path in self._names.get(os.path.basename(rel_path)[:-3].lower(), ())
+
+    def find(self, name):
+        """Find a note path by name (case insensitive), preferring an exact-case match"""
+        if name.endswith('.md'):
+            name = name[:-3]
+        paths = self._names.get(name.lower())
+        if not paths:
+            return None
+        exact = f"{name}.md"
+        for rel_path in paths:
+            if os.path.basename(rel_path) == exact:
+                return self._abs(rel_path)
+        return self._abs(paths[0])
+
+    def referrers(self, name, key):
+        """Return the paths of notes that list name (case insensitive) under key"""
+        if name.endswith('.md'):
+            name = name[:-3]
+        with self._lock:
+            paths = sorted(self._referrers[key].get(name.lower(), ()))
+        return [self._abs(rel_path) for rel_path in paths]
+
+    def get(self, path):
+        """Return the indexed record for a note, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT path, name, type, domain, orbits, satellites FROM notes WHERE path = ?",
+                (self._rel(path),)).fetchone()
+        return self._record(row) if row else None
+
+    def records(self):
+        """Iterate over all indexed notes"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path, name, type, domain, orbits, satellites FROM notes ORDER BY path").fetchall()
+        for row in rows:
+            yield self._record(row)
+
+    def _record(self, row):
+        """Convert a table row to a record dict"""
+        rel_path, name, note_type, domain, orbits, satellites = row
+        return {
+            'path': self._abs(rel_path),
+            'name': name,
+            'type': note_type,
+            'domain': domain,
+            'orbits': json.loads(orbits) if orbits else [],
+            'satellites': json.loads(satellites) if satellites else [],
+        }
+
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            self._conn.close()
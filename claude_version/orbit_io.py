@@ -0,0 +1,214 @@
+import os
+import shutil
+import logging
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Size of the chunks used to copy note bodies (in bytes)
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# Suffix for temporary files; deliberately not '.md' so the watcher ignores them
+TEMP_SUFFIX = ".orbit-tmp"
+
+# Durability modes:
+#   "always" - fsync every file and its directory before the write returns
+#   "batch"  - group commit: new content waits in its temporary file until
+#              flush() fsyncs all of them, swaps them in and fsyncs their
+#              directories in one go
+#   "off"    - never fsync (atomic replacement only)
+FSYNC_ALWAYS = "always"
+FSYNC_BATCH = "batch"
+FSYNC_OFF = "off"
+
+fsync_mode = FSYNC_BATCH
+FSYNC_MODES = (FSYNC_ALWAYS, FSYNC_BATCH, FSYNC_OFF)
+
+# Process umask, for giving new files the permissions open() would
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+# Batch mode: target path -> temporary file holding its new content,
+# swapped in by the next flush()
+_pending_replaces = {}
+_pending_lock = threading.Lock()
+
+
+def set_fsync_mode(mode):
+    """Select how writes are made durable ("always", "batch" or "off")"""
+    global fsync_mode
+    if mode not in FSYNC_MODES:
+        raise ValueError(f"Unknown fsync mode {mode!r}, expected one of {', '.join(FSYNC_MODES)}")
+    if fsync_mode == FSYNC_BATCH and mode != FSYNC_BATCH:
+        flush()
+    fsync_mode = mode
+
+
+def _fsync_path(path):
+    """fsync a file or directory by path"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _replace(temp_path, file_path):
+    """Swap a fully written temporary file into place, or leave it for the next flush() in batch mode"""
+    if fsync_mode == FSYNC_BATCH:
+        with _pending_lock:
+            superseded = _pending_replaces.pop(file_path, None)
+            _pending_replaces[file_path] = temp_path
+        if superseded:
+            _discard(superseded)
+        return
+    if fsync_mode == FSYNC_ALWAYS:
+        _fsync_path(temp_path)
+    os.replace(temp_path, file_path)
+    if fsync_mode == FSYNC_ALWAYS:
+        _fsync_path(os.path.dirname(file_path) or '.')
+
+
+def current_path(file_path):
+    """Path holding a file's latest content: its pending temporary file in batch mode, else itself"""
+    with _pending_lock:
+        return _pending_replaces.get(str(file_path), file_path)
+
+
+def settle(path):
+    """Swap in pending writes at or below path before its directory listing or name is relied on"""
+    path = str(path)
+    prefix = os.path.join(path, '')
+    with _pending_lock:
+        due = any(key == path or key.startswith(prefix) for key in _pending_replaces)
+    return flush() if due else 0
+
+
+def rename(src_path, dest_path):
+    """Rename a file or directory, carrying a pending write for a file along"""
+    src_path, dest_path = str(src_path), str(dest_path)
+    settle(dest_path)
+    with _pending_lock:
+        temp_path = _pending_replaces.get(src_path)
+    if temp_path is None:
+        settle(src_path)
+    if temp_path is None or os.path.lexists(src_path):
+        os.rename(src_path, dest_path)
+    # A file created since the last flush only exists as its pending write
+    if temp_path is not None:
+        with _pending_lock:
+            if _pending_replaces.get(src_path) == temp_path:
+                _pending_replaces[dest_path] = _pending_replaces.pop(src_path)
+
+
+def remove(path):
+    """Remove a file, dropping any pending write for it"""
+    path = str(path)
+    with _pending_lock:
+        temp_path = _pending_replaces.pop(path, None)
+    if temp_path:
+        _discard(temp_path)
+        if not os.path.lexists(path):
+            return
+    os.remove(path)
+
+
+def _temp_file(file_path):
+    """Create a temporary file next to file_path, returning (fd, temp_path)"""
+    return tempfile.mkstemp(dir=os.path.dirname(file_path) or '.', prefix=".", suffix=TEMP_SUFFIX)
+
+
+def _discard(temp_path):
+    """Remove a temporary file after a failed write"""
+    try:
+        os.unlink(temp_path)
+    except OSError:
+        pass
+
+
+def atomic_write(file_path, content, encoding='utf-8'):
+    """Write a whole file atomically
+
+    The content goes to a temporary file in the same directory which then
+    replaces file_path with os.replace, so readers (and sync clients) see
+    either the old file or the complete new one, never a truncated note.
+    """
+    file_path = str(file_path)
+    data = content.encode(encoding) if isinstance(content, str) else content
+    fd, temp_path = _temp_file(file_path)
+    try:
+        with os.fdopen(fd, 'wb') as temp_file:
+            temp_file.write(data)
+        source = current_path(file_path)
+        if os.path.exists(source):
+            shutil.copymode(source, temp_path)
+        else:
+            os.chmod(temp_path, 0o666 & ~_UMASK)
+        _replace(temp_path, file_path)
+    except BaseException:
+        _discard(temp_path)
+        raise
+
+
+def rewrite_header(file_path, header, body_offset, chunk_size=COPY_CHUNK_SIZE):
+    """Replace everything before body_offset in a file with header
+
+    The new header is written to a temporary file next to the original, the
+    body is copied over from body_offset in fixed-size chunks without being
+    decoded, and the temporary file then atomically replaces the original.
+    Peak memory is the header plus one chunk, however large the note is.
+    """
+    file_path = str(file_path)
+    source = current_path(file_path)
+    fd, temp_path = _temp_file(file_path)
+    try:
+        with os.fdopen(fd, 'wb') as temp_file, open(source, 'rb') as original:
+            temp_file.write(header)
+            original.seek(body_offset)
+            shutil.copyfileobj(original, temp_file, chunk_size)
+        shutil.copymode(source, temp_path)
+        _replace(temp_path, file_path)
+    except BaseException:
+        _discard(temp_path)
+        raise
+
+
+def flush():
+    """Commit the writes made since the last flush as one group
+
+    Every pending temporary file is fsynced, then swapped into place, then
+    each directory involved is fsynced once, so no file is renamed over a
+    note before its content is on disk. Called at the end of a burst of
+    events so a bulk operation pays for one round of fsyncs instead of one
+    per write. Returns the number of files committed.
+    """
+    with _pending_lock:
+        pending = dict(_pending_replaces)
+        _pending_replaces.clear()
+
+    committed = []
+    for file_path, temp_path in pending.items():
+        try:
+            _fsync_path(temp_path)
+        except OSError as e:
+            logger.error(f"Could not fsync {temp_path} for {file_path}: {str(e)}")
+            _discard(temp_path)
+            continue
+        committed.append((temp_path, file_path))
+    directories = set()
+    for temp_path, file_path in committed:
+        try:
+            os.replace(temp_path, file_path)
+        except OSError as e:
+            # The directory may have been moved or deleted since the write
+            logger.error(f"Could not replace {file_path}: {str(e)}")
+            _discard(temp_path)
+            continue
+        directories.add(os.path.dirname(file_path) or '.')
+    for directory in directories:
+        try:
+            _fsync_path(directory)
+        except OSError as e:
+            logger.debug(f"Could not fsync {directory}: {str(e)}")
+    return len(committed)
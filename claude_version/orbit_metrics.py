@@ -0,0 +1,146 @@
+import time
+import bisect
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+from orbit_cache import BoundedCache
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds (in seconds) for per-stage timings
+STAGE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# Bucket upper bounds (in seconds) for event-to-move latency; moves wait for
+# the debounce window and MIN_FILE_AGE, so these run much longer
+LATENCY_BUCKETS = (0.5, 1, 2, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+
+class Histogram:
+    """Fixed-bucket histogram of durations"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        """Record one duration (in seconds)"""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """Yield (upper_bound, cumulative_count) pairs, ending with +Inf"""
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            yield bound, total
+
+
+class Metrics:
+    """Timings and counters for the watcher
+
+    Keeps one histogram per processing stage (read, parse, index, domain,
+    find_project, write, rename, ...), event counters and the latency from
+    the first event for a note to the move that files it. render() returns
+    everything in Prometheus text exposition format.
+    """
+
+    def __init__(self, max_tracked=50000):
+        self._lock = threading.Lock()
+        self.stages = {}
+        self.counters = Counter()
+        self.event_to_move = Histogram(LATENCY_BUCKETS)
+        # Note path -> monotonic time of the first unhandled event for it
+        self._event_times = BoundedCache(max_tracked)
+
+    @contextmanager
+    def time(self, stage):
+        """Time the enclosed block as one observation of stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def observe(self, stage, seconds):
+        """Record a duration for a stage"""
+        with self._lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = Histogram(STAGE_BUCKETS)
+            histogram.observe(seconds)
+
+    def inc(self, name, amount=1):
+        """Increment a counter"""
+        with self._lock:
+            self.counters[name] += amount
+
+    def event_seen(self, path):
+        """Remember when the first event for a note arrived"""
+        path = str(path)
+        if path not in self._event_times:
+            self._event_times[path] = time.monotonic()
+
+    def event_done(self, path):
+        """Forget a note's event time once it has been handled without a move"""
+        self._event_times.pop(str(path))
+
+    def event_moved(self, src_path):
+        """Record the event-to-move latency for a note that has just been moved"""
+        seen = self._event_times.pop(str(src_path))
+        if seen is not None:
+            with self._lock:
+                self.event_to_move.observe(time.monotonic() - seen)
+
+    def events_moved(self, src_dir, dest_dir):
+        """Follow the notes under a directory that was moved while their events were pending"""
+        self._event_times.rekey_tree(src_dir, dest_dir)
+
+    def render(self, extra_counters=None):
+        """Render all metrics in Prometheus text format"""
+        lines = []
+        with self._lock:
+            counters = dict(self.counters)
+            if extra_counters:
+                counters.update(extra_counters)
+            for name in sorted(counters):
+                lines.append(f"# TYPE orbit_{name}_total counter")
+                lines.append(f"orbit_{name}_total {counters[name]}")
+
+            lines.append("# HELP orbit_stage_seconds Time spent in each processing stage")
+            lines.append("# TYPE orbit_stage_seconds histogram")
+            for stage in sorted(self.stages):
+                lines.extend(self._render_histogram("orbit_stage_seconds", self.stages[stage], f'stage="{stage}"'))
+
+            lines.append("# HELP orbit_event_to_move_seconds Time from the first event for a note to its move")
+            lines.append("# TYPE orbit_event_to_move_seconds histogram")
+            lines.extend(self._render_histogram("orbit_event_to_move_seconds", self.event_to_move))
+        return '\n'.join(lines) + '\n'
+
+    def _render_histogram(self, name, histogram, labels=""):
+        """Render one histogram's bucket, sum and count lines"""
+        separator = "," if labels else ""
+        for bound, count in histogram.cumulative():
+            le = "+Inf" if bound == float('inf') else repr(bound)
+            yield f'{name}_bucket{{{labels}{separator}le="{le}"}} {count}'
+        suffix = f"{{{labels}}}" if labels else ""
+        yield f"{name}_sum{suffix} {histogram.sum:.6f}"
+        yield f"{name}_count{suffix} {histogram.count}"
+
+    def summary(self):
+        """Return a one-line-per-stage human readable summary"""
+        with self._lock:
+            lines = []
+            for stage in sorted(self.stages):
+                histogram = self.stages[stage]
+                mean = histogram.sum / histogram.count if histogram.count else 0.0
+                lines.append(f"{stage}: {histogram.count} calls, {histogram.sum * 1000:.1f} ms total, "
+                             f"{mean * 1000:.3f} ms mean")
+            if self.event_to_move.count:
+                mean = self.event_to_move.sum / self.event_to_move.count
+                lines.append(f"event_to_move: {self.event_to_move.count} moves, {mean:.1f} s mean")
+            return lines
@@ -0,0 +1,211 @@
+import os
+import re
+from collections import namedtuple
+from types import MappingProxyType
+
+from orbit_cache import BoundedCache
+
+# Domain folders are named "NNN-Name", e.g. "200-Health"
+DOMAIN_FOLDER_PATTERN = re.compile(r'^\d{3}-')
+
+# Numbered (designated) projects start with digits, e.g. "201-Biomech"
+DESIGNATED_PATTERN = re.compile(r'^\d+')
+
+# Conceptual layers implied by how deep a note's track sits in the vault
+LAYERS = ("Core", "Field", "Vector", "Locus", "Trace", "Dust")
+
+
+class DomainResolver:
+    """Precomputed lookup tables for resolving domain references
+
+    Built once from the number -> name domain map and never modified; when a
+    new domain appears a fresh resolver is built and swapped in, so readers
+    always see a consistent set of tables. Every lookup is a dict access.
+    """
+
+    def __init__(self, domains):
+        self.domains = MappingProxyType(dict(domains))
+        self._order = {number: position for position, number in enumerate(self.domains)}
+
+        # Lowercased name -> number; the first domain with a name wins, as the
+        # old linear scans did
+        by_name = {}
+        for number, name in self.domains.items():
+            by_name.setdefault(name.lower(), number)
+        self._by_name = MappingProxyType(by_name)
+
+        # Full folder name -> number
+        self._by_folder = MappingProxyType({
+            f"{number}-{name}": number for number, name in self.domains.items()})
+
+    @classmethod
+    def parse_folder(cls, folder_name):
+        """Split a "NNN-Name" folder name into (number, name), or None"""
+        if not DOMAIN_FOLDER_PATTERN.match(folder_name):
+            return None
+        return folder_name.split('-')[0], folder_name.split('-')[1]
+
+    def with_folder(self, folder_name):
+        """Return a resolver that also knows the given domain folder
+
+        Returns self when the folder adds nothing new.
+        """
+        parsed = self.parse_folder(folder_name)
+        if parsed is None or parsed[0] in self.domains:
+            return self
+        domains = dict(self.domains)
+        domains[parsed[0]] = parsed[1]
+        return DomainResolver(domains)
+
+    def folder(self, number):
+        """Return the folder name for a domain number, or None"""
+        name = self.domains.get(number)
+        return f"{number}-{name}" if name is not None else None
+
+    def default_folder(self):
+        """Return the folder of the first domain, used when nothing else matches"""
+        number = next(iter(self.domains))
+        return self.folder(number)
+
+    def is_domain_name(self, name):
+        """Check whether a name is a domain name (case insensitive)"""
+        return name.lower() in self._by_name
+
+    def is_domain_folder(self, folder_name):
+        """Check whether a folder name is a known domain folder"""
+        return folder_name in self._by_folder
+
+    def resolve(self, domain_value):
+        """Resolve a frontmatter domain value to (number, name, folder), or None
+
+        Accepts "200-Health" (full form, taken as given), "200" (number) or
+        "Health" (name, case insensitive).
+        """
+        if '-' in domain_value:
+            number, name = domain_value.split('-', 1)
+            if number and number.isdigit():
+                return number, name, f"{number}-{name}"
+            return None
+        if domain_value.isdigit() and len(domain_value) == 3:
+            name = self.domains.get(domain_value)
+            if name is None:
+                return None
+            return domain_value, name, f"{domain_value}-{name}"
+        number = self._by_name.get(domain_value.lower())
+        if number is None:
+            return None
+        return number, self.domains[number], self.folder(number)
+
+    def canonical_folder(self, domain_folder):
+        """Turn a bare domain name into its "NNN-Name" folder; other values pass through"""
+        if DOMAIN_FOLDER_PATTERN.match(domain_folder):
+            return domain_folder
+        number = self._by_name.get(domain_folder.lower())
+        return self.folder(number) if number is not None else domain_folder
+
+    def folder_for_orbit(self, orbit, is_designated):
+        """Find the domain folder an orbit belongs to, or None
+
+        An orbit matches a domain by name, or, for designated projects, by
+        starting with the domain number. If both match different domains
+        the one listed first wins.
+        """
+        candidates = []
+        number = self._by_name.get(orbit.lower())
+        if number is not None:
+            candidates.append(number)
+        if is_designated:
+            # Domain numbers are three digits, so only the first three can match
+            if orbit[:3] in self.domains:
+                candidates.append(orbit[:3])
+        if not candidates:
+            return None
+        return self.folder(min(candidates, key=self._order.__getitem__))
+
+
+# Where a directory (or the note in it) sits in the ORBIT structure:
+#   domain         domain folder, e.g. "200-Health"
+#   project_dir    vault-relative project directory
+#   project_number number prefix of a designated project, e.g. "210"
+#   project_name   project name without its number
+#   floating       project lives in the domain's hidden inbox
+#   stage          innermost stage subdirectory, e.g. "0-inbox" or "9-source"
+#   track          innermost domain/project directory name
+#   layer          layer name for the track depth, e.g. "Field"
+#   layer_number   track depth, 1 for the domain itself
+PathInfo = namedtuple("PathInfo", [
+    "domain", "project_dir", "project_number", "project_name", "floating",
+    "stage", "track", "layer", "layer_number"])
+
+
+class PathClassifier:
+    """Single-pass, cached classification of vault paths
+
+    Classification depends only on the path itself, never on what is on
+    disk, so cached results stay valid when directories are moved or
+    deleted. Results are cached per directory, so every note in a directory
+    shares one entry.
+    """
+
+    def __init__(self, vault_path, stage_dirs, max_entries):
+        self.vault_path = str(vault_path)
+        self._prefix = os.path.join(self.vault_path, '')
+        self.stage_dirs = frozenset(stage_dirs)
+        self.cache = BoundedCache(max_entries)
+
+    def _rel(self, dir_path):
+        """Vault-relative form of a directory; paths outside the vault are kept whole"""
+        if dir_path == self.vault_path:
+            return ''
+        if dir_path.startswith(self._prefix):
+            return dir_path[len(self._prefix):]
+        return dir_path
+
+    def classify(self, path):
+        """Return the PathInfo for a note or directory path"""
+        path = str(path)
+        dir_path = os.path.dirname(path) if path.endswith('.md') else path.rstrip(os.sep)
+        info = self.cache.get(dir_path)
+        if info is None:
+            info = self._classify(self._rel(dir_path))
+            self.cache[dir_path] = info
+        return info
+
+    def _classify(self, rel_dir):
+        """Parse the components of a vault-relative directory in one pass"""
+        domain = None
+        project_dir = None
+        project_number = None
+        project_name = None
+        floating = False
+        stage = None
+        track = None
+        depth = 0
+        walked = []
+
+        for part in rel_dir.split(os.sep) if rel_dir else ():
+            walked.append(part)
+            if domain is None:
+                if DOMAIN_FOLDER_PATTERN.match(part):
+                    domain = track = part
+                    depth = 1
+                continue
+            if part in self.stage_dirs:
+                stage = part
+                continue
+            if project_dir is None:
+                project_dir = os.sep.join(walked)
+                floating = stage is not None
+                if DESIGNATED_PATTERN.match(part) and '-' in part:
+                    project_number, project_name = part.split('-', 1)
+                else:
+                    project_name = part
+            # A new track resets the stage to that of its own subdirectories
+            track = part
+            stage = None
+            depth += 1
+
+        layer_number = min(depth, len(LAYERS)) if depth else None
+        return PathInfo(domain, project_dir, project_number, project_name, floating,
+                        stage, track, LAYERS[layer_number - 1] if layer_number else None,
+                        layer_number)
@@ -0,0 +1,138 @@
+import io
+import os
+import sys
+import time
+import pstats
+import cProfile
+import logging
+import threading
+from collections import Counter
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Directory for profiles, relative to the vault
+PROFILE_DIR = os.path.join(".orbit", "profiles")
+
+# Number of functions printed in profile summaries
+TOP_FUNCTIONS = 20
+
+# Threads that do ORBIT work; observer internals are left out
+SAMPLED_THREADS = ("MainThread", "orbit-worker", "orbit-moves")
+
+
+def _profile_path(vault_path, name, extension):
+    """Build a timestamped file path in the vault's profile directory"""
+    profile_dir = os.path.join(str(vault_path), PROFILE_DIR)
+    os.makedirs(profile_dir, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    return os.path.join(profile_dir, f"{name}-{stamp}.{extension}")
+
+
+def profile_call(vault_path, name, fn, *args, top=TOP_FUNCTIONS, **kwargs):
+    """Run fn under cProfile, save the stats and print the top functions
+
+    The stats are written to .orbit/profiles/<name>-<timestamp>.prof (load
+    them with pstats or snakeviz). Returns fn's result.
+    """
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(fn, *args, **kwargs)
+    finally:
+        path = _profile_path(vault_path, name, "prof")
+        profiler.dump_stats(path)
+        output = io.StringIO()
+        stats = pstats.Stats(profiler, stream=output)
+        stats.sort_stats('cumulative').print_stats(top)
+        print(output.getvalue())
+        print(f"Profile written to {path}")
+
+
+class StackSampler:
+    """Sample the stacks of ORBIT's threads over a bounded window
+
+    Cheap enough to leave running against a live watcher: a background
+    thread wakes every interval seconds, records the stack of each thread
+    named in threads, and stops by itself after duration seconds. Threads
+    blocked in threading waits are counted as idle rather than recorded.
+    Stacks are saved in collapsed ("folded") format, one
+    `frame;frame;frame count` line per stack, which flamegraph.pl and
+    speedscope read directly.
+    """
+
+    def __init__(self, vault_path, duration, interval=0.01, name="watchdog", threads=SAMPLED_THREADS):
+        self.vault_path = str(vault_path)
+        self.duration = duration
+        self.interval = interval
+        self.name = name
+        # Names of the threads to sample; may be changed while running
+        self.threads = set(threads)
+        self.samples = 0
+        self.idle = 0
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start sampling in a background thread"""
+        self._thread = threading.Thread(target=self._run, name="orbit-profiler", daemon=True)
+        self._thread.start()
+        logger.info(f"Sampling stacks every {self.interval * 1000:.0f} ms for {self.duration} s")
+
+    def stop(self):
+        """Stop sampling early and write the profile"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        """Sampling loop; writes the profile when the window ends"""
+        deadline = time.monotonic() + self.duration
+        while not self._stop.is_set() and time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if names.get(thread_id) not in self.threads:
+                    continue
+                if frame.f_code.co_filename == threading.__file__:
+                    self.idle += 1
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+            self._stop.wait(self.interval)
+        self._write()
+
+    def top_functions(self, top=TOP_FUNCTIONS):
+        """Return (function, cumulative_samples) pairs, most frequent first
+
+        A function counts once per sampled stack it appears in.
+        """
+        cumulative = Counter()
+        for stack, count in self.stacks.items():
+            for function in set(stack.split(';')):
+                cumulative[function] += count
+        return cumulative.most_common(top)
+
+    def _write(self):
+        """Save the collapsed stacks and print the top functions"""
+        try:
+            path = _profile_path(self.vault_path, self.name, "folded")
+            with open(path, 'w', encoding='utf-8') as f:
+                for stack, count in self.stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+        except Exception as e:
+            logger.error(f"Error writing profile: {str(e)}")
+            return
+
+        busy = sum(self.stacks.values())
+        lines = [f"Top functions by cumulative samples ({self.samples} ticks, {busy} busy and "
+                 f"{self.idle} idle thread samples):"]
+        for function, count in self.top_functions():
+            lines.append(f"{count:8d}  {count / max(busy, 1):6.1%}  {function}")
+        print('\n'.join(lines))
+        logger.info(f"Stack profile written to {path}")
@@ -0,0 +1,247 @@
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import threading
+import statistics
+from datetime import datetime
+
+from watchdog.events import (
+    FileModifiedEvent, DirModifiedEvent, FileCreatedEvent, DirCreatedEvent,
+    FileMovedEvent, DirMovedEvent, FileDeletedEvent, DirDeletedEvent,
+)
+
+logger = logging.getLogger(__name__)
+
+# Event log format version, written in the header line
+LOG_VERSION = 1
+
+# How often a recorder flushes its buffer to disk (in seconds)
+FLUSH_INTERVAL = 1.0
+
+# How often queue depth is sampled during a replay (in seconds)
+DEPTH_INTERVAL = 0.01
+
+# (event_type, is_directory) -> watchdog event class
+EVENT_CLASSES = {
+    ('modified', False): FileModifiedEvent,
+    ('modified', True): DirModifiedEvent,
+    ('created', False): FileCreatedEvent,
+    ('created', True): DirCreatedEvent,
+    ('moved', False): FileMovedEvent,
+    ('moved', True): DirMovedEvent,
+    ('deleted', False): FileDeletedEvent,
+    ('deleted', True): DirDeletedEvent,
+}
+
+
+class EventRecorder:
+    """Append raw watchdog events to a compact JSON-lines log
+
+    The first line is a header; every other line is
+    [seconds_since_start, event_type, is_directory, src, dest] with paths
+    relative to the vault, so the log can be replayed against a copy of
+    the vault somewhere else.
+    """
+
+    def __init__(self, log_path, vault_path):
+        self.log_path = str(log_path)
+        self.vault_path = str(vault_path)
+        self._prefix = os.path.join(self.vault_path, '')
+        os.makedirs(os.path.dirname(os.path.abspath(self.log_path)), exist_ok=True)
+        self._file = open(self.log_path, 'w', encoding='utf-8')
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+        self._last_flush = self._start
+        self.events = 0
+        self._file.write(json.dumps({
+            'version': LOG_VERSION,
+            'vault': self.vault_path,
+            'started': datetime.now().isoformat(timespec='seconds'),
+        }) + '\n')
+
+    def _rel(self, path):
+        """Make an event path vault-relative"""
+        path = os.fsdecode(path)
+        return path[len(self._prefix):] if path.startswith(self._prefix) else path
+
+    def record(self, event):
+        """Append one event to the log"""
+        now = time.monotonic()
+        dest = getattr(event, 'dest_path', None)
+        line = json.dumps([
+            round(now - self._start, 4),
+            event.event_type,
+            1 if event.is_directory else 0,
+            self._rel(event.src_path),
+            self._rel(dest) if dest else None,
+        ], separators=(',', ':'))
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(line + '\n')
+            self.events += 1
+            if now - self._last_flush >= FLUSH_INTERVAL:
+                self._file.flush()
+                self._last_flush = now
+
+    def close(self):
+        """Flush and close the log"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        logger.info(f"Recorded {self.events} events to {self.log_path}")
+
+
+def read_events(log_path):
+    """Read an event log, returning (header, events)"""
+    with open(log_path, encoding='utf-8') as f:
+        header = json.loads(f.readline())
+        if header.get('version') != LOG_VERSION:
+            raise ValueError(f"Unsupported event log version {header.get('version')} in {log_path}")
+        events = [json.loads(line) for line in f if line.strip()]
+    return header, events
+
+
+def _build_event(vault_path, event_type, is_directory, src, dest):
+    """Rebuild a watchdog event against a (scratch) vault, or None for unhandled types"""
+    event_class = EVENT_CLASSES.get((event_type, bool(is_directory)))
+    if event_class is None:
+        return None
+    src_path = os.path.join(vault_path, src)
+    if event_type == 'moved':
+        return event_class(src_path, os.path.join(vault_path, dest))
+    return event_class(src_path)
+
+
+def replay(events, vault_path, speed=1.0, debounce_time=None):
+    """Feed recorded events through a fresh OrbitSystem and event handler
+
+    With speed > 0 the original timing is reproduced (scaled by speed);
+    with speed 0 events are dispatched as fast as possible. Returns a
+    report dict with throughput and queue depth figures.
+    """
+    from orbit_watchdog import OrbitSystem, OrbitEventHandler
+
+    orbit_system = OrbitSystem(vault_path)
+    handler = OrbitEventHandler(orbit_system, debounce_time)
+    handler.start()
+
+    # Sample queue depth in the background for the whole run
+    depths = []
+    sampling = threading.Event()
+
+    def sample_depth():
+        while not sampling.is_set():
+            depths.append(len(handler.queue))
+            sampling.wait(DEPTH_INTERVAL)
+
+    sampler = threading.Thread(target=sample_depth, name="orbit-replay-depth", daemon=True)
+    sampler.start()
+
+    dispatched = 0
+    start = time.monotonic()
+    try:
+        for offset, event_type, is_directory, src, dest in events:
+            event = _build_event(vault_path, event_type, is_directory, src, dest)
+            if event is None:
+                continue
+            if speed:
+                delay = start + offset / speed - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            handler.dispatch(event)
+            dispatched += 1
+        dispatch_done = time.monotonic()
+
+        # Wait for the queue to empty, then for the worker to finish what it holds
+        while len(handler.queue):
+            time.sleep(DEPTH_INTERVAL)
+        drained = threading.Event()
+        handler.queue.put_now(drained.set)
+        drained.wait()
+        end = time.monotonic()
+    finally:
+        sampling.set()
+        sampler.join()
+        handler.stop()
+        stats = orbit_system.state_stats()
+        summary = orbit_system.metrics.summary()
+        counters = dict(orbit_system.metrics.counters)
+        orbit_system.close()
+
+    elapsed = end - start
+    return {
+        'events': dispatched,
+        'dispatch_seconds': dispatch_done - start,
+        'drain_seconds': end - dispatch_done,
+        'total_seconds': elapsed,
+        'events_per_sec': dispatched / elapsed if elapsed else None,
+        'queue_depth_max': max(depths) if depths else 0,
+        'queue_depth_mean': statistics.mean(depths) if depths else 0,
+        'coalesced_events': handler.queue.coalesced,
+        'routing_runs': stats['routing_runs'],
+        'routing_skips': stats['routing_skips'],
+        'counters': counters,
+        'stages': summary,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay a recorded ORBIT event log against a scratch vault')
+    parser.add_argument('log', help='Event log written by orbit_watchdog.py --record')
+    parser.add_argument('--vault', help='Vault to copy into the scratch directory (default: the recorded vault)')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='Replay speed relative to the recording; 0 replays as fast as possible')
+    parser.add_argument('--debounce', type=float, help='Override the debounce window (in seconds)')
+    parser.add_argument('--output', help='Write the report as JSON to this file')
+    parser.add_argument('--keep', action='store_true', help='Keep the scratch vault')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+    header, events = read_events(args.log)
+    source_vault = args.vault or header['vault']
+    if not os.path.isdir(source_vault):
+        logger.error(f"Vault path does not exist: {source_vault}")
+        sys.exit(1)
+
+    # Replay into a scratch copy; the real vault is never touched
+    work_dir = tempfile.mkdtemp(prefix="orbit-replay-")
+    vault_path = os.path.join(work_dir, "vault")
+    shutil.copytree(source_vault, vault_path, ignore=shutil.ignore_patterns(".orbit"))
+    logger.info(f"Replaying {len(events)} events from {args.log} into {vault_path}")
+
+    # The watcher logs every note it touches
+    logging.disable(logging.ERROR)
+    try:
+        report = replay(events, vault_path, args.speed, args.debounce)
+    finally:
+        logging.disable(logging.NOTSET)
+        if args.keep:
+            logger.info(f"Scratch vault kept at {vault_path}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report['log'] = args.log
+    report['speed'] = args.speed
+    print(f"Replayed {report['events']} events in {report['total_seconds']:.2f}s "
+          f"({report['events_per_sec']:.0f} events/s); "
+          f"dispatch {report['dispatch_seconds']:.2f}s, drain {report['drain_seconds']:.2f}s")
+    print(f"Queue depth: max {report['queue_depth_max']}, mean {report['queue_depth_mean']:.1f}; "
+          f"{report['coalesced_events']} events coalesced")
+    print(f"Routing: {report['routing_runs']} runs, {report['routing_skips']} skipped")
+    for line in report['stages']:
+        print(f"  {line}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,10 @@ import logging
 import shutil
 import tempfile
 from pathlib import Path
+from orbit_index import VaultIndex
+from orbit_frontmatter import read_frontmatter_block, parse_frontmatter, tier_counts
+from orbit_io import rewrite_header, atomic_write, flush as flush_writes
+from orbit_profile import profile_call
 
 # Setup logging
 logging.basicConfig(
@@ -54,22 +58,12 @@ def validate_vault_path(vault_path):
 def check_yaml_frontmatter(file_path):
     """Check if YAML frontmatter in a file is valid"""
     try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            content = file.read()
-        
-        # Check if file has frontmatter
-        if not content.startswith('---'):
+        # Read just the frontmatter block
+        frontmatter_yaml, _ = read_frontmatter_block(file_path)
+        if frontmatter_yaml is None:
             logger.info(f"No frontmatter found in {file_path}")
             return False
         
-        # Extract frontmatter
-        frontmatter_match = re.match(r'^---\n(.*?)\n---', content, re.DOTALL)
-        if not frontmatter_match:
-            logger.info(f"No frontmatter found in {file_path}")
-            return False
-            
-        frontmatter_yaml = frontmatter_match.group(1)
-        
         # Try to parse YAML
         try:
             frontmatter = yaml.safe_load(frontmatter_yaml)
@@ -162,57 +156,52 @@ def fix_yaml_issues(yaml_str):
     
     return yaml_str
 
+# Vault indexes opened during this run, keyed by vault path
+_vault_indexes = {}
+
+def get_vault_index(vault_path):
+    """Open the vault index and bring it up to date (once per run)"""
+    index = _vault_indexes.get(vault_path)
+    if index is None:
+        index = VaultIndex(vault_path)
+        index.refresh(extract_frontmatter)
+        _vault_indexes[vault_path] = index
+        if tier_counts:
+            logger.info("Frontmatter parsed by tier: " + ", ".join(f"{tier}={count}" for tier, count in tier_counts.items()))
+    return index
+
 def check_orbit_relationships(vault_path):
     """Check orbit relationships across the vault"""
     orbit_relationships = {}
     satellite_relationships = {}
     issues = []
     
+    index = get_vault_index(vault_path)
+    
     # First pass: collect all orbit and satellite relationships
-    for root, _, files in os.walk(vault_path):
-        for file in files:
-            if file.endswith('.md'):
-                file_path = os.path.join(root, file)
-                try:
-                    frontmatter = extract_frontmatter(file_path)
-                    if not frontmatter:
-                        continue
-                        
-                    note_name = os.path.basename(file_path).replace('.md', '')
-                    
-                    # Process orbits
-                    if 'orbits' in frontmatter:
-                        orbits = frontmatter['orbits']
-                        if isinstance(orbits, str):
-                            orbits = [orbits]
-                        elif isinstance(orbits, dict):
-                            orbits = list(orbits.keys())
-                        
-                        if not isinstance(orbits, list):
-                            issues.append(f"Invalid orbits format in {file_path}: {orbits}")
-                            continue
-                            
-                        for orbit in orbits:
-                            if orbit not in orbit_relationships:
-                                orbit_relationships[orbit] = []
-                            orbit_relationships[orbit].append(note_name)
-                    
-                    # Process satellites
-                    if 'satellites' in frontmatter:
-                        satellites = frontmatter['satellites']
-                        if isinstance(satellites, str):
-                            satellites = [satellites]
-                        elif isinstance(satellites, dict):
-                            satellites = list(satellites.keys())
-                            
-                        if not isinstance(satellites, list):
-                            issues.append(f"Invalid satellites format in {file_path}: {satellites}")
-                            continue
-                            
-                        satellite_relationships[note_name] = satellites
-                        
-                except Exception as e:
-                    logger.error(f"Error processing {file_path}: {str(e)}")
+    for record in index.records():
+        file_path = record['path']
+        note_name = record['name']
+        
+        # Process orbits
+        orbits = record['orbits']
+        if orbits is None:
+            issues.append(f"Invalid orbits format in {file_path}")
+            continue
+            
+        for orbit in orbits:
+            if orbit not in orbit_relationships:
+                orbit_relationships[orbit] = []
+            orbit_relationships[orbit].append(note_name)
+        
+        # Process satellites
+        satellites = record['satellites']
+        if satellites is None:
+            issues.append(f"Invalid satellites format in {file_path}")
+            continue
+            
+        if satellites:
+            satellite_relationships[note_name] = satellites
     
     # Check bidirectional relationships
     for project, satellites in satellite_relationships.items():
@@ -224,16 +213,12 @@ def check_orbit_relationships(vault_path):
                 continue
                 
             # Check if satellite orbits back to project
-            satellite_frontmatter = extract_frontmatter(satellite_file)
-            if not satellite_frontmatter or 'orbits' not in satellite_frontmatter:
+            satellite_record = index.get(satellite_file)
+            if not satellite_record or not satellite_record['orbits']:
                 issues.append(f"Satellite '{satellite}' doesn't orbit back to project '{project}'")
                 continue
                 
-            satellite_orbits = satellite_frontmatter['orbits']
-            if isinstance(satellite_orbits, str):
-                satellite_orbits = [satellite_orbits]
-                
-            if project not in satellite_orbits:
+            if project not in satellite_record['orbits']:
                 issues.append(f"Bidirectional relationship broken: '{satellite}' doesn't orbit '{project}'")
     
     # Check if orbit targets exist
@@ -254,53 +239,23 @@ def check_orbit_relationships(vault_path):
 
 def find_file_by_name(vault_path, file_name):
     """Find a file by name anywhere in the vault"""
-    if not file_name.endswith('.md'):
-        file_name = f"{file_name}.md"
-        
-    for root, _, files in os.walk(vault_path):
-        for file in files:
-            if file == file_name:
-                return os.path.join(root, file)
-    
-    return None
+    return get_vault_index(vault_path).find(file_name)
 
 def find_project_file(vault_path, project_name):
     """Find a project file by name"""
-    for root, dirs, files in os.walk(vault_path):
-        # Check if project folder exists
-        if os.path.basename(root) == project_name:
-            # Look for project file in this folder
-            for file in files:
-                if file == f"{project_name}.md":
-                    return os.path.join(root, file)
-        
-        # Check for project file directly
-        for file in files:
-            if file == f"{project_name}.md":
-                return os.path.join(root, file)
-    
-    return None
+    return get_vault_index(vault_path).find(project_name)
 
 def extract_frontmatter(file_path):
     """Extract YAML frontmatter from a markdown file with error handling"""
     try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            content = file.read()
-        
-        # Check if file has frontmatter
-        if not content.startswith('---'):
+        # Read just the frontmatter block
+        frontmatter_yaml, _ = read_frontmatter_block(file_path)
+        if frontmatter_yaml is None:
             return None
         
-        # Extract frontmatter
-        frontmatter_match = re.match(r'^---\n(.*?)\n---', content, re.DOTALL)
-        if not frontmatter_match:
-            return None
-            
-        frontmatter_yaml = frontmatter_match.group(1)
-        
         # Try to parse YAML
         try:
-            frontmatter = yaml.safe_load(frontmatter_yaml)
+            frontmatter, _ = parse_frontmatter(frontmatter_yaml)
             return frontmatter
         except Exception:
             return None
@@ -371,17 +326,11 @@ def check_directory_structure(vault_path):
 def fix_orbit_issue(file_path):
     """Fix common orbit relationship issues in a file"""
     try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            content = file.read()
-        
-        # Extract frontmatter
-        frontmatter_match = re.match(r'^---\n(.*?)\n---', content, re.DOTALL)
-        if not frontmatter_match:
+        # Extract frontmatter (the body is never loaded)
+        frontmatter_yaml, body_offset = read_frontmatter_block(file_path)
+        if frontmatter_yaml is None:
             logger.error(f"No frontmatter found in {file_path}")
             return False
-            
-        frontmatter_yaml = frontmatter_match.group(1)
-        file_content = content[frontmatter_match.end():]
         
         # Replace template placeholders with actual values
         frontmatter_yaml = replace_templates(frontmatter_yaml, file_path)
@@ -393,10 +342,8 @@ def fix_orbit_issue(file_path):
         try:
             yaml.safe_load(fixed_yaml)
             
-            # If parsing succeeds, write the fixed content back to the file
-            new_content = f"---\n{fixed_yaml}---{file_content}"
-            with open(file_path, 'w', encoding='utf-8') as file:
-                file.write(new_content)
+            # If parsing succeeds, swap in the fixed header and stream the body across
+            rewrite_header(file_path, f"---\n{fixed_yaml}\n---".encode('utf-8'), body_offset)
                 
             logger.info(f"Fixed YAML in {file_path}")
             return True
@@ -492,25 +439,12 @@ LIMIT 10
 ```
 """
     
-    with open(dashboard_path, 'w', encoding='utf-8') as f:
-        f.write(content)
+    atomic_write(dashboard_path, content)
         
     logger.info(f"Created domain dashboard: {dashboard_path}")
 
-def main():
-    parser = argparse.ArgumentParser(description='ORBIT System Debugging Tool')
-    parser.add_argument('command', choices=['check-yaml', 'check-orbits', 'check-structure', 'fix-yaml', 'create-domains'],
-                        help='Command to run')
-    parser.add_argument('--file', help='Specific file to check/fix')
-    parser.add_argument('--vault', default=VAULT_PATH, help='Path to the Obsidian vault')
-    
-    args = parser.parse_args()
-    
-    vault_path = args.vault
-    
-    if not validate_vault_path(vault_path):
-        return
-    
+def run_command(args, vault_path):
+    """Run a single debug command"""
     if args.command == 'check-yaml':
         if args.file:
             file_path = args.file if os.path.isabs(args.file) else os.path.join(vault_path, args.file)
@@ -537,6 +471,29 @@ def main():
         print(f"Creating domain folders in {vault_path}...")
         create_domain_folders()
 
+def main():
+    parser = argparse.ArgumentParser(description='ORBIT System Debugging Tool')
+    parser.add_argument('command', choices=['check-yaml', 'check-orbits', 'check-structure', 'fix-yaml', 'create-domains'],
+                        help='Command to run')
+    parser.add_argument('--file', help='Specific file to check/fix')
+    parser.add_argument('--vault', default=VAULT_PATH, help='Path to the Obsidian vault')
+    parser.add_argument('--profile', action='store_true',
+                        help='Run the command under cProfile and write the stats to .orbit/profiles/')
+    
+    args = parser.parse_args()
+    
+    vault_path = args.vault
+    
+    if not validate_vault_path(vault_path):
+        return
+    
+    if args.profile:
+        profile_call(vault_path, args.command, run_command, args, vault_path)
+    else:
+        run_command(args, vault_path)
+    
+    # Make any files written above durable before exiting
+    flush_writes()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
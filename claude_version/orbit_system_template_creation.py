@@ -1,6 +1,7 @@
 import os
 import logging
 from pathlib import Path
+from orbit_io import atomic_write, flush as flush_writes
 
 # Setup logging
 logging.basicConfig(
@@ -266,8 +267,7 @@ def create_templates():
             
         # Create the template file
         try:
-            with open(template_path, 'w', encoding='utf-8') as f:
-                f.write(template_content)
+            atomic_write(template_path, template_content)
             logger.info(f"Created template: {template_path}")
         except Exception as e:
             logger.error(f"Error creating template {template_path}: {str(e)}")
@@ -303,8 +303,7 @@ To create a new note:
     # Write the buttons file
     buttons_path = os.path.join(VAULT_PATH, "ORBIT-Navigation.md")
     try:
-        with open(buttons_path, 'w', encoding='utf-8') as f:
-            f.write(buttons_content)
+        atomic_write(buttons_path, buttons_content)
         logger.info(f"Created domain buttons at: {buttons_path}")
     except Exception as e:
         logger.error(f"Error creating domain buttons: {str(e)}")
@@ -312,4 +311,5 @@ To create a new note:
 if __name__ == "__main__":
     create_templates()
     create_domain_buttons()
+    flush_writes()
     logger.info("Template creation complete")
\ No newline at end of file
@@ -0,0 +1,807 @@
+import os
+import re
+import time
+import logging
+import threading
+from functools import partial
+from collections import Counter
+
+from watchdog.events import (
+    FileCreatedEvent, DirCreatedEvent, FileModifiedEvent, DirModifiedEvent,
+    FileMovedEvent, DirMovedEvent, FileDeletedEvent, DirDeletedEvent,
+)
+from watchdog.observers import Observer
+from watchdog.observers.api import BaseObserver, EventEmitter, DEFAULT_EMITTER_TIMEOUT
+
+try:
+    from watchdog.observers.inotify import InotifyObserver
+except ImportError:  # Not on Linux
+    InotifyObserver = None
+
+logger = logging.getLogger(__name__)
+
+# Per-user inotify watch limit; every watched directory costs one watch
+INOTIFY_LIMIT_PATH = "/proc/sys/fs/inotify/max_user_watches"
+
+# Warn once the vault needs this share of the watch budget
+WATCH_WARN_SHARE = 0.8
+
+# Mount table, and filesystems (besides FUSE) whose change events are unreliable
+MOUNTS_PATH = "/proc/mounts"
+POLLED_FILESYSTEMS = {"nfs", "nfs4", "cifs", "smb3", "smbfs", "9p", "virtiofs", "davfs", "sshfs"}
+
+
+def inotify_watch_limit():
+    """Return fs.inotify.max_user_watches, or None where it cannot be read"""
+    try:
+        with open(INOTIFY_LIMIT_PATH) as f:
+            return int(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+def count_directories(top):
+    """Count the directories a recursive watch on top costs, top included"""
+    count = 0
+    pending = [top]
+    while pending:
+        path = pending.pop()
+        count += 1
+        try:
+            with os.scandir(path) as entries:
+                pending.extend(entry.path for entry in entries if entry.is_dir(follow_symlinks=False))
+        except OSError:
+            pass
+    return count
+
+
+def survey(top):
+    """Walk a subtree once, returning {directory: [directories in its subtree, newest directory mtime]}
+
+    Directory mtimes change when notes are created, deleted or renamed
+    (which includes editors that save by rename), so the newest one in a
+    subtree is a cheap measure of recent activity.
+    """
+    tree = {}
+    for root, dirs, files in os.walk(top):
+        try:
+            tree[root] = [1, os.stat(root).st_mtime]
+        except OSError:
+            tree[root] = [1, 0.0]
+    # Fold children into parents, deepest paths first
+    for path in sorted(tree, key=len, reverse=True):
+        parent = os.path.dirname(path)
+        if path != top and parent in tree:
+            tree[parent][0] += tree[path][0]
+            tree[parent][1] = max(tree[parent][1], tree[path][1])
+    return tree
+
+
+def _glob_to_regex(pattern):
+    """Translate one ignore glob into a regex fragment
+
+    * and ? never cross a path separator; ** matches across them.
+    """
+    parts = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith('**', i):
+            parts.append('.*')
+            i += 2
+        elif pattern[i] == '*':
+            parts.append('[^/]*')
+            i += 1
+        elif pattern[i] == '?':
+            parts.append('[^/]')
+            i += 1
+        else:
+            parts.append(re.escape(pattern[i]))
+            i += 1
+    return ''.join(parts)
+
+
+class IgnoreMatcher:
+    """All ignore globs compiled into a single regex
+
+    A pattern without a slash (".obsidian", "*.part") matches any path
+    component, so it ignores a file with that name or everything below a
+    directory with that name. A pattern with a slash ("assets/img") is
+    anchored at the vault root and ignores that subtree. Paths are matched
+    vault-relative with forward slashes.
+    """
+
+    def __init__(self, vault_path, patterns):
+        self.vault_path = os.path.normpath(str(vault_path))
+        self._prefix = os.path.join(self.vault_path, '')
+        self.patterns = list(patterns)
+        alternatives = []
+        for pattern in self.patterns:
+            pattern = pattern.strip('/')
+            if '/' in pattern:
+                alternatives.append(f"^{_glob_to_regex(pattern)}(?:/|$)")
+            else:
+                alternatives.append(f"(?:^|/){_glob_to_regex(pattern)}(?:/|$)")
+        self._regex = re.compile('|'.join(alternatives)) if alternatives else None
+
+    def match_relative(self, rel_path):
+        """Check a vault-relative path"""
+        if self._regex is None:
+            return False
+        if os.sep != '/':
+            rel_path = rel_path.replace(os.sep, '/')
+        return self._regex.search(rel_path) is not None
+
+    def __call__(self, path):
+        """Check an absolute path; paths outside the vault are never ignored"""
+        path = os.fsdecode(path)
+        if not path.startswith(self._prefix):
+            return False
+        return self.match_relative(path[len(self._prefix):])
+
+
+class PollingTree:
+    """Snapshot of directory trees that can be rescanned cheaply
+
+    Every polled directory's listing is kept as {name: (inode, is_dir,
+    mtime_ns, size)} together with the directory's own mtime, and scan()
+    turns differences into the events an observer would have produced: an
+    inode that vanished in one place and turned up in another is a move,
+    the rest are creations, deletions and modifications.
+
+    A scan costs one stat per directory. Only directories whose mtime
+    changed (an entry was added, removed or renamed) are listed again, and
+    entries that kept their inode reuse the cached stat. Notes edited in
+    place do not touch their directory's mtime, so files are re-stat'ed
+    only in active directories (a recent change or a note modified in the
+    last RECENT_SECONDS) and on a full sweep every full_sweep scans.
+    full_sweep=1 re-stats everything on every scan.
+
+    Directories for which skip(path) is true (e.g. those with an inotify
+    watch) are listed by their parent but never entered; ignored paths are
+    left out entirely. Syscalls are counted in self.calls.
+    """
+
+    # Directories stay active for this many scans after a change
+    ACTIVE_SCANS = 20
+
+    # Notes modified this recently keep their directory active
+    RECENT_SECONDS = 10 * 60
+
+    # A directory modified this close to the previous scan is listed again,
+    # as a change in the same mtime tick would not move it (coarse
+    # timestamps on network and FUSE filesystems)
+    RACY_SECONDS = 2
+
+    def __init__(self, ignore=None, skip=None, recursive=True, full_sweep=1):
+        self.ignore = ignore or (lambda path: False)
+        self.skip = skip or (lambda path: False)
+        self.recursive = recursive
+        self.full_sweep = max(1, full_sweep)
+        self._lock = threading.RLock()
+        self._roots = set()
+        self._dirs = {}  # directory -> [mtime_ns, {name: (inode, is_dir, mtime_ns, size)}]
+        self._active = {}  # directory -> last scan it stays active for
+        self._last_scan_ns = 0
+        self.scans = 0
+        self.vanished = []  # roots found missing by the last scan
+        self.calls = Counter()
+
+    def _stat(self, path):
+        self.calls['stat'] += 1
+        return os.stat(path, follow_symlinks=False)
+
+    def _list(self, dir_path, old=None, stat_files=True):
+        """Read a directory's listing, reusing cached stats of unchanged entries unless stat_files"""
+        listing = {}
+        self.calls['scandir'] += 1
+        try:
+            with os.scandir(dir_path) as entries:
+                for entry in entries:
+                    if self.ignore(entry.path):
+                        continue
+                    try:
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                        inode = entry.inode()
+                        known = old.get(entry.name) if old else None
+                        if is_dir:
+                            listing[entry.name] = (inode, True, 0, 0)
+                        elif not stat_files and known and known[:2] == (inode, False):
+                            listing[entry.name] = known
+                        else:
+                            self.calls['stat'] += 1
+                            st = entry.stat(follow_symlinks=False)
+                            listing[entry.name] = (inode, False, st.st_mtime_ns, st.st_size)
+                    except OSError:
+                        continue
+        except OSError:
+            return None
+        return listing
+
+    def _restat(self, dir_path, old):
+        """Re-stat the files of an unchanged listing, or None if one of them is gone"""
+        listing = {}
+        for name, entry in old.items():
+            if entry[1]:
+                listing[name] = entry
+                continue
+            try:
+                st = self._stat(os.path.join(dir_path, name))
+            except OSError:
+                return None
+            listing[name] = (st.st_ino, False, st.st_mtime_ns, st.st_size)
+        return listing
+
+    def _note_recent(self, dir_path, listing, recent_ns):
+        """Keep a directory active while it holds recently modified notes"""
+        if any(not entry[1] and entry[2] >= recent_ns for entry in listing.values()):
+            self._active[dir_path] = self.scans + self.ACTIVE_SCANS
+
+    def _prime(self, top, events=None):
+        """Snapshot a subtree, optionally reporting everything in it as created (caller holds the lock)"""
+        recent_ns = time.time_ns() - int(self.RECENT_SECONDS * 1e9)
+        pending = [top]
+        while pending:
+            dir_path = pending.pop()
+            if self.skip(dir_path):
+                continue
+            try:
+                mtime_ns = self._stat(dir_path).st_mtime_ns
+            except OSError:
+                continue
+            listing = self._list(dir_path)
+            if listing is None:
+                continue
+            self._dirs[dir_path] = [mtime_ns, listing]
+            self._note_recent(dir_path, listing, recent_ns)
+            for name, (_, is_dir, _, _) in listing.items():
+                path = os.path.join(dir_path, name)
+                if events is not None:
+                    events.append(DirCreatedEvent(path) if is_dir else FileCreatedEvent(path))
+                if is_dir and self.recursive:
+                    pending.append(path)
+
+    def _forget(self, top):
+        """Drop the snapshot of a subtree (caller holds the lock)"""
+        prefix = os.path.join(top, '')
+        for path in [path for path in self._dirs if path == top or path.startswith(prefix)]:
+            del self._dirs[path]
+            self._active.pop(path, None)
+
+    def prime(self, top):
+        """Start polling a subtree from its current state, without reporting anything"""
+        with self._lock:
+            self._prime(top)
+
+    def forget(self, top):
+        """Stop polling a subtree, e.g. because it got an inotify watch"""
+        with self._lock:
+            self._forget(top)
+
+    def add_root(self, top):
+        """Poll a directory tree, starting from its current state"""
+        with self._lock:
+            self._last_scan_ns = max(self._last_scan_ns, time.time_ns())
+            self._roots.add(top)
+            self._prime(top)
+
+    def moved(self, src_path, dest_path):
+        """Carry the snapshot of a renamed directory over to its new path"""
+        prefix = os.path.join(src_path, '')
+        with self._lock:
+            for path in [path for path in self._dirs if path == src_path or path.startswith(prefix)]:
+                self._dirs[dest_path + path[len(src_path):]] = self._dirs.pop(path)
+                if path in self._active:
+                    self._active[dest_path + path[len(src_path):]] = self._active.pop(path)
+            if src_path in self._roots:
+                self._roots.discard(src_path)
+                self._roots.add(dest_path)
+
+    def removed(self, top):
+        """Forget a directory tree that was deleted"""
+        with self._lock:
+            self._roots.discard(top)
+            self._forget(top)
+
+    def scan(self):
+        """Rescan every polled directory once, returning the events"""
+        with self._lock:
+            return self._scan()
+
+    def _scan(self):
+        self.scans += 1
+        full = self.scans % self.full_sweep == 0
+        started_ns = time.time_ns()
+        racy_ns = self._last_scan_ns - int(self.RACY_SECONDS * 1e9)
+        recent_ns = started_ns - int(self.RECENT_SECONDS * 1e9)
+        self._last_scan_ns = started_ns
+        self.vanished = []
+
+        gone = {}  # inode -> (path, is_dir)
+        new = {}
+        modified = []
+        changed_dirs = []
+        pending = list(self._roots)
+        while pending:
+            dir_path = pending.pop()
+            state = self._dirs.get(dir_path)
+            if state is None:
+                continue
+            try:
+                mtime_ns = self._stat(dir_path).st_mtime_ns
+            except OSError:
+                if dir_path in self._roots:
+                    self.vanished.append(dir_path)
+                continue  # Otherwise reported by its parent
+            old = state[1]
+            stat_files = full or self._active.get(dir_path, 0) >= self.scans
+            current = None
+            if mtime_ns == state[0] and mtime_ns < racy_ns:
+                current = self._restat(dir_path, old) if stat_files else old
+            if current is None:
+                current = self._list(dir_path, old, stat_files)
+                if current is None:
+                    continue
+            state[:] = [mtime_ns, current]
+            if current is not old and stat_files:
+                self._note_recent(dir_path, current, recent_ns)
+
+            changed = False
+            for name, entry in current.items():
+                path = os.path.join(dir_path, name)
+                previous = old.get(name)
+                if previous is None or previous[1] != entry[1]:
+                    if previous is not None:
+                        gone[previous[0]] = (path, previous[1])
+                    new[entry[0]] = (path, entry[1])
+                    changed = True
+                elif entry[1]:
+                    if self.recursive:
+                        pending.append(path)
+                elif previous != entry:
+                    # A save by rename gives the note a new inode; still a modification
+                    modified.append(path)
+                    changed = True
+            for name, previous in old.items():
+                if name not in current:
+                    gone[previous[0]] = (os.path.join(dir_path, name), previous[1])
+                    changed = True
+            if changed:
+                self._active[dir_path] = self.scans + self.ACTIVE_SCANS
+                if len(current) != len(old) or any(name not in old for name in current):
+                    changed_dirs.append(dir_path)
+
+        for dir_path in self.vanished:
+            self._roots.discard(dir_path)
+            self._forget(dir_path)
+
+        events = []
+        for inode in [inode for inode in gone if inode in new]:
+            (src_path, is_dir), (dest_path, _) = gone.pop(inode), new.pop(inode)
+            if is_dir:
+                events.append(DirMovedEvent(src_path, dest_path))
+                self.moved(src_path, dest_path)
+            else:
+                events.append(FileMovedEvent(src_path, dest_path))
+        for src_path, is_dir in gone.values():
+            if is_dir:
+                events.append(DirDeletedEvent(src_path))
+                self._forget(src_path)
+            else:
+                events.append(FileDeletedEvent(src_path))
+        for dest_path, is_dir in new.values():
+            if is_dir:
+                events.append(DirCreatedEvent(dest_path))
+                if self.recursive:
+                    self._prime(dest_path, events)
+            else:
+                events.append(FileCreatedEvent(dest_path))
+        events.extend(FileModifiedEvent(path) for path in modified)
+        events.extend(DirModifiedEvent(path) for path in changed_dirs)
+        return events
+
+
+class ColdPoller(PollingTree):
+    """PollingTree on a background thread for the cold directories of hybrid mode
+
+    Polls every interval seconds with a full sweep each time, so notes
+    edited in place are picked up within one interval, and hands the
+    events to handler.dispatch like an observer would (the handler
+    serializes delivery with the observer thread).
+    """
+
+    def __init__(self, handler, ignore, skip, interval):
+        super().__init__(ignore, skip)
+        self.handler = handler
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def poll(self):
+        """Rescan once and dispatch what changed, returning the number of events"""
+        events = self.scan()
+        for event in events:
+            self.handler.dispatch(event)
+        return len(events)
+
+    def start(self):
+        """Poll every interval seconds on a background thread"""
+        self._thread = threading.Thread(target=self._run, name="orbit-poll", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error(f"Error polling cold directories: {e}")
+
+    def stop(self):
+        """Stop the polling thread"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+
+class OrbitPollingEmitter(EventEmitter):
+    """Watchdog emitter that polls one watch with a PollingTree
+
+    The interval adapts to activity: it drops to interval after a scan
+    that found changes and grows by half after each quiet one, up to
+    max_interval.
+    """
+
+    def __init__(self, event_queue, watch, *, timeout=DEFAULT_EMITTER_TIMEOUT, event_filter=None,
+                 ignore=None, interval=1.0, max_interval=10.0, full_sweep=10):
+        super().__init__(event_queue, watch, timeout=timeout, event_filter=event_filter)
+        self.tree = PollingTree(ignore, recursive=watch.is_recursive, full_sweep=full_sweep)
+        self.min_interval = interval
+        self.max_interval = max(interval, max_interval)
+        self.interval = interval
+
+    def on_thread_start(self):
+        self.tree.add_root(self.watch.path)
+
+    def queue_events(self, timeout):
+        if self.stopped_event.wait(self.interval):
+            return
+        try:
+            events = self.tree.scan()
+        except Exception as e:
+            logger.error(f"Error polling {self.watch.path}: {e}")
+            return
+        for event in events:
+            self.queue_event(event)
+        if self.tree.vanished:
+            self.queue_event(DirDeletedEvent(self.watch.path))
+            self.stop()
+        elif events:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * 1.5, self.max_interval)
+
+
+class OrbitPollingObserver(BaseObserver):
+    """Polling observer built on OrbitPollingEmitter
+
+    A drop-in for watchdog's PollingObserver for filesystems where native
+    events are unreliable (FUSE and cloud-sync mounts), producing the same
+    event stream with a fraction of the syscalls.
+    """
+
+    def __init__(self, ignore=None, interval=1.0, max_interval=10.0, full_sweep=10):
+        emitter_class = partial(OrbitPollingEmitter, ignore=ignore, interval=interval,
+                                max_interval=max_interval, full_sweep=full_sweep)
+        super().__init__(emitter_class, timeout=interval)
+
+
+def needs_polling(vault_path):
+    """Check whether the vault is on a filesystem where native change events are unreliable
+
+    That is a FUSE or network mount (from /proc/mounts) or a macOS
+    File Provider folder under ~/Library/CloudStorage.
+    """
+    path = os.path.realpath(str(vault_path))
+    if f"{os.sep}Library{os.sep}CloudStorage{os.sep}" in path:
+        return True
+    try:
+        with open(MOUNTS_PATH) as f:
+            mounts = [line.split()[1:3] for line in f if len(line.split()) > 2]
+    except OSError:
+        return False
+    fstype = None
+    longest = -1
+    for mount_point, mount_type in mounts:
+        mount_point = mount_point.replace('\\040', ' ')
+        if (path == mount_point or path.startswith(os.path.join(mount_point, ''))) and len(mount_point) > longest:
+            fstype, longest = mount_type, len(mount_point)
+    return bool(fstype) and (fstype.startswith('fuse') or fstype in POLLED_FILESYSTEMS)
+
+
+def make_observer(kind, vault_path, ignore=None, interval=1.0, max_interval=10.0, full_sweep=10):
+    """Create the observer for kind: "native", "polling" or "auto" (polling where needs_polling says so)"""
+    if kind == 'auto':
+        kind = 'polling' if needs_polling(vault_path) else 'native'
+    if kind == 'polling':
+        logger.info(f"Polling the vault every {interval}-{max_interval}s (full sweep every {full_sweep} polls)")
+        return OrbitPollingObserver(ignore, interval, max_interval, full_sweep)
+    return Observer()
+
+
+class WatchManager:
+    """Place the observer's watches on the vault
+
+    Normally the whole vault gets one recursive watch, so a note or
+    directory moved anywhere in it is reported as a single move. Events
+    under ignored paths are dropped by the matcher before they reach the
+    handler, and the polling observer never enters ignored subtrees at all.
+    inotify cannot exclude subtrees from a recursive watch, so there they
+    still cost watches.
+
+    With inotify every directory costs one of the per-user
+    fs.inotify.max_user_watches, and running out kills the observer
+    silently. start() counts the directories first and, if they do not fit
+    in watch_share of the limit, switches to hybrid mode: directories named
+    in hot_names (inboxes) and the most recently active projects (second
+    level directories) get recursive watches within the budget, and
+    everything else is polled by a ColdPoller every poll_interval seconds.
+    A cold project that sees activity is promoted to a watch, giving up the
+    least recently active projects if needed. Ignored top-level directories
+    are neither watched nor polled. Directories created, moved or deleted
+    while running are followed through directory_created/moved/deleted,
+    which the event handler calls from the observer thread.
+
+    In hybrid mode a move between a watched and a polled directory is
+    reported as a deletion and a creation up to poll_interval apart.
+    """
+
+    def __init__(self, observer, handler, vault_path, ignore, hot_names=(), watch_share=1.0, poll_interval=30):
+        self.observer = observer
+        self.handler = handler
+        self.vault_path = os.path.normpath(str(vault_path))
+        self._prefix = os.path.join(self.vault_path, '')
+        self.ignore = ignore
+        self.hot_names = set(hot_names)
+        self.watch_share = watch_share
+        self.poll_interval = poll_interval
+        self._lock = threading.RLock()
+        self.watches = {}  # watched directory -> ObservedWatch
+        self.budget = None  # inotify watches ORBIT may use, None when unlimited
+        self.used = 0
+        self._costs = {}  # watched directory -> inotify watches it uses
+        # Hybrid mode: the cold poller, watched inboxes, watched projects by
+        # last activity, and when a project was last considered for promotion
+        self.poller = None
+        self.pinned = set()
+        self.active = {}
+        self._tried = {}
+
+    @property
+    def hybrid(self):
+        """Whether part of the vault is polled instead of watched"""
+        return self.poller is not None
+
+    def start(self):
+        """Schedule one recursive watch on the vault, or go hybrid if it does not fit"""
+        tops = []
+        ignored = []
+        with os.scandir(self.vault_path) as entries:
+            for entry in entries:
+                if not entry.is_dir(follow_symlinks=False):
+                    continue
+                if self.ignore(entry.path):
+                    ignored.append(entry.path)
+                else:
+                    tops.append(entry.path)
+
+        trees = {}
+        needed = None
+        limit = inotify_watch_limit() if InotifyObserver and isinstance(self.observer, InotifyObserver) else None
+        if limit:
+            self.budget = int(limit * self.watch_share)
+            for top in tops:
+                trees.update(survey(top))
+            # A recursive inotify watch covers ignored subtrees too
+            needed = 1 + sum(trees[top][0] for top in tops) + sum(count_directories(top) for top in ignored)
+            if needed > self.budget:
+                logger.warning(f"The vault needs {needed} inotify watches but only {self.budget} of "
+                               f"fs.inotify.max_user_watches={limit} are available; watching hot directories "
+                               f"and polling the rest every {self.poll_interval}s")
+                self._start_hybrid(tops, trees)
+                return
+            if needed > self.budget * WATCH_WARN_SHARE:
+                logger.warning(f"The vault needs {needed} inotify watches, close to the {self.budget} available "
+                               f"(fs.inotify.max_user_watches={limit})")
+
+        self.watches[self.vault_path] = self.observer.schedule(self.handler, self.vault_path, recursive=True)
+        self.used = needed or 0
+        logger.info(f"Watching the vault ({len(ignored)} ignored top-level directories)"
+                    + (f" with {self.used} of {self.budget} inotify watches" if self.budget else ""))
+
+    def stop(self):
+        """Stop polling cold directories (the observer is stopped by its owner)"""
+        if self.poller:
+            self.poller.stop()
+
+    def _is_top_level(self, path):
+        """Check whether path is a direct child of the vault"""
+        return os.path.dirname(os.fsdecode(path)) == self.vault_path
+
+    def _project_of(self, path):
+        """Return the second-level directory path is in, or None"""
+        path = os.fsdecode(path)
+        if not path.startswith(self._prefix):
+            return None
+        parts = path[len(self._prefix):].split(os.sep, 2)
+        if len(parts) < 2:
+            return None
+        return os.path.join(self.vault_path, parts[0], parts[1])
+
+    def _is_hot(self, path):
+        """Check whether path is in a directory with its own recursive watch (hybrid mode)"""
+        while len(path) > len(self.vault_path):
+            if path in self.watches:
+                return True
+            path = os.path.dirname(path)
+        return False
+
+    def _watch(self, dir_path, cost=None):
+        """Recursively watch a directory unless it is ignored"""
+        if self.ignore(dir_path):
+            return False
+        with self._lock:
+            if dir_path in self.watches:
+                return False
+            if cost is None and self.budget:
+                cost = count_directories(dir_path)
+            try:
+                self.watches[dir_path] = self.observer.schedule(self.handler, dir_path, recursive=True)
+            except OSError as e:
+                logger.error(f"Could not watch {dir_path}: {e}")
+                return False
+            self._costs[dir_path] = cost or 0
+            self.used += cost or 0
+        return True
+
+    def _unwatch(self, dir_path):
+        """Remove the watch on a directory"""
+        with self._lock:
+            watch = self.watches.pop(dir_path, None)
+            self.used -= self._costs.pop(dir_path, 0)
+            self.active.pop(dir_path, None)
+        if watch is not None:
+            try:
+                self.observer.unschedule(watch)
+            except KeyError:
+                pass
+
+    # Hybrid mode
+
+    def _start_hybrid(self, tops, trees):
+        """Watch inboxes and the most recently active projects within the budget; poll the rest"""
+        self.poller = ColdPoller(self.handler, self.ignore, self._is_hot, self.poll_interval)
+        self.observer.schedule(self.handler, self.vault_path, recursive=False)
+        self.used = 1
+        inboxes = [path for path in trees if os.path.basename(path) in self.hot_names]
+        projects = sorted((path for path in trees if self._project_of(path) == path and path not in inboxes),
+                          key=lambda path: trees[path][1], reverse=True)
+        for path in inboxes + projects:
+            if not self._is_hot(path) and self.used + trees[path][0] <= self.budget:
+                self._watch_hot(path, trees[path][0], pinned=path in inboxes)
+        for top in tops:
+            self.poller.add_root(top)
+        self.poller.start()
+        logger.info(f"Watching {len(self.watches)} hot directories with {self.used} of {self.budget} "
+                    f"inotify watches; polling the rest")
+
+    def _watch_hot(self, dir_path, cost, pinned=False):
+        """Recursively watch a hot directory, taking over any watches below it"""
+        prefix = os.path.join(dir_path, '')
+        with self._lock:
+            for path in [path for path in self.watches if path.startswith(prefix)]:
+                self._unwatch(path)
+            if not self._watch(dir_path, cost):
+                return False
+            if pinned:
+                self.pinned.add(dir_path)
+            else:
+                self.active[dir_path] = time.monotonic()
+        self.poller.forget(dir_path)
+        return True
+
+    def _demote(self, dir_path):
+        """Give up the watch on a project and poll it instead"""
+        self._unwatch(dir_path)
+        self.poller.prime(dir_path)
+        # Inboxes inside it go back to having their own watches
+        prefix = os.path.join(dir_path, '')
+        for path in [path for path in self.pinned if path.startswith(prefix)]:
+            cost = count_directories(path)
+            if self.used + cost <= self.budget:
+                self._watch_hot(path, cost, pinned=True)
+
+    def _promote(self, project):
+        """Move a cold project that saw activity onto an inotify watch, if it can be made to fit"""
+        if not os.path.isdir(project) or self.ignore(project):
+            return
+        cost = count_directories(project)
+        with self._lock:
+            if project in self.watches:
+                return
+            available = self.budget - self.used + sum(self._costs[path] for path in self.active)
+            if cost > available:
+                return
+            for idle in sorted(self.active, key=self.active.get):
+                if self.used + cost <= self.budget:
+                    break
+                self._demote(idle)
+            if self.used + cost <= self.budget and self._watch_hot(project, cost):
+                logger.info(f"Watching active project {project} ({cost} watches, {self.used} of {self.budget} used)")
+
+    def touch(self, path):
+        """Note activity at path; in hybrid mode a cold project that sees activity is promoted"""
+        if self.poller is None:
+            return
+        project = self._project_of(path)
+        if project is None or os.path.basename(project) in self.hot_names:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if project in self.active:
+                self.active[project] = now
+                return
+            if project in self.watches or now - self._tried.get(project, -self.poll_interval) < self.poll_interval:
+                return
+            self._tried[project] = now
+        self._promote(project)
+
+    def _move_hot(self, src_path, dest_path):
+        """Re-place watches at or below a directory that was renamed"""
+        prefix = os.path.join(src_path, '')
+        with self._lock:
+            for path in [path for path in self.watches if path == src_path or path.startswith(prefix)]:
+                new_path = dest_path + path[len(src_path):]
+                cost = self._costs.get(path, 0)
+                pinned = path in self.pinned
+                self.pinned.discard(path)
+                self._unwatch(path)
+                self._watch_hot(new_path, cost, pinned)
+            for path in [path for path in self.pinned if path.startswith(prefix)]:
+                self.pinned.discard(path)
+                self.pinned.add(dest_path + path[len(src_path):])
+
+    def _drop_hot(self, dir_path):
+        """Remove watches at or below a directory that was deleted"""
+        prefix = os.path.join(dir_path, '')
+        with self._lock:
+            for path in [path for path in self.watches if path == dir_path or path.startswith(prefix)]:
+                self._unwatch(path)
+            self.pinned = {path for path in self.pinned if path != dir_path and not path.startswith(prefix)}
+
+    # Called by the event handler for directory events
+
+    def directory_created(self, dir_path):
+        """Poll a new top-level directory (hybrid mode) and report what it already contains"""
+        if not self.poller or not self._is_top_level(dir_path) or self.ignore(dir_path):
+            return
+        self.poller.add_root(dir_path)
+        # Anything created before polling started would be missed
+        for root, dirs, files in os.walk(dir_path):
+            dirs[:] = [d for d in dirs if not self.ignore(os.path.join(root, d))]
+            for d in dirs:
+                self.handler.deliver(DirCreatedEvent(os.path.join(root, d)))
+            for file in files:
+                path = os.path.join(root, file)
+                if not self.ignore(path):
+                    self.handler.deliver(FileCreatedEvent(path))
+
+    def directory_moved(self, src_path, dest_path):
+        """Follow a directory that was renamed (hybrid mode)"""
+        if self.poller:
+            self._move_hot(src_path, dest_path)
+            self.poller.moved(src_path, dest_path)
+
+    def directory_deleted(self, dir_path):
+        """Drop the watches on a directory that was removed (hybrid mode)"""
+        if self.poller:
+            self._drop_hot(dir_path)
+            self.poller.removed(dir_path)
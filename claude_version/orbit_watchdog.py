@@ -2,11 +2,29 @@ import os
 import re
 import time
 import yaml
+import heapq
+import argparse
+import signal
+import hashlib
 import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
+from watchdog.events import (FileSystemEventHandler, FileCreatedEvent, DirCreatedEvent,
+                             FileDeletedEvent, DirDeletedEvent)
 from pathlib import Path
+from orbit_index import VaultIndex, normalize_links
+from orbit_cache import BoundedCache
+from orbit_frontmatter import (parse_frontmatter, patch_frontmatter,
+                               tier_counts, TIER_FALLBACK)
+from orbit_paths import DomainResolver, PathClassifier, DOMAIN_FOLDER_PATTERN, DESIGNATED_PATTERN
+from orbit_metrics import Metrics
+from orbit_profile import StackSampler, SAMPLED_THREADS
+from orbit_replay import EventRecorder
+from orbit_io import set_fsync_mode, TEMP_SUFFIX
+from orbit_fs import RealFS
+from orbit_watch import IgnoreMatcher, WatchManager, make_observer
 
 # Setup logging
 logging.basicConfig(
@@ -51,6 +69,78 @@ class Config:
     # Minimum age of file before MOVING (in minutes) - Made configurable
     MIN_FILE_AGE = 1
     
+    # Quiet period before processing a changed file (in seconds); repeated
+    # events for the same file inside this window are coalesced
+    DEBOUNCE_TIME = 1
+    
+    # Longest a continuously changing file can be held back (in seconds)
+    MAX_DEBOUNCE_DELAY = 5
+    
+    # How long to recognise events caused by ORBIT's own writes (in seconds)
+    OWN_WRITE_TTL = 10
+    
+    # Window (in seconds) for pairing a deletion and a creation into one move,
+    # for moves between separately watched trees (hybrid watch mode adds
+    # COLD_POLL_INTERVAL). New notes and deleted ones wait this long before
+    # they are processed
+    DIRECTORY_MOVE_WINDOW = 2
+    
+    # Largest frontmatter block read from a note (in bytes)
+    MAX_FRONTMATTER_BYTES = 64 * 1024
+    
+    # When writes are fsynced: "always" (every write), "batch" (the burst's
+    # writes are fsynced and swapped in as one group at its end) or "off"
+    # (atomic replacement only)
+    FSYNC_MODE = "batch"
+    
+    # Cap and lifetime (in seconds) for per-file tracking state; the least
+    # recently used entries are evicted first
+    STATE_MAX_ENTRIES = 50000
+    STATE_TTL = 24 * 60 * 60
+    
+    # Number of directories whose domain/project/stage classification is cached
+    PATH_CACHE_ENTRIES = 10000
+    
+    # Prometheus text file for timings and counters (relative to the vault),
+    # rewritten every METRICS_INTERVAL seconds and on SIGUSR1
+    METRICS_FILE = ".orbit/metrics.prom"
+    METRICS_INTERVAL = 60
+    
+    # Default window and sampling interval (in seconds) for --profile
+    PROFILE_WINDOW = 60
+    PROFILE_INTERVAL = 0.01
+    
+    # asyncio engine: unix socket for the control API (relative to the vault)
+    # and how often the index is re-synced with the vault (in seconds, 0 = never)
+    CONTROL_SOCKET = ".orbit/control.sock"
+    RECONCILE_INTERVAL = 15 * 60
+    
+    # Share of fs.inotify.max_user_watches ORBIT may use (the limit is per
+    # user and shared with editors and sync clients). If the vault needs
+    # more, inboxes and recently active projects are watched and the rest
+    # is polled every COLD_POLL_INTERVAL seconds
+    INOTIFY_WATCH_SHARE = 0.5
+    COLD_POLL_INTERVAL = 30
+    
+    # Observer backend: "native" (inotify, FSEvents, ...), "polling", or
+    # "auto" to poll on FUSE, network and cloud-sync mounts where native
+    # events are unreliable. Polling runs every POLL_INTERVAL seconds while
+    # the vault is busy, backing off to POLL_MAX_INTERVAL when it is quiet,
+    # and re-stats every note once every POLL_FULL_SWEEP polls
+    OBSERVER = "auto"
+    POLL_INTERVAL = 1.0
+    POLL_MAX_INTERVAL = 10.0
+    POLL_FULL_SWEEP = 10
+    
+    # Vault paths the watcher never reports to OrbitSystem. A pattern without
+    # a slash matches any path component (a file or directory name, with *
+    # and ? wildcards); a pattern with a slash is a subtree of the vault root.
+    # Ignored top-level directories are not watched at all.
+    IGNORE_PATTERNS = [
+        ".obsidian", ".trash", ".orbit", ".git", "templates", "attachments",
+        ".~lock*", "*.sync-conflict*", "*.part", "*.crdownload", ".DS_Store", f"*{TEMP_SUFFIX}",
+    ]
+    
     # Template paths
     TEMPLATES = {
         "project": "templates/project_template.md",
@@ -60,15 +150,154 @@ class Config:
     }
 
 
+class MoveScheduler:
+    """One-shot timers for moves deferred until a note reaches MIN_FILE_AGE
+    
+    Keeps at most one pending move per path in a heap ordered by due time. A
+    single timer thread sleeps until the earliest move is due and hands it to
+    callback(path, frontmatter) exactly once. Re-scheduling a path replaces
+    its frontmatter, so an edit never causes the note to be parsed again
+    when the timer fires.
+    """
+    
+    def __init__(self, callback):
+        self.callback = callback
+        self._cond = threading.Condition()
+        self._pending = {}  # path -> (due, frontmatter)
+        self._heap = []  # (due, path), may contain superseded entries
+        self._thread = None
+        self._closed = False
+    
+    def schedule(self, path, delay, frontmatter):
+        """Fire the move for path after delay seconds, replacing any pending one"""
+        with self._cond:
+            entry = self._pending.get(path)
+            due = entry[0] if entry else time.monotonic() + delay
+            self._pending[path] = (due, frontmatter)
+            if not entry:
+                heapq.heappush(self._heap, (due, path))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="orbit-moves", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+    
+    def cancel(self, path):
+        """Drop the pending move for path, returning its frontmatter if there was one"""
+        with self._cond:
+            entry = self._pending.pop(path, None)
+            return entry[1] if entry else None
+    
+    def rekey(self, src_path, dest_path):
+        """Follow a note that was renamed while its move was pending"""
+        with self._cond:
+            entry = self._pending.pop(src_path, None)
+            if entry:
+                self._pending[dest_path] = entry
+                heapq.heappush(self._heap, (entry[0], dest_path))
+                self._cond.notify()
+    
+    def rekey_tree(self, src_dir, dest_dir):
+        """Follow the notes under a directory that was moved while their moves were pending"""
+        src_prefix = os.path.join(src_dir, '')
+        dest_prefix = os.path.join(dest_dir, '')
+        with self._cond:
+            for path in [path for path in self._pending if path.startswith(src_prefix)]:
+                entry = self._pending.pop(path)
+                dest_path = dest_prefix + path[len(src_prefix):]
+                self._pending[dest_path] = entry
+                heapq.heappush(self._heap, (entry[0], dest_path))
+            self._cond.notify()
+    
+    def cancel_tree(self, dir_path):
+        """Drop the pending moves for every note under a directory"""
+        prefix = os.path.join(dir_path, '')
+        with self._cond:
+            for path in [path for path in self._pending if path.startswith(prefix)]:
+                del self._pending[path]
+    
+    def is_pending(self, path):
+        """Check whether a move is pending for path"""
+        with self._cond:
+            return path in self._pending
+    
+    def __len__(self):
+        with self._cond:
+            return len(self._pending)
+    
+    def _run(self):
+        """Timer loop: fire each move when it becomes due"""
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        return
+                    # Skip heap entries that were cancelled or re-keyed
+                    while self._heap:
+                        due, path = self._heap[0]
+                        entry = self._pending.get(path)
+                        if entry and entry[0] == due:
+                            break
+                        heapq.heappop(self._heap)
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+                    due, path = self._heap[0]
+                    delay = due - time.monotonic()
+                    if delay <= 0:
+                        heapq.heappop(self._heap)
+                        _, frontmatter = self._pending.pop(path)
+                        break
+                    self._cond.wait(delay)
+            try:
+                self.callback(path, frontmatter)
+            except Exception as e:
+                logger.error(f"Error running deferred move for {path}: {str(e)}")
+    
+    def close(self):
+        """Stop the timer thread; pending moves are dropped"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
 class OrbitSystem:
-    def __init__(self, vault_path):
+    def __init__(self, vault_path, fs=None, scheduler=None):
         self.vault_path = Path(vault_path)
+        # Filesystem backend; a MemoryFS runs the whole system without touching disk
+        self.fs = fs if fs is not None else RealFS()
+        set_fsync_mode(Config.FSYNC_MODE)
+        # Paths ORBIT itself has written: path -> (mtime_ns, size, expires)
+        self._own_writes = {}
+        self._own_writes_lock = threading.Lock()
+        self.suppressed_events = 0
+        # Directory moves being applied as a whole: src prefix -> (dest prefix, expires)
+        self._moved_dirs = {}
+        self.metrics = Metrics(Config.STATE_MAX_ENTRIES)
         # Load templates first so they're available for domain creation
         self.templates = self._load_templates()
         # Then load domains
-        self.domains = self._load_domains()
-        # Track file creation times
-        self.file_creation_times = {}
+        self.resolver = DomainResolver(self._load_domains())
+        self.paths = PathClassifier(
+            self.vault_path,
+            {Config.INBOX_DIR, f"{Config.INBOX_NUMBER}-inbox", f"{Config.SOURCE_NUMBER}-source"},
+            Config.PATH_CACHE_ENTRIES)
+        # Moves waiting for notes to reach MIN_FILE_AGE
+        self.scheduler = scheduler if scheduler is not None else MoveScheduler(self.run_deferred_move)
+        # Track file creation times (bounded; notes with a pending move are never evicted)
+        self.file_creation_times = BoundedCache(Config.STATE_MAX_ENTRIES, Config.STATE_TTL,
+                                                pinned=self.scheduler.is_pending)
+        # Fingerprint of the raw frontmatter last routed for each file: path -> (digest, frontmatter)
+        self.frontmatter_cache = BoundedCache(Config.STATE_MAX_ENTRIES, Config.STATE_TTL)
+        self.routing_runs = 0
+        self.routing_skips = 0
+        # Persistent name/path index under .orbit/
+        self.index = VaultIndex(self.vault_path, None if self.fs.persistent else ":memory:", self.fs)
+        self.index.refresh(self._index_parse)
+    
+    @property
+    def domains(self):
+        """Domain number -> name map of the current resolver"""
+        return self.resolver.domains
     
     def _load_templates(self):
         """Load template files"""
@@ -203,23 +432,22 @@ LIMIT 10
         
         # Try to load template files
         template_dir = os.path.join(self.vault_path, "templates")
-        if not os.path.exists(template_dir):
-            os.makedirs(template_dir)
+        if not self.fs.exists(template_dir):
+            self.fs.makedirs(template_dir)
             logger.info(f"Created templates directory: {template_dir}")
         
         for template_type, template_path in Config.TEMPLATES.items():
             full_path = os.path.join(self.vault_path, template_path)
             try:
-                if os.path.exists(full_path):
-                    with open(full_path, 'r', encoding='utf-8') as f:
-                        templates[template_type] = f.read()
+                if self.fs.exists(full_path):
+                    templates[template_type] = self.fs.read_text(full_path)
                 else:
                     # Create the template with default content
                     template_content = default_templates.get(template_type, '')
                     if template_content:
-                        os.makedirs(os.path.dirname(full_path), exist_ok=True)
-                        with open(full_path, 'w', encoding='utf-8') as f:
-                            f.write(template_content)
+                        self.fs.makedirs(os.path.dirname(full_path), exist_ok=True)
+                        with self._own_write(full_path):
+                            self.fs.atomic_write(full_path, template_content)
                         templates[template_type] = template_content
                         logger.info(f"Created template: {full_path}")
             except Exception as e:
@@ -238,8 +466,8 @@ LIMIT 10
             
             # Create domain directory if it doesn't exist
             domain_dir = os.path.join(self.vault_path, f"{domain_num}-{domain_name}")
-            if not os.path.exists(domain_dir):
-                os.makedirs(domain_dir)
+            if not self.fs.exists(domain_dir):
+                self.fs.makedirs(domain_dir)
                 logger.info(f"Created domain directory: {domain_dir}")
                 
                 # Create domain dashboard
@@ -247,13 +475,13 @@ LIMIT 10
             
             # Ensure hidden inbox exists
             inbox_path = os.path.join(domain_dir, Config.INBOX_DIR)
-            if not os.path.exists(inbox_path):
-                os.makedirs(inbox_path)
+            if not self.fs.exists(inbox_path):
+                self.fs.makedirs(inbox_path)
                 logger.info(f"Created inbox directory: {inbox_path}")
         
         # Then scan for any additional domain directories that might exist
-        for item in os.listdir(self.vault_path):
-            if os.path.isdir(os.path.join(self.vault_path, item)) and re.match(r'^\d{3}-', item):
+        for item in self.fs.listdir(self.vault_path):
+            if self.fs.isdir(os.path.join(self.vault_path, item)) and DOMAIN_FOLDER_PATTERN.match(item):
                 domain_number = item.split('-')[0]
                 domain_name = item.split('-')[1]
                 
@@ -263,8 +491,8 @@ LIMIT 10
                 
                 # Ensure hidden inbox exists
                 inbox_path = os.path.join(self.vault_path, item, Config.INBOX_DIR)
-                if not os.path.exists(inbox_path):
-                    os.makedirs(inbox_path)
+                if not self.fs.exists(inbox_path):
+                    self.fs.makedirs(inbox_path)
                     logger.info(f"Created inbox directory: {inbox_path}")
         
         return domains
@@ -273,8 +501,8 @@ LIMIT 10
         """Create domain directory structure without markdown files"""
         # Create hidden inbox if it doesn't exist
         inbox_path = os.path.join(domain_dir, Config.INBOX_DIR)
-        if not os.path.exists(inbox_path):
-            os.makedirs(inbox_path)
+        if not self.fs.exists(inbox_path):
+            self.fs.makedirs(inbox_path)
             logger.info(f"Created domain inbox directory: {inbox_path}")
         
         # Get template
@@ -285,7 +513,7 @@ LIMIT 10
         
         # Create dashboard file path
         dashboard_path = os.path.join(domain_dir, f"{domain_name}.md")
-        if os.path.exists(dashboard_path):
+        if self.fs.exists(dashboard_path):
             return
             
         # Perform template substitution
@@ -294,11 +522,91 @@ LIMIT 10
         content = content.replace('DOMAIN_PATH', os.path.basename(domain_dir))
         
         # Write the file
-        with open(dashboard_path, 'w', encoding='utf-8') as f:
-            f.write(content)
+        with self.metrics.time("write"), self._own_write(dashboard_path):
+            self.fs.atomic_write(dashboard_path, content)
+        self.metrics.inc("creates")
             
         logger.info(f"Created domain dashboard: {dashboard_path}")
     
+    @contextmanager
+    def _own_write(self, path):
+        """Register a write or move ORBIT is about to make so its events can be ignored"""
+        path = str(path)
+        expires = time.monotonic() + Config.OWN_WRITE_TTL
+        with self._own_writes_lock:
+            # A write in progress matches any event for the path
+            self._own_writes[path] = (None, None, expires)
+        try:
+            yield
+        finally:
+            try:
+                stat = self.fs.stat(path)
+                entry = (stat.st_mtime_ns, stat.st_size, expires)
+            except OSError:
+                entry = None
+            with self._own_writes_lock:
+                if entry:
+                    self._own_writes[path] = entry
+                else:
+                    self._own_writes.pop(path, None)
+                self._prune_own_writes()
+    
+    def _prune_own_writes(self):
+        """Drop expired write registrations (caller holds the lock)"""
+        now = time.monotonic()
+        expired = [path for path, entry in self._own_writes.items() if entry[2] < now]
+        for path in expired:
+            del self._own_writes[path]
+    
+    def is_own_write(self, path):
+        """Check whether an event for path is the echo of ORBIT's own write
+        
+        Compares the file's current mtime and size with those recorded after
+        the write, so the file is never re-read. Any other change means the
+        user has touched the file since and the registration is dropped.
+        """
+        path = str(path)
+        with self._own_writes_lock:
+            entry = self._own_writes.get(path)
+            if not entry:
+                return False
+            mtime_ns, size, expires = entry
+            if expires < time.monotonic():
+                del self._own_writes[path]
+                return False
+            if mtime_ns is None:
+                self.suppressed_events += 1
+                return True
+        try:
+            stat = self.fs.stat(path)
+        except OSError:
+            return False
+        with self._own_writes_lock:
+            if (stat.st_mtime_ns, stat.st_size) == (mtime_ns, size):
+                self.suppressed_events += 1
+                return True
+            self._own_writes.pop(path, None)
+        return False
+    
+    def expect_subtree_move(self, src_dir, dest_dir):
+        """Register a directory move so the per-child events that echo it can be dropped"""
+        expires = time.monotonic() + Config.OWN_WRITE_TTL
+        with self._own_writes_lock:
+            self._moved_dirs[os.path.join(str(src_dir), '')] = (os.path.join(str(dest_dir), ''), expires)
+    
+    def is_subtree_echo(self, src_path, dest_path=None):
+        """Check whether a move (or deletion) event only repeats a registered directory move for one child"""
+        src_path = str(src_path)
+        now = time.monotonic()
+        with self._own_writes_lock:
+            for src_prefix, (dest_prefix, expires) in list(self._moved_dirs.items()):
+                if expires < now:
+                    del self._moved_dirs[src_prefix]
+                elif src_path.startswith(src_prefix) and (
+                        dest_path is None or str(dest_path) == dest_prefix + src_path[len(src_prefix):]):
+                    return True
+        return False
+    
     def process_file(self, file_path):
         """Process a file when it's created or modified"""
         file_path = Path(file_path)
@@ -308,93 +616,189 @@ LIMIT 10
             return
         
         # Track file creation time if first time seeing it
-        if str(file_path) not in self.file_creation_times:
-            self.file_creation_times[str(file_path)] = datetime.now()
+        first_seen = self.file_creation_times.get(str(file_path))
+        if first_seen is None:
+            first_seen = datetime.now()
+            self.file_creation_times[str(file_path)] = first_seen
             logger.info(f"Tracking new file: {file_path}")
         
-        logger.info(f"Processing file: {file_path}")
-        
+        start = time.perf_counter()
+        errors = self.metrics.counters["errors"]
         try:
-            # Read the file and extract frontmatter
-            frontmatter, content = self._read_file_with_frontmatter(file_path)
+            # Read the frontmatter block and skip routing if it hasn't changed
+            with self.metrics.time("read"):
+                frontmatter_yaml, _ = self._read_frontmatter_block(file_path)
+            fingerprint = self._fingerprint(frontmatter_yaml)
+            cached = self.frontmatter_cache.get(str(file_path))
+            if cached and cached[0] == fingerprint:
+                self.routing_skips += 1
+                logger.debug(f"Frontmatter unchanged, skipping: {file_path}")
+                return
+            self.routing_runs += 1
+            
+            logger.info(f"Processing file: {file_path}")
+            
+            frontmatter = None
+            if frontmatter_yaml is not None:
+                with self.metrics.time("parse"):
+                    frontmatter = self._parse_frontmatter(file_path, frontmatter_yaml)
+            self.frontmatter_cache[str(file_path)] = (fingerprint, frontmatter)
+            with self.metrics.time("index"):
+                self.index.upsert(file_path, frontmatter)
+            if not frontmatter or not frontmatter.get('orbits'):
+                # A move deferred for orbits the note no longer has must not fire
+                self.scheduler.cancel(str(file_path))
             if not frontmatter:
                 return
             
             # Process domain property first
             domain_value = frontmatter.get('domain', None)
             if domain_value:
-                self._process_domain(file_path, frontmatter, domain_value)
+                with self.metrics.time("domain"):
+                    self._process_domain(file_path, frontmatter, domain_value)
             
             # IMMEDIATELY create project directories for orbit relationships
             if 'orbits' in frontmatter and frontmatter['orbits']:
                 # First, create all necessary directories without moving the file
-                self._create_orbit_projects(file_path, frontmatter)
+                with self.metrics.time("create_projects"):
+                    self._create_orbit_projects(file_path, frontmatter)
                 
                 # Check if file is old enough to move
-                file_age = datetime.now() - self.file_creation_times[str(file_path)]
-                if file_age >= timedelta(minutes=Config.MIN_FILE_AGE):
+                file_age = datetime.now() - first_seen
+                min_age = timedelta(minutes=Config.MIN_FILE_AGE)
+                if file_age >= min_age:
                     # Only move if file is old enough
+                    self.scheduler.cancel(str(file_path))
                     self._process_orbits(file_path, frontmatter, move_file=True)
                 else:
-                    logger.info(f"File {file_path} has orbits but is too new to move, waiting...")
+                    # Move it once it is old enough, even if it is not edited again
+                    delay = (min_age - file_age).total_seconds()
+                    self.scheduler.schedule(str(file_path), delay, frontmatter)
+                    logger.info(f"File {file_path} has orbits but is too new to move, moving in {delay:.0f}s")
             
             # Process satellites relationship
             if 'satellites' in frontmatter and frontmatter['satellites']:
-                self._process_satellites(file_path, frontmatter)
+                with self.metrics.time("satellites"):
+                    self._process_satellites(file_path, frontmatter)
                 
         except Exception as e:
+            self.metrics.inc("errors")
             logger.error(f"Error processing {file_path}: {str(e)}")
+        finally:
+            if self.metrics.counters["errors"] != errors:
+                # Routing failed somewhere; forget the fingerprint so the next event retries it
+                self.frontmatter_cache.pop(str(file_path))
+            self.metrics.observe("process", time.perf_counter() - start)
+            if not self.scheduler.is_pending(str(file_path)):
+                # Handled without a pending move; a later move starts a new measurement
+                self.metrics.event_done(file_path)
+    
+    def run_deferred_move(self, file_path, frontmatter):
+        """Move a note whose MIN_FILE_AGE has elapsed, using the frontmatter captured when it was scheduled"""
+        if not self.fs.exists(file_path):
+            return
+        logger.info(f"Running deferred move for {file_path}")
+        self._process_orbits(Path(file_path), frontmatter, move_file=True)
     
-    def _read_file_with_frontmatter(self, file_path):
-        """Read a file and extract frontmatter and content"""
+    def state_stats(self):
+        """Return counters for the bounded per-file state and the routing skip rate"""
+        processed = self.routing_runs + self.routing_skips
+        return {
+            'file_creation_times': self.file_creation_times.stats(),
+            'frontmatter_cache': self.frontmatter_cache.stats(),
+            'path_cache': self.paths.cache.stats(),
+            'routing_runs': self.routing_runs,
+            'routing_skips': self.routing_skips,
+            'routing_skip_rate': self.routing_skips / processed if processed else 0.0,
+            'parse_tiers': dict(tier_counts),
+        }
+    
+    def reconcile(self):
+        """Re-sync the index with the vault, picking up changes the observer missed"""
+        with self.metrics.time("reconcile"):
+            self.index.refresh(self._index_parse)
+    
+    def write_metrics(self, extra_counters=None):
+        """Write timings and counters to Config.METRICS_FILE in Prometheus text format"""
+        counters = {
+            'routing_runs': self.routing_runs,
+            'routing_skips': self.routing_skips,
+            'suppressed_events': self.suppressed_events,
+        }
+        counters.update({f"parse_{tier}": count for tier, count in tier_counts.items()})
+        counters.update(extra_counters or {})
+        path = os.path.join(self.vault_path, Config.METRICS_FILE)
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                content = file.read()
-            
-            # Check if file has frontmatter
-            if not content.startswith('---'):
-                logger.info(f"No frontmatter found in {file_path}")
-                return None, content
-            
-            # Extract frontmatter
-            frontmatter_match = re.match(r'^---\n(.*?)\n---', content, re.DOTALL)
-            if not frontmatter_match:
-                logger.info(f"No frontmatter found in {file_path}")
-                return None, content
-                
-            frontmatter_yaml = frontmatter_match.group(1)
-            remaining_content = content[frontmatter_match.end():]
-            
-            # Parse YAML - Handle templater syntax by replacing with actual values
-            try:
-                # Fix Templater syntax by replacing with actual values
-                processed_yaml = self._fix_templater_syntax(frontmatter_yaml)
-                frontmatter = yaml.safe_load(processed_yaml)
-                
-                if not frontmatter or not isinstance(frontmatter, dict):
-                    logger.info(f"Invalid or empty frontmatter in {file_path}")
-                    return None, content
-            except Exception as e:
-                logger.error(f"Error parsing YAML frontmatter in {file_path}: {str(e)}")
-                # Try to fix common YAML errors
-                fixed_yaml = self._attempt_yaml_fix(frontmatter_yaml)
-                if fixed_yaml:
-                    try:
-                        frontmatter = yaml.safe_load(fixed_yaml)
-                    except Exception as e2:
-                        logger.error(f"Failed to fix YAML in {file_path}: {str(e2)}")
-                        return None, content
-                else:
-                    return None, content
-            
-            return frontmatter, remaining_content
-            
+            self.fs.makedirs(os.path.dirname(path), exist_ok=True)
+            self.fs.atomic_write(path, self.metrics.render(counters))
+            # Written outside any burst of events, so commit it now
+            self.fs.flush()
+        except Exception as e:
+            logger.error(f"Error writing metrics to {path}: {str(e)}")
+    
+    def close(self):
+        """Stop background timers, flush pending writes and close the index"""
+        self.scheduler.close()
+        self.fs.flush()
+        self.index.close()
+    
+    def _read_frontmatter_block(self, file_path):
+        """Read the raw frontmatter block of a file, returning (yaml_text, body_offset)"""
+        try:
+            frontmatter_yaml, body_offset = self.fs.read_frontmatter_block(file_path, Config.MAX_FRONTMATTER_BYTES)
         except Exception as e:
             logger.error(f"Error reading file {file_path}: {str(e)}")
-            return None, ""
+            return None, 0
+        
+        if frontmatter_yaml is None:
+            logger.info(f"No frontmatter found in {file_path}")
+        return frontmatter_yaml, body_offset
+    
+    def _read_frontmatter(self, file_path):
+        """Read and parse only the frontmatter of a file, returning (frontmatter, body_offset)"""
+        frontmatter_yaml, body_offset = self._read_frontmatter_block(file_path)
+        if frontmatter_yaml is None:
+            return None, 0
+        return self._parse_frontmatter(file_path, frontmatter_yaml), body_offset
+    
+    def _fingerprint(self, frontmatter_yaml):
+        """Hash a raw frontmatter block (None for notes without one)"""
+        if frontmatter_yaml is None:
+            return None
+        return hashlib.blake2b(frontmatter_yaml.encode('utf-8'), digest_size=16).digest()
+    
+    def _parse_frontmatter(self, file_path, frontmatter_yaml):
+        """Parse a frontmatter block - Handle templater syntax by replacing with actual values"""
+        try:
+            # Fix Templater syntax by replacing with actual values
+            processed_yaml = self._fix_templater_syntax(frontmatter_yaml)
+            # Simple scanner first, then libyaml
+            frontmatter, tier = parse_frontmatter(processed_yaml)
+            logger.debug(f"Parsed frontmatter in {file_path} with {tier} parser")
+            
+            if not frontmatter or not isinstance(frontmatter, dict):
+                logger.info(f"Invalid or empty frontmatter in {file_path}")
+                return None
+        except Exception as e:
+            logger.error(f"Error parsing YAML frontmatter in {file_path}: {str(e)}")
+            # Try to fix common YAML errors
+            tier_counts[TIER_FALLBACK] += 1
+            fixed_yaml = self._attempt_yaml_fix(frontmatter_yaml)
+            if not fixed_yaml:
+                return None
+            try:
+                frontmatter = yaml.safe_load(fixed_yaml)
+            except Exception as e2:
+                logger.error(f"Failed to fix YAML in {file_path}: {str(e2)}")
+                return None
+        
+        return frontmatter
     
     def _fix_templater_syntax(self, yaml_str):
         """Fix Templater syntax by replacing with actual values"""
+        if '<%' not in yaml_str:
+            return yaml_str
+        
         # Replace date template with actual date
         yaml_str = re.sub(r'<% tp\.date\.now\([^\)]*\) %>', datetime.now().strftime('%Y-%m-%d'), yaml_str)
         
@@ -416,57 +820,31 @@ LIMIT 10
     
     def _process_domain(self, file_path, frontmatter, domain_value):
         """Process domain property to place file in correct domain"""
-        # Check if this is a valid domain
-        domain_folder = None
-        domain_number = None
-        domain_name = None
-        
         # Handle different domain formats:
         # 1. "200-Health" (full format)
         # 2. "Health" (just name)
         # 3. "200" (just number)
+        resolved = self.resolver.resolve(domain_value)
         
-        if '-' in domain_value:
-            # Format is "200-Health"
-            domain_parts = domain_value.split('-', 1)
-            if domain_parts[0] and domain_parts[0].isdigit():
-                domain_number = domain_parts[0]
-                domain_name = domain_parts[1]
-                domain_folder = f"{domain_number}-{domain_name}"
-        elif domain_value.isdigit() and len(domain_value) == 3:
-            # Format is just "200" - need to find corresponding name
-            domain_number = domain_value
-            for num, name in self.domains.items():
-                if num == domain_number:
-                    domain_name = name
-                    domain_folder = f"{domain_number}-{domain_name}"
-                    break
-        else:
-            # Format is just "Health" - need to find corresponding number
-            domain_name = domain_value
-            for num, name in self.domains.items():
-                if name.lower() == domain_name.lower():
-                    domain_number = num
-                    domain_folder = f"{domain_number}-{name}"
-                    break
-        
-        if not domain_folder:
+        if not resolved:
             logger.warning(f"Invalid domain '{domain_value}' in {file_path}. Available domains: {', '.join([f'{k}-{v}' for k,v in self.domains.items()])}")
             return
+        domain_number, domain_name, domain_folder = resolved
         
         # Ensure domain folder exists
         domain_path = os.path.join(self.vault_path, domain_folder)
-        if not os.path.exists(domain_path):
-            os.makedirs(domain_path)
+        if not self.fs.exists(domain_path):
+            self.fs.makedirs(domain_path)
             logger.info(f"Created domain directory: {domain_path}")
             
             # Create hidden inbox
             inbox_path = os.path.join(domain_path, Config.INBOX_DIR)
-            os.makedirs(inbox_path, exist_ok=True)
+            self.fs.makedirs(inbox_path, exist_ok=True)
             logger.info(f"Created inbox directory: {inbox_path}")
             
             # Create domain dashboard
             self._create_domain_dashboard(domain_path, domain_name)
+            self.domain_added(domain_path)
 
     def create_domain_landing_pages(self):
         """Create landing pages (directories only) for all domains"""
@@ -475,14 +853,16 @@ LIMIT 10
             domain_path = os.path.join(self.vault_path, domain_folder)
             
             # Create domain directory if it doesn't exist
-            if not os.path.exists(domain_path):
-                os.makedirs(domain_path)
+            if not self.fs.exists(domain_path):
+                self.fs.makedirs(domain_path)
                 logger.info(f"Created domain landing page: {domain_path}")
                 
                 # Create hidden inbox
                 inbox_path = os.path.join(domain_path, Config.INBOX_DIR)
-                os.makedirs(inbox_path, exist_ok=True)
+                self.fs.makedirs(inbox_path, exist_ok=True)
                 logger.info(f"Created inbox directory: {inbox_path}")
+        # Commit anything written while starting up (e.g. default templates)
+        self.fs.flush()
 
     def _create_orbit_projects(self, file_path, frontmatter):
         """Create project directories for orbit relationships without moving the file"""
@@ -515,14 +895,11 @@ LIMIT 10
             return
             
         # Check if this is a designated project (has number)
-        is_designated = re.match(r'^\d+', orbit) is not None
+        is_designated = DESIGNATED_PATTERN.match(orbit) is not None
         
         # If no domain folder provided, try to determine it
         if not domain_folder:
-            for domain_num, domain_name in self.domains.items():
-                if orbit.lower() == domain_name.lower() or (is_designated and orbit.startswith(domain_num)):
-                    domain_folder = f"{domain_num}-{domain_name}"
-                    break
+            domain_folder = self.resolver.folder_for_orbit(orbit, is_designated)
             
             if not domain_folder:
                 # Try to find existing project with this name
@@ -531,16 +908,11 @@ LIMIT 10
                     domain_folder = self._get_domain_from_path(project_path)
                 else:
                     # Use the first domain as default if none specified
-                    domain_num, domain_name = next(iter(self.domains.items()))
-                    domain_folder = f"{domain_num}-{domain_name}"
+                    domain_folder = self.resolver.default_folder()
                     logger.warning(f"Using default domain {domain_folder} for orbit: {orbit}")
         
         # Ensure domain format is correct (e.g., "200-Health")
-        if not re.match(r'^\d{3}-', domain_folder):
-            for domain_num, domain_name in self.domains.items():
-                if domain_folder.lower() == domain_name.lower():
-                    domain_folder = f"{domain_num}-{domain_name}"
-                    break
+        domain_folder = self.resolver.canonical_folder(domain_folder)
         
         # Create project folder and notes
         if is_designated:
@@ -570,20 +942,20 @@ LIMIT 10
                 project_note_path = os.path.join(project_path, f"{orbit}.md")
         
         # Create the directories if they don't exist
-        if not os.path.exists(project_path):
-            os.makedirs(project_path, exist_ok=True)
+        if not self.fs.exists(project_path):
+            self.fs.makedirs(project_path, exist_ok=True)
             logger.info(f"Created project directory: {project_path}")
             
             # Create inbox folder
             inbox_path = os.path.join(project_path, f"{Config.INBOX_NUMBER}-inbox")
-            os.makedirs(inbox_path, exist_ok=True)
+            self.fs.makedirs(inbox_path, exist_ok=True)
             
             # Create source folder
             source_path = os.path.join(project_path, f"{Config.SOURCE_NUMBER}-source")
-            os.makedirs(source_path, exist_ok=True)
+            self.fs.makedirs(source_path, exist_ok=True)
         
         # Create project note if it doesn't exist
-        if not os.path.exists(project_note_path):
+        if not self.fs.exists(project_note_path):
             self._create_project_note(project_note_path, orbit, domain_folder)
             
             # Add the file as a satellite to the project note
@@ -591,17 +963,134 @@ LIMIT 10
     
     def _find_existing_project(self, project_name):
         """Find an existing project by name (case insensitive)"""
-        for root, dirs, files in os.walk(self.vault_path):
-            for file in files:
-                if file.lower() == f"{project_name.lower()}.md":
-                    return os.path.join(root, file)
-        return None
+        with self.metrics.time("find_project"):
+            return self.index.find(project_name)
+    
+    def note_moved(self, src_path, dest_path):
+        """Update the index after a note has been moved or renamed"""
+        if not src_path.endswith('.md'):
+            # Something renamed into a note (e.g. a sync client's temp file)
+            self.process_file(dest_path)
+        elif dest_path.endswith('.md'):
+            self.index.move(src_path, dest_path)
+            self.scheduler.rekey(src_path, dest_path)
+            self.file_creation_times.rekey(src_path, dest_path)
+            self.frontmatter_cache.rekey(src_path, dest_path)
+            old_name = os.path.basename(src_path)[:-3]
+            new_name = os.path.basename(dest_path)[:-3]
+            if new_name != old_name:
+                self._rewrite_links(old_name, new_name)
+        else:
+            self.note_deleted(src_path)
+    
+    def _rewrite_links(self, old_name, new_name=None):
+        """Point orbits/satellites entries naming old_name at new_name, or drop them
+        
+        Only the notes the index lists as referring to old_name are read. A
+        deleted note (new_name None) is dropped from satellites lists but
+        kept in orbits, where it names the project to recreate. Nothing is
+        rewritten while another note still has the old name.
+        """
+        if self.index.find(old_name):
+            return
+        with self.metrics.time("links"):
+            for key in ('satellites', 'orbits'):
+                if new_name is None and key == 'orbits':
+                    continue
+                for path in self.index.referrers(old_name, key):
+                    frontmatter, _ = self._read_frontmatter(path)
+                    names = normalize_links((frontmatter or {}).get(key))
+                    if not names:
+                        continue
+                    updated = []
+                    for name in names:
+                        if name.lower() != old_name.lower():
+                            updated.append(name)
+                        elif new_name is not None and new_name not in updated:
+                            updated.append(new_name)
+                    if updated != names and self._update_frontmatter(path, {key: updated}):
+                        logger.info(f"Updated {key} in {path}: {old_name} -> {new_name or '(removed)'}")
+    
+    def domain_added(self, dir_path):
+        """Pick up a new NNN-Name directory at the vault root as a domain"""
+        dir_path = str(dir_path)
+        if os.path.dirname(dir_path) != str(self.vault_path):
+            return
+        resolver = self.resolver.with_folder(os.path.basename(dir_path))
+        if resolver is self.resolver:
+            return
+        
+        # Swap in the rebuilt resolver in one assignment
+        self.resolver = resolver
+        logger.info(f"Added domain {os.path.basename(dir_path)}")
+        
+        # Ensure hidden inbox exists
+        inbox_path = os.path.join(dir_path, Config.INBOX_DIR)
+        if self.fs.isdir(dir_path) and not self.fs.exists(inbox_path):
+            self.fs.makedirs(inbox_path)
+            logger.info(f"Created inbox directory: {inbox_path}")
+    
+    def directory_moved(self, src_path, dest_path):
+        """Apply a directory move or rename to all per-note state in one pass
+        
+        The index, tracking state, frontmatter cache and pending moves are
+        re-keyed under the new prefix. No note under the directory is read.
+        """
+        src_path, dest_path = str(src_path), str(dest_path)
+        with self.metrics.time("directory_move"):
+            self.index.move_tree(src_path, dest_path)
+            self.scheduler.rekey_tree(src_path, dest_path)
+            self.file_creation_times.rekey_tree(src_path, dest_path)
+            self.frontmatter_cache.rekey_tree(src_path, dest_path)
+            self.metrics.events_moved(src_path, dest_path)
+        self.domain_added(dest_path)
+    
+    def directory_relocated(self, src_path, dest_path):
+        """Apply a directory that disappeared at src_path and appeared at dest_path
+        
+        Backends report a move between two separately watched trees as a
+        deletion and a creation. It is applied as a move if a note indexed
+        under src_path is found at the same place under dest_path, and as a
+        deletion otherwise. Returns whether it was applied as a move.
+        """
+        sample = self.index.first_under(src_path)
+        if sample and self.fs.exists(os.path.join(dest_path, os.path.relpath(sample, src_path))):
+            logger.info(f"Directory {src_path} reappeared as {dest_path}, applying it as a move")
+            self.directory_moved(src_path, dest_path)
+            return True
+        self.directory_deleted(src_path)
+        return False
+    
+    def note_deleted(self, file_path):
+        """Update the index after a note has been deleted"""
+        if self.fs.exists(file_path):
+            # Replaced straight away (an editor saving by rename); its own event follows
+            return
+        self.index.remove(file_path)
+        self.scheduler.cancel(file_path)
+        self.file_creation_times.pop(file_path)
+        self.frontmatter_cache.pop(file_path)
+        self._rewrite_links(os.path.basename(file_path)[:-3])
+    
+    def directory_deleted(self, dir_path):
+        """Drop the index entries and per-note state under a deleted directory"""
+        dir_path = str(dir_path)
+        prefix = os.path.join(dir_path, '')
+        self.index.remove_tree(dir_path)
+        self.scheduler.cancel_tree(dir_path)
+        self.file_creation_times.prune(lambda key: key.startswith(prefix))
+        self.frontmatter_cache.prune(lambda key: key.startswith(prefix))
+    
+    def _index_parse(self, file_path):
+        """Frontmatter parser used when (re)building the vault index"""
+        frontmatter, _ = self._read_frontmatter(file_path)
+        return frontmatter
     
     def _add_as_satellite(self, project_path, note_path):
         """Add a note as a satellite to a project note"""
         try:
-            # Read the project file
-            frontmatter, content = self._read_file_with_frontmatter(project_path)
+            # Read the project file's frontmatter
+            frontmatter, _ = self._read_frontmatter(project_path)
             if not frontmatter:
                 return
                 
@@ -616,38 +1105,44 @@ LIMIT 10
             # Add note as satellite if not already there
             if note_name not in satellites:
                 satellites.append(note_name)
-                frontmatter['satellites'] = satellites
                 
                 # Update the project file
-                self._update_frontmatter(project_path, frontmatter, content)
+                self._update_frontmatter(project_path, {'satellites': satellites})
                 logger.info(f"Added {note_name} as satellite to {project_path}")
         except Exception as e:
+            self.metrics.inc("errors")
             logger.error(f"Error adding satellite to {project_path}: {str(e)}")
     
-    def _update_frontmatter(self, file_path, frontmatter, content):
-        """Update the frontmatter of a file"""
+    def _update_frontmatter(self, file_path, updates):
+        """Update the given frontmatter keys of a file, leaving everything else untouched"""
         try:
-            # Create new frontmatter
-            new_frontmatter_yaml = yaml.dump(frontmatter, default_flow_style=False)
-            new_content = f"---\n{new_frontmatter_yaml}---\n{content}"
+            frontmatter_yaml, body_offset = self.fs.read_frontmatter_block(file_path, Config.MAX_FRONTMATTER_BYTES)
+            if frontmatter_yaml is None:
+                self.metrics.inc("errors")
+                logger.error(f"No frontmatter to update in {file_path}")
+                return False
+            
+            # Patch only the changed keys in the existing YAML text
+            new_frontmatter_yaml = patch_frontmatter(frontmatter_yaml, updates)
+            if new_frontmatter_yaml == frontmatter_yaml:
+                return True
             
-            # Write back to file
-            with open(file_path, 'w', encoding='utf-8') as file:
-                file.write(new_content)
+            # Swap in the new header, streaming the body across unchanged
+            header = f"---\n{new_frontmatter_yaml}\n---".encode('utf-8')
+            with self.metrics.time("write"), self._own_write(file_path):
+                self.fs.rewrite_header(file_path, header, body_offset)
+            self.index.update(file_path, updates)
                 
             return True
             
         except Exception as e:
+            self.metrics.inc("errors")
             logger.error(f"Error updating frontmatter in {file_path}: {str(e)}")
             return False
     
     def _get_domain_from_path(self, file_path):
         """Extract domain from file path"""
-        file_parts = str(file_path).split(os.sep)
-        for part in file_parts:
-            if re.match(r'^\d{3}-', part):
-                return part
-        return None
+        return self.paths.classify(file_path).domain
     
     def _process_orbits(self, file_path, frontmatter, move_file=True):
         """Process orbits relationship from a note"""
@@ -672,22 +1167,20 @@ LIMIT 10
         # Process each orbit
         for orbit in orbits:
             if orbit and isinstance(orbit, str):  # Validate orbit value
-                self._handle_orbit_relationship(file_path, orbit, direct, domain_value or file_domain, move_file)
+                self._handle_orbit_relationship(file_path, orbit, direct, domain_value or file_domain, move_file,
+                                                frontmatter.get('type', 'dust'))
     
-    def _handle_orbit_relationship(self, file_path, orbit, direct, domain_folder, move_file=True):
+    def _handle_orbit_relationship(self, file_path, orbit, direct, domain_folder, move_file=True, note_type=None):
         """Handle a single orbit relationship"""
         if not orbit:
             return
             
         # Check if this is a designated project (has number)
-        is_designated = re.match(r'^\d+', orbit) is not None
+        is_designated = DESIGNATED_PATTERN.match(orbit) is not None
         
         # If no domain folder provided, try to determine it
         if not domain_folder:
-            for domain_num, domain_name in self.domains.items():
-                if orbit.lower() == domain_name.lower() or (is_designated and orbit.startswith(domain_num)):
-                    domain_folder = f"{domain_num}-{domain_name}"
-                    break
+            domain_folder = self.resolver.folder_for_orbit(orbit, is_designated)
             
             if not domain_folder:
                 # Try to find existing project
@@ -696,16 +1189,11 @@ LIMIT 10
                     domain_folder = self._get_domain_from_path(project_path)
                 else:
                     # Use the first domain as default
-                    domain_num, domain_name = next(iter(self.domains.items()))
-                    domain_folder = f"{domain_num}-{domain_name}"
+                    domain_folder = self.resolver.default_folder()
                     logger.warning(f"Using default domain {domain_folder} for orbit: {orbit}")
         
         # Ensure domain format is correct (e.g., "200-Health")
-        if not re.match(r'^\d{3}-', domain_folder):
-            for domain_num, domain_name in self.domains.items():
-                if domain_folder.lower() == domain_name.lower():
-                    domain_folder = f"{domain_num}-{domain_name}"
-                    break
+        domain_folder = self.resolver.canonical_folder(domain_folder)
         
         # Get project paths
         if is_designated:
@@ -729,10 +1217,10 @@ LIMIT 10
             if direct and direct != '*':
                 # Move to the directly specified orbit
                 if direct == orbit:
-                    self._move_file_to_project(file_path, project_path)
+                    self._move_file_to_project(file_path, project_path, note_type)
             elif direct == '*':
                 # Move to all orbit directories (create copies or links)
-                self._move_file_to_project(file_path, project_path)
+                self._move_file_to_project(file_path, project_path, note_type)
             else:
                 # Default behavior - move to the first orbit or the specified direct orbit
                 if direct:
@@ -740,23 +1228,24 @@ LIMIT 10
                     direct_project = self._find_existing_project(direct)
                     if direct_project:
                         direct_path = os.path.dirname(direct_project)
-                        self._move_file_to_project(file_path, direct_path)
+                        self._move_file_to_project(file_path, direct_path, note_type)
                     else:
                         # Move to first orbit
-                        self._move_file_to_project(file_path, project_path)
+                        self._move_file_to_project(file_path, project_path, note_type)
                 else:
                     # Move to first orbit
-                    self._move_file_to_project(file_path, project_path)
+                    self._move_file_to_project(file_path, project_path, note_type)
     
-    def _move_file_to_project(self, file_path, project_path):
+    def _move_file_to_project(self, file_path, project_path, note_type=None):
         """Move a file to the appropriate project folder"""
         # Determine if file is a source, or should go to inbox
-        frontmatter, _ = self._read_file_with_frontmatter(file_path)
-        if not frontmatter:
-            # Default to dust if no frontmatter
-            note_type = 'dust'
-        else:
-            note_type = frontmatter.get('type', 'dust')
+        if note_type is None:
+            frontmatter, _ = self._read_frontmatter(file_path)
+            if not frontmatter:
+                # Default to dust if no frontmatter
+                note_type = 'dust'
+            else:
+                note_type = frontmatter.get('type', 'dust')
         
         if note_type == 'source':
             # Move to source folder
@@ -766,8 +1255,8 @@ LIMIT 10
             target_dir = os.path.join(project_path, f"{Config.INBOX_NUMBER}-inbox")
         
         # Create directory if it doesn't exist
-        if not os.path.exists(target_dir):
-            os.makedirs(target_dir, exist_ok=True)
+        if not self.fs.exists(target_dir):
+            self.fs.makedirs(target_dir, exist_ok=True)
         
         # Create target path
         target_path = os.path.join(target_dir, file_path.name)
@@ -780,19 +1269,23 @@ LIMIT 10
         # Move the file
         try:
             # Create parent directories if they don't exist
-            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            self.fs.makedirs(os.path.dirname(target_path), exist_ok=True)
             
             # Rename (move) the file
-            os.rename(file_path, target_path)
+            with self.metrics.time("rename"), self._own_write(target_path):
+                self.fs.rename(file_path, target_path)
             logger.info(f"Moved {file_path} to {target_path}")
+            self.metrics.inc("moves")
+            self.metrics.event_moved(file_path)
+            self.index.move(file_path, target_path)
+            self.scheduler.cancel(str(file_path))
             
             # Update the tracking time for the new path
-            self.file_creation_times[str(target_path)] = self.file_creation_times.get(str(file_path), datetime.now())
-            # Remove the old path from tracking
-            if str(file_path) in self.file_creation_times:
-                del self.file_creation_times[str(file_path)]
+            self.file_creation_times[str(target_path)] = self.file_creation_times.pop(str(file_path), datetime.now())
+            self.frontmatter_cache.rekey(str(file_path), str(target_path))
                 
         except Exception as e:
+            self.metrics.inc("errors")
             logger.error(f"Error moving file {file_path} to {target_path}: {str(e)}")
     
     def _process_satellites(self, file_path, frontmatter):
@@ -824,12 +1317,12 @@ LIMIT 10
         
         # Ensure the inbox directory exists
         inbox_path = os.path.join(project_folder, f"{Config.INBOX_NUMBER}-inbox")
-        if not os.path.exists(inbox_path):
-            os.makedirs(inbox_path, exist_ok=True)
+        if not self.fs.exists(inbox_path):
+            self.fs.makedirs(inbox_path, exist_ok=True)
             
         satellite_path = os.path.join(inbox_path, satellite_name)
         
-        if not os.path.exists(satellite_path):
+        if not self.fs.exists(satellite_path):
             # Get domain from project path
             domain_folder = self._get_domain_from_path(project_folder)
             
@@ -886,15 +1379,11 @@ This section contains buttons to create new notes in this project:
 """
             
             # Determine if this is a designated project
-            is_domain = False
-            for domain_num, domain_name in self.domains.items():
-                if project_name.lower() == domain_name.lower():
-                    is_domain = True
-                    break
+            is_domain = self.resolver.is_domain_name(project_name)
             
             # Clean project name (remove numbering if present)
             clean_project_name = project_name
-            if re.match(r'^\d+', project_name) and '-' in project_name:
+            if DESIGNATED_PATTERN.match(project_name) and '-' in project_name:
                 clean_project_name = project_name.split('-', 1)[1]
             
             # Set values for template substitution
@@ -903,7 +1392,7 @@ This section contains buttons to create new notes in this project:
             
             # Get domain value
             domain_value = domain_folder
-            if domain_folder and re.match(r'^\d{3}-', domain_folder):
+            if domain_folder and DOMAIN_FOLDER_PATTERN.match(domain_folder):
                 domain_number = domain_folder.split('-')[0]
                 domain_name = domain_folder.split('-')[1]
                 domain_value = f"{domain_number}-{domain_name}"
@@ -927,13 +1416,15 @@ This section contains buttons to create new notes in this project:
                     content = content.replace('domain: DOMAIN_VALUE', f'domain: {domain_value}\norbits: [{domain_name}]')
             
             # Create parent directories if needed
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            self.fs.makedirs(os.path.dirname(file_path), exist_ok=True)
             
             # Write the file
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(content)
+            with self.metrics.time("write"), self._own_write(file_path):
+                self.fs.atomic_write(file_path, content)
+            self.metrics.inc("creates")
                 
             logger.info(f"Created project note: {file_path}")
+            self.index.upsert(file_path, {'type': 'project', 'domain': domain_value})
             
             # Track the new file's creation time
             self.file_creation_times[str(file_path)] = datetime.now()
@@ -971,7 +1462,7 @@ New dust note orbiting PARENT_PROJECT.
             
             # Get domain value
             domain_value = ""
-            if domain_folder and re.match(r'^\d{3}-', domain_folder):
+            if domain_folder and DOMAIN_FOLDER_PATTERN.match(domain_folder):
                 domain_value = domain_folder
             
             # Perform template substitution
@@ -982,13 +1473,15 @@ New dust note orbiting PARENT_PROJECT.
             content = content.replace('DOMAIN_VALUE', domain_value)
             
             # Create parent directories if needed
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            self.fs.makedirs(os.path.dirname(file_path), exist_ok=True)
             
             # Write the file
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(content)
+            with self.metrics.time("write"), self._own_write(file_path):
+                self.fs.atomic_write(file_path, content)
+            self.metrics.inc("creates")
                 
             logger.info(f"Created satellite note: {file_path}")
+            self.index.upsert(file_path, {'type': 'dust', 'domain': domain_value, 'orbits': [parent_project]})
             return True
             
         except Exception as e:
@@ -1003,9 +1496,9 @@ New dust note orbiting PARENT_PROJECT.
         # Find existing projects in this domain
         existing_projects = []
         domain_path = os.path.join(self.vault_path, domain_folder)
-        for item in os.listdir(domain_path):
-            if os.path.isdir(os.path.join(domain_path, item)) and re.match(r'^\d+', item):
-                existing_projects.append(int(re.match(r'^\d+', item).group()))
+        for item in self.fs.listdir(domain_path):
+            if self.fs.isdir(os.path.join(domain_path, item)) and DESIGNATED_PATTERN.match(item):
+                existing_projects.append(int(DESIGNATED_PATTERN.match(item).group()))
         
         # Sort existing projects
         existing_projects.sort()
@@ -1020,14 +1513,16 @@ New dust note orbiting PARENT_PROJECT.
     
     def promote_project(self, project_path):
         """Promote a floating project to a designated project with number"""
-        # Get domain from project path
-        domain_folder = self._get_domain_from_path(project_path)
+        # Get domain and project name from project path
+        info = self.paths.classify(project_path)
+        domain_folder = info.domain
         if not domain_folder:
             logger.error(f"Cannot determine domain for project: {project_path}")
             return False
-            
-        # Get project name
-        project_name = os.path.basename(project_path)
+        if not info.floating or info.project_number:
+            logger.error(f"Not a floating project: {project_path}")
+            return False
+        project_name = info.project_name
         
         # Assign a project number
         project_number = self.assign_project_number(domain_folder, project_name)
@@ -1039,74 +1534,517 @@ New dust note orbiting PARENT_PROJECT.
         
         # Move the project
         try:
-            os.rename(project_path, new_project_path)
+            self.expect_subtree_move(project_path, new_project_path)
+            with self._own_write(new_project_path):
+                self.fs.rename(project_path, new_project_path)
             logger.info(f"Promoted project {project_path} to {new_project_path}")
+            self.directory_moved(project_path, new_project_path)
             
             # Update the project note
             project_note_path = os.path.join(new_project_path, f"{project_name}.md")
             new_note_path = os.path.join(new_project_path, f"{project_name}.md")
             
-            if os.path.exists(project_note_path):
+            if self.index.contains(project_note_path):
                 # Read the note
-                frontmatter, content = self._read_file_with_frontmatter(project_note_path)
+                frontmatter, _ = self._read_frontmatter(project_note_path)
                 if frontmatter:
                     # Update the project note (path, etc)
-                    self._update_project_after_promotion(new_note_path, frontmatter, content, new_project_name)
+                    self._update_project_after_promotion(new_note_path, frontmatter, new_project_name)
             
             return True
         except Exception as e:
             logger.error(f"Error promoting project {project_path}: {str(e)}")
             return False
     
-    def _update_project_after_promotion(self, note_path, frontmatter, content, new_project_name):
+    def _update_project_after_promotion(self, note_path, frontmatter, new_project_name):
         """Update a project note after promotion"""
         # Update frontmatter
         if 'type' in frontmatter:
-            frontmatter['type'] = 'project'
-        
-        # Write back to file
-        self._update_frontmatter(note_path, frontmatter, content)
+            self._update_frontmatter(note_path, {'type': 'project'})
+
+
+class EventQueue:
+    """Keyed coalescing queue between the observer thread and the worker
+    
+    Work queued with put() is keyed by path: repeated puts for the same path
+    inside the debounce window collapse into a single item that becomes due
+    once the path has been quiet for debounce_time (or max_delay has passed
+    since the first put). Work queued with put_now() runs in FIFO order ahead
+    of any debounced item.
+    """
+    
+    def __init__(self, debounce_time, max_delay=None):
+        self.debounce_time = debounce_time
+        self.max_delay = max_delay if max_delay is not None else debounce_time * 5
+        self._cond = threading.Condition()
+        self._pending = {}  # key -> [due, deadline, fn, args]
+        self._heap = []  # (due, key), may contain superseded entries
+        self._immediate = deque()
+        self._closed = False
+        self.coalesced = 0
+    
+    def put(self, key, fn, *args, delay=None):
+        """Queue fn(*args) to run once key has been quiet for the debounce window (or delay)"""
+        with self._cond:
+            now = time.monotonic()
+            delay = self.debounce_time if delay is None else delay
+            entry = self._pending.get(key)
+            if entry:
+                self.coalesced += 1
+                entry[1] = max(entry[1], now + delay)
+                entry[0] = min(now + delay, entry[1])
+                entry[2:] = [fn, args]
+            else:
+                entry = [now + delay, now + max(self.max_delay, delay), fn, args]
+                self._pending[key] = entry
+            heapq.heappush(self._heap, (entry[0], key))
+            self._cond.notify()
+    
+    def put_now(self, fn, *args):
+        """Queue fn(*args) to run as soon as the worker is free"""
+        with self._cond:
+            self._immediate.append((fn, args))
+            self._cond.notify()
+    
+    def discard(self, key):
+        """Drop pending work for key, returning True if there was any"""
+        with self._cond:
+            return self._pending.pop(key, None) is not None
+    
+    def discard_tree(self, dir_path):
+        """Drop pending work for every path under a directory, returning the dropped keys"""
+        prefix = os.path.join(dir_path, '')
+        with self._cond:
+            keys = [key for key in self._pending if key.startswith(prefix)]
+            for key in keys:
+                del self._pending[key]
+            return keys
+    
+    def get(self):
+        """Block until work is due and return (fn, args), or None once closed"""
+        with self._cond:
+            while not self._closed:
+                if self._immediate:
+                    return self._immediate.popleft()
+                
+                # Skip heap entries superseded by a later put or a discard
+                while self._heap:
+                    due, key = self._heap[0]
+                    entry = self._pending.get(key)
+                    if entry and entry[0] == due:
+                        break
+                    heapq.heappop(self._heap)
+                
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                
+                due, key = self._heap[0]
+                delay = due - time.monotonic()
+                if delay <= 0:
+                    heapq.heappop(self._heap)
+                    entry = self._pending.pop(key)
+                    return entry[2], entry[3]
+                self._cond.wait(delay)
+            return None
+    
+    def close(self):
+        """Wake the worker and stop handing out work"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+    
+    def due(self):
+        """Check whether any work is ready to run now"""
+        with self._cond:
+            now = time.monotonic()
+            return bool(self._immediate) or any(entry[0] <= now for entry in self._pending.values())
+    
+    def __len__(self):
+        with self._cond:
+            return len(self._pending) + len(self._immediate)
 
 
 class OrbitEventHandler(FileSystemEventHandler):
-    def __init__(self, orbit_system):
+    """Translate watchdog events into queued work for OrbitSystem
+    
+    The observer thread only enqueues; a single worker thread drains the
+    queue, so all OrbitSystem state is touched from one thread. Events for
+    paths matching Config.IGNORE_PATTERNS are dropped (and counted) before
+    any of that.
+    """
+    
+    def __init__(self, orbit_system, debounce_time=None, recorder=None):
         self.orbit_system = orbit_system
-        self.last_processed = {}  # Track last processed time for each file
+        # Optional EventRecorder that logs the raw event stream
+        self.recorder = recorder
+        if debounce_time is None:
+            debounce_time = Config.DEBOUNCE_TIME
+        self.queue = EventQueue(debounce_time, Config.MAX_DEBOUNCE_DELAY)
+        self.ignore = IgnoreMatcher(orbit_system.vault_path, Config.IGNORE_PATTERNS)
+        # Optional WatchManager placing the watches (see watch())
+        self.watches = None
+        self._worker = None
+        # Directories and notes created or deleted recently, so both halves of
+        # a move reported as a deletion and a creation can be paired up again:
+        # [(path, seen, pending changes)], oldest first
+        self._created_dirs = []
+        self._deleted_dirs = []
+        self._created_notes = []
+        self._deleted_notes = []
+        # Destinations of directories relocated from a paired deletion and
+        # creation; creations reported under them repeat the move
+        self._relocated_dirs = []
+        # How long one half of a move waits for the other (see watch())
+        self.move_window = Config.DIRECTORY_MOVE_WINDOW
+        # Events arrive from the observer thread and, in hybrid mode, the
+        # cold poller's; the pairing records above are only touched under it
+        self._deliver_lock = threading.Lock()
+        # Deferred moves run on the worker thread like everything else
+        orbit_system.scheduler.callback = self._deferred_move
+    
+    def start(self):
+        """Start the worker thread that drains the event queue"""
+        self._worker = threading.Thread(target=self._drain, name="orbit-worker", daemon=True)
+        self._worker.start()
+    
+    def stop(self):
+        """Stop the worker thread"""
+        self.queue.close()
+        if self._worker:
+            self._worker.join()
+    
+    def _drain(self):
+        """Worker loop: run queued work until the queue is closed"""
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            fn, args = item
+            try:
+                fn(*args)
+            except Exception as e:
+                self.orbit_system.metrics.inc("errors")
+                logger.error(f"Error handling event for {args}: {str(e)}")
+            if not self.queue.due():
+                # End of a burst (only held-back work left): commit its writes in one go
+                self._flush_writes()
+    
+    def _flush_writes(self):
+        """Commit the writes made since the last flush"""
+        try:
+            self.orbit_system.fs.flush()
+        except Exception as e:
+            logger.error(f"Error flushing writes: {str(e)}")
+    
+    def write_metrics(self):
+        """Write the watcher's metrics file, including queue counters"""
+        self.orbit_system.write_metrics({'coalesced_events': self.queue.coalesced})
+    
+    def _deferred_move(self, file_path, frontmatter):
+        """Hand a due move from the scheduler thread to the worker"""
+        self.queue.put_now(self.orbit_system.run_deferred_move, file_path, frontmatter)
+    
+    def _process(self, file_path):
+        """Process a file unless the queued change turned out to be ORBIT's own write"""
+        if self.orbit_system.is_own_write(file_path):
+            return
+        self.orbit_system.process_file(file_path)
+    
+    def dispatch(self, event):
+        if self.recorder:
+            self.recorder.record(event)
+        event = self._admit(event)
+        if event is None:
+            self.orbit_system.metrics.inc("ignored_events")
+            return
+        self.deliver(event)
+        if not self.watches:
+            return
+        self.watches.touch(event.src_path)
+        if event.is_directory:
+            if event.event_type == 'created':
+                self.watches.directory_created(event.src_path)
+            elif event.event_type == 'moved':
+                self.watches.directory_moved(event.src_path, event.dest_path)
+            elif event.event_type == 'deleted':
+                self.watches.directory_deleted(event.src_path)
+    
+    def watch(self, vault_path, kind=None):
+        """Create an observer of kind (default Config.OBSERVER) for the vault and place its watches
         
+        The observer is returned unstarted.
+        """
+        observer = make_observer(kind or Config.OBSERVER, vault_path, self.ignore, Config.POLL_INTERVAL,
+                                 Config.POLL_MAX_INTERVAL, Config.POLL_FULL_SWEEP)
+        self.watches = WatchManager(
+            observer, self, vault_path, self.ignore,
+            hot_names=(Config.INBOX_DIR, f"{Config.INBOX_NUMBER}-inbox"),
+            watch_share=Config.INOTIFY_WATCH_SHARE, poll_interval=Config.COLD_POLL_INTERVAL)
+        self.watches.start()
+        if self.watches.hybrid:
+            # A move between a watched and a polled directory shows up as a
+            # deletion and a creation up to one poll apart
+            self.move_window = Config.DIRECTORY_MOVE_WINDOW + Config.COLD_POLL_INTERVAL
+        return observer
+    
+    def deliver(self, event):
+        """Hand an admitted event to the on_* methods, one event at a time
+        
+        Only this part is serialized: the watchdog observer holds its own
+        lock while dispatching, and touch() may schedule watches on it.
+        """
+        with self._deliver_lock:
+            super().dispatch(event)
+    
+    def _admit(self, event):
+        """Apply the ignore rules, returning the event to deliver or None
+        
+        A move out of an ignored path becomes a creation, and a move into
+        one (e.g. to .trash) a deletion.
+        """
+        src_ignored = self.ignore(event.src_path)
+        if event.event_type != 'moved':
+            return None if src_ignored else event
+        dest_ignored = self.ignore(event.dest_path)
+        if src_ignored and dest_ignored:
+            return None
+        if dest_ignored:
+            return (DirDeletedEvent if event.is_directory else FileDeletedEvent)(event.src_path)
+        if src_ignored:
+            return (DirCreatedEvent if event.is_directory else FileCreatedEvent)(event.dest_path)
+        return event
+    
+    def _queue_change(self, file_path, delay=None):
+        """Queue a note change, noting when its first event arrived"""
+        self.orbit_system.metrics.inc("events")
+        self.orbit_system.metrics.event_seen(file_path)
+        self.queue.put(file_path, self._process, file_path, delay=delay)
+    
     def on_modified(self, event):
-        if event.is_directory:
+        if event.is_directory or not event.src_path.endswith('.md'):
             return
-            
-        file_path = event.src_path
-        
-        # Only process markdown files
-        if not file_path.endswith('.md'):
+        if self.orbit_system.is_own_write(event.src_path):
             return
-            
-        # Avoid processing the same file multiple times in rapid succession
-        current_time = time.time()
-        last_time = self.last_processed.get(file_path, 0)
+        self._queue_change(event.src_path)
         
-        if current_time - last_time < 1:  # 1-second debounce
+    def _prune_records(self, records):
+        """Drop creation/deletion records older than the pairing window"""
+        cutoff = time.monotonic() - self.move_window
+        records[:] = [entry for entry in records if entry[1] >= cutoff]
+    
+    def _remember(self, records, path, pending=()):
+        """Record a creation or deletion for pairing"""
+        self._prune_records(records)
+        records.append((path, time.monotonic(), pending))
+    
+    def _under(self, records, path):
+        """Check whether path is under a directory recorded inside the pairing window"""
+        self._prune_records(records)
+        return any(path.startswith(os.path.join(entry[0], '')) for entry in records)
+    
+    def _recall(self, records, path, latest=False):
+        """Take the record to pair with path: one with the same name, else (if latest) the latest"""
+        self._prune_records(records)
+        name = os.path.basename(path)
+        for i, entry in enumerate(records):
+            if os.path.basename(entry[0]) == name:
+                return records.pop(i)
+        return records.pop() if latest and records else None
+    
+    def _relocate(self, src_path, dest_path, created):
+        """Apply a paired deletion and creation, processing dest_path's contents if it was no move"""
+        if not self.orbit_system.directory_relocated(src_path, dest_path):
+            self._requeue(created)
+    
+    def _process_relocated(self, file_path):
+        """Process a note reported as created under a relocated directory, unless the move indexed it"""
+        if self.orbit_system.index.contains(file_path):
+            self.orbit_system.metrics.inc("subtree_events")
             return
-            
-        self.last_processed[file_path] = current_time
+        self._process(file_path)
+    
+    def _requeue(self, paths):
+        """Queue processing of paths from the worker"""
+        for path in paths:
+            self.queue.put(path, self._process, path)
+    
+    def _directory_moved(self, src_path, dest_path, relocated=False, pending=()):
+        """Queue a directory move as one operation ahead of any per-note work"""
+        self.orbit_system.expect_subtree_move(src_path, dest_path)
+        if relocated:
+            self._remember(self._relocated_dirs, dest_path)
+            # The creation half reports every child of dest_path as new; hold
+            # those back unless the pair turns out not to be a move
+            created = self.queue.discard_tree(dest_path)
+            self.queue.put_now(self._relocate, src_path, dest_path, created)
+        else:
+            self.queue.put_now(self.orbit_system.directory_moved, src_path, dest_path)
+        # Carry unprocessed changes under the directory over to the new paths
+        src_prefix = os.path.join(src_path, '')
+        for path in list(pending) + self.queue.discard_tree(src_path):
+            path = os.path.join(dest_path, path[len(src_prefix):])
+            self.queue.put(path, self._process, path)
+    
+    def _note_deleted(self, file_path):
+        """Queue a note deletion, or apply it as a move if the creation half has been seen
         
-        # Process the file
-        self.orbit_system.process_file(file_path)
+        A deletion drops the note from satellites lists, so it is held back
+        for the pairing window in case the note turns up in another watched
+        tree, and OrbitSystem looks the name up again before editing any
+        referrer.
+        """
+        pending = self.queue.discard(file_path)
+        created = self._recall(self._created_notes, file_path)
+        if created and created[0] != file_path and self.queue.discard(created[0]):
+            # The creation half of a move has already been seen
+            self._note_relocated(file_path, created[0], pending)
+            return
+        self._remember(self._deleted_notes, file_path, pending)
+        self.queue.put(self._deletion_key(file_path), self.orbit_system.note_deleted, file_path,
+                       delay=self.move_window)
+    
+    @staticmethod
+    def _deletion_key(file_path):
+        """Queue key for a held note deletion
         
+        Kept apart from the note's own key (and outside its directory's
+        prefix), so directory moves never carry the deletion over as a
+        change and a re-created note does not replace it.
+        """
+        return f"deleted:{file_path}"
+    
+    def _note_relocated(self, src_path, dest_path, pending):
+        """Apply a paired note deletion and creation as a move"""
+        self.queue.put_now(self.orbit_system.note_moved, src_path, dest_path)
+        if pending:
+            # Carry unprocessed changes over to the new path
+            self._queue_change(dest_path)
+    
     def on_created(self, event):
-        if not event.is_directory and event.src_path.endswith('.md'):
-            self.orbit_system.process_file(event.src_path)
+        if event.is_directory:
+            deleted = self._recall(self._deleted_dirs, event.src_path, latest=True)
+            if deleted and self.queue.discard(deleted[0]):
+                # The deletion half of a move is still waiting in the queue
+                self._directory_moved(deleted[0], event.src_path, relocated=True, pending=deleted[2])
+            elif not (self._under(self._created_dirs, event.src_path)
+                      or self._under(self._relocated_dirs, event.src_path)):
+                self._remember(self._created_dirs, event.src_path)
+            if DOMAIN_FOLDER_PATTERN.match(os.path.basename(event.src_path)):
+                self.queue.put_now(self.orbit_system.domain_added, event.src_path)
+            return
+        if not event.src_path.endswith('.md'):
+            return
+        if self.orbit_system.is_own_write(event.src_path):
+            return
+        deleted = self._recall(self._deleted_notes, event.src_path)
+        if deleted and deleted[0] != event.src_path and self.queue.discard(self._deletion_key(deleted[0])):
+            # The deletion half of a move between two watched trees is still waiting
+            self._note_relocated(deleted[0], event.src_path, deleted[2])
+            return
+        if self._under(self._relocated_dirs, event.src_path):
+            # Reported after its directory was paired up as a move; only
+            # processed if that turns out not to have been one
+            self.queue.put(event.src_path, self._process_relocated, event.src_path, delay=self.move_window)
+            return
+        self._remember(self._created_notes, event.src_path)
+        # Possibly the creation half of a note or directory move; give the
+        # deletion half time to arrive before processing the note (a new
+        # note's own move waits for MIN_FILE_AGE anyway)
+        self._queue_change(event.src_path, delay=self.move_window)
+    
+    def on_moved(self, event):
+        if self.orbit_system.is_own_write(event.dest_path):
+            return
+        if self.orbit_system.is_subtree_echo(event.src_path, event.dest_path):
+            # Already covered by the move of a parent directory
+            self.orbit_system.metrics.inc("subtree_events")
+            return
+        if event.is_directory:
+            self._directory_moved(event.src_path, event.dest_path)
+        elif event.src_path.endswith('.md') and not event.dest_path.endswith('.md'):
+            # Renamed away from a note (e.g. to a sync client's temp file)
+            self._note_deleted(event.src_path)
+        elif event.dest_path.endswith('.md'):
+            pending = self.queue.discard(event.src_path)
+            self.queue.put_now(self.orbit_system.note_moved, event.src_path, event.dest_path)
+            if pending and event.dest_path.endswith('.md'):
+                # Carry unprocessed changes over to the new path
+                self.queue.put(event.dest_path, self._process, event.dest_path)
+    
+    def on_deleted(self, event):
+        if self.orbit_system.is_subtree_echo(event.src_path):
+            self.orbit_system.metrics.inc("subtree_events")
+            return
+        if event.is_directory:
+            created = self._recall(self._created_dirs, event.src_path, latest=True)
+            if created:
+                # The creation half of a move has already been seen
+                self._directory_moved(event.src_path, created[0], relocated=True)
+                return
+            pending = self.queue.discard_tree(event.src_path)
+            self._remember(self._deleted_dirs, event.src_path, pending)
+            # Held back for the pairing window in case the directory turns up elsewhere
+            self.queue.put(event.src_path, self.orbit_system.directory_deleted, event.src_path,
+                           delay=self.move_window)
+        elif event.src_path.endswith('.md'):
+            self._note_deleted(event.src_path)
+
+def log_run_stats(orbit_system):
+    """Log how often routing was skipped and how many events were ignored"""
+    stats = orbit_system.state_stats()
+    logger.info(f"Routing skipped for {stats['routing_skips']} of "
+                f"{stats['routing_skips'] + stats['routing_runs']} events "
+                f"({stats['routing_skip_rate']:.0%}) with unchanged frontmatter")
+    logger.info(f"Ignored {orbit_system.metrics.counters['ignored_events']} events under Config.IGNORE_PATTERNS")
 
 def main():
+    parser = argparse.ArgumentParser(description='ORBIT vault watcher')
+    parser.add_argument('--vault', default=Config.VAULT_PATH, help='Path to the Obsidian vault')
+    parser.add_argument('--profile', type=float, nargs='?', const=Config.PROFILE_WINDOW, metavar='SECONDS',
+                        help=f'Sample stacks for SECONDS (default {Config.PROFILE_WINDOW}) and '
+                             f'write them to .orbit/profiles/')
+    parser.add_argument('--record', metavar='LOG',
+                        help='Record the raw event stream to LOG for replay with orbit_replay.py')
+    parser.add_argument('--engine', choices=['thread', 'asyncio'], default='thread',
+                        help='Run the watcher on worker threads (default) or an asyncio event loop')
+    parser.add_argument('--observer', choices=['auto', 'native', 'polling'], default=Config.OBSERVER,
+                        help='Watch with native filesystem events or by polling (default: %(default)s, '
+                             'which polls on FUSE, network and cloud-sync mounts)')
+    parser.add_argument('--control', action='store_true',
+                        help=f'Serve the control API on {Config.CONTROL_SOCKET} (asyncio engine only)')
+    args = parser.parse_args()
+    
     # Get vault path from config
-    vault_path = Config.VAULT_PATH
+    vault_path = args.vault
     
     if not os.path.exists(vault_path):
         logger.error(f"Vault path does not exist: {vault_path}")
         return
         
+    # Start profiling before the initial index refresh so it is included
+    sampler = None
+    if args.profile:
+        threads = SAMPLED_THREADS
+        if args.engine == 'asyncio':
+            # The event loop runs on the main thread and does real work there
+            threads = ("MainThread", "orbit-worker_0")
+        sampler = StackSampler(vault_path, args.profile, Config.PROFILE_INTERVAL, threads=threads)
+        sampler.start()
+    recorder = EventRecorder(args.record, vault_path) if args.record else None
+    
+    if args.engine == 'asyncio':
+        import asyncio
+        from orbit_async import run_async
+        try:
+            asyncio.run(run_async(vault_path, recorder, args.control, args.observer))
+        finally:
+            if sampler:
+                sampler.stop()
+            if recorder:
+                recorder.close()
+        return
+    
     # Initialize the ORBIT system
     orbit_system = OrbitSystem(vault_path)
     
@@ -1114,22 +2052,48 @@ def main():
     orbit_system.create_domain_landing_pages()
     
     # Create event handler and observer
-    event_handler = OrbitEventHandler(orbit_system)
-    observer = Observer()
+    event_handler = OrbitEventHandler(orbit_system, recorder=recorder)
+    event_handler.start()
     
-    # Schedule watching the vault directory
-    observer.schedule(event_handler, vault_path, recursive=True)
+    # Watch the vault, skipping ignored top-level directories
+    observer = event_handler.watch(vault_path, args.observer)
     observer.start()
     
     logger.info(f"Started watching Obsidian vault at: {vault_path}")
+    if sampler:
+        # From here on the main thread only sleeps
+        sampler.threads.discard('MainThread')
+    
+    # Dump timings on SIGUSR1 (kill -USR1 <pid>)
+    def dump_metrics(signum, frame):
+        for line in orbit_system.metrics.summary():
+            logger.info(f"Timing {line}")
+        event_handler.write_metrics()
+    
+    if hasattr(signal, 'SIGUSR1'):
+        signal.signal(signal.SIGUSR1, dump_metrics)
     
     try:
+        last_metrics = time.monotonic()
         while True:
             time.sleep(1)
+            if time.monotonic() - last_metrics >= Config.METRICS_INTERVAL:
+                event_handler.write_metrics()
+                last_metrics = time.monotonic()
     except KeyboardInterrupt:
         observer.stop()
         
     observer.join()
+    event_handler.watches.stop()
+    event_handler.stop()
+    event_handler.write_metrics()
+    if sampler:
+        sampler.stop()
+    if recorder:
+        recorder.close()
+    
+    log_run_stats(orbit_system)
+    orbit_system.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,8 +1,41 @@
 import os
 from pathlib import Path
 import shutil
+import tempfile
 from orbit_config import config
 
+# Process umask, for giving new files the permissions open() would
+UMASK = os.umask(0)
+os.umask(UMASK)
+
+def write_text_atomic(path, text):
+    """Write a file via a temporary file and rename so it is never left half-written.
+
+    Keeps the mode of the file being replaced (new files get the umask
+    default). The file and its directory are fsynced, so a template
+    survives a crash right after setup; setup writes few files, so this
+    is cheap.
+    """
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=".", suffix=".orbit-tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        if path.exists():
+            shutil.copymode(path, temp_path)
+        else:
+            os.chmod(temp_path, 0o666 & ~UMASK)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    dir_fd = os.open(path.parent, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
 def create_directory_structure():
     """Create the basic directory structure for the ORBIT system."""
     vault_path = Path(config["vault_path"])
@@ -94,9 +127,9 @@ orbits: {{parent_project}}
 """
 
     # Write templates
-    config["project_template"].write_text(project_template)
-    config["source_template"].write_text(source_template)
-    config["note_template"].write_text(note_template)
+    write_text_atomic(config["project_template"], project_template)
+    write_text_atomic(config["source_template"], source_template)
+    write_text_atomic(config["note_template"], note_template)
 
 def create_orbit_navigation():
     """Create the main navigation file for the ORBIT system."""
@@ -117,7 +150,7 @@ def create_orbit_navigation():
 - [[+New Source]]
 """
     
-    (vault_path / "ORBIT-Navigation.md").write_text(nav_content)
+    write_text_atomic(vault_path / "ORBIT-Navigation.md", nav_content)
 
 def main():
     """Main function to set up the ORBIT system."""